@@ -0,0 +1,137 @@
+# analytics/covariance.py
+import numpy as np
+
+ESTIMATORS = ('sample', 'ledoit-wolf', 'ewma')
+
+# RiskMetrics daily decay
+DEFAULT_EWMA_DECAY = 0.94
+
+# Covariances are built from pairwise-complete sufficient statistics of a return
+# matrix with NaN for missing days. For columns i and j every sum runs over the
+# rows where both are present, so the statistics of any subset of columns are
+# the corresponding sub-matrices and rows can be added or removed by adding or
+# subtracting their contribution.
+STAT_FIELDS = ('count', 'pair_sum', 'cross', 'pair_square', 'cube', 'fourth')
+EWMA_FIELDS = ('ewma_count', 'ewma_cross')
+
+
+def cross_statistics(left, right):
+    """Statistics between the columns of ``left`` and ``right`` (same rows).
+
+    ``count[i, j]`` is the number of shared rows, ``pair_sum[i, j]`` the sum of
+    left column i over them, ``cross`` the sum of products, ``pair_square`` the
+    sum of squares of left column i, ``cube`` the sum of ``x_i**2 * x_j`` and
+    ``fourth`` the sum of ``x_i**2 * x_j**2``.
+    """
+    left_mask = ~np.isnan(left)
+    right_mask = ~np.isnan(right)
+    left_filled = np.where(left_mask, left, 0.0)
+    right_filled = np.where(right_mask, right, 0.0)
+    left_mask = left_mask.astype(float)
+    right_mask = right_mask.astype(float)
+    left_squared = left_filled ** 2
+    return {
+        'count': left_mask.T @ right_mask,
+        'pair_sum': left_filled.T @ right_mask,
+        'cross': left_filled.T @ right_filled,
+        'pair_square': left_squared.T @ right_mask,
+        'cube': left_squared.T @ right_filled,
+        'fourth': left_squared.T @ right_filled ** 2,
+    }
+
+
+def ewma_statistics(left, right, decay=DEFAULT_EWMA_DECAY):
+    """Exponentially weighted counts and cross products; the last row has weight 1."""
+    weights = decay ** np.arange(len(left) - 1, -1, -1, dtype=float)[:, None]
+    left_mask = ~np.isnan(left)
+    right_mask = ~np.isnan(right)
+    return {
+        'ewma_count': (left_mask * weights).T @ right_mask,
+        'ewma_cross': (np.where(left_mask, left, 0.0) * weights).T @ np.where(right_mask, right, 0.0),
+    }
+
+
+def mean_returns(stats):
+    return np.diag(stats['pair_sum']) / np.diag(stats['count'])
+
+
+def sample_covariance(stats):
+    count = stats['count']
+    if (count < 2).any():
+        raise ValueError('Not enough overlapping history to estimate the covariance')
+    pair_sum = stats['pair_sum']
+    return (stats['cross'] - pair_sum * pair_sum.T / count) / (count - 1)
+
+
+def ledoit_wolf_shrinkage(stats):
+    """Ledoit-Wolf (2004) intensity for shrinking towards a scaled identity."""
+    count = stats['count']
+    pair_sum = stats['pair_sum']
+    means = mean_returns(stats)
+    mean_i = means[:, None]
+    mean_j = means[None, :]
+
+    empirical = (stats['cross'] - pair_sum * pair_sum.T / count) / count
+    # Sum of (x_i - m_i)**2 * (x_j - m_j)**2 expanded over the raw moments
+    centered_fourth = (
+        stats['fourth']
+        - 2 * mean_j * stats['cube'] - 2 * mean_i * stats['cube'].T
+        + mean_j ** 2 * stats['pair_square'] + mean_i ** 2 * stats['pair_square'].T
+        + 4 * mean_i * mean_j * stats['cross']
+        - 2 * mean_i * mean_j ** 2 * pair_sum - 2 * mean_i ** 2 * mean_j * pair_sum.T
+        + mean_i ** 2 * mean_j ** 2 * count
+    )
+
+    num_assets = len(means)
+    target = np.trace(empirical) / num_assets
+    delta = np.sum((empirical - target * np.eye(num_assets)) ** 2) / num_assets
+    beta = np.sum((centered_fourth / count - empirical ** 2) / count) / num_assets
+    if delta <= 0:
+        return 0.0
+    return float(np.clip(min(beta, delta) / delta, 0.0, 1.0))
+
+
+def ledoit_wolf_covariance(stats):
+    covariance = sample_covariance(stats)
+    shrinkage = ledoit_wolf_shrinkage(stats)
+    target = np.trace(covariance) / len(covariance)
+    return (1 - shrinkage) * covariance + shrinkage * target * np.eye(len(covariance))
+
+
+def ewma_covariance(stats):
+    """Zero-mean exponentially weighted covariance (RiskMetrics)."""
+    if (stats['ewma_count'] <= 0).any():
+        raise ValueError('Not enough overlapping history to estimate the covariance')
+    return stats['ewma_cross'] / stats['ewma_count']
+
+
+COVARIANCE_ESTIMATORS = {
+    'sample': sample_covariance,
+    'ledoit-wolf': ledoit_wolf_covariance,
+    'ewma': ewma_covariance,
+}
+
+
+def correlation_matrix(cov_matrix):
+    volatility = np.sqrt(np.diag(cov_matrix))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.nan_to_num(cov_matrix / np.outer(volatility, volatility))
+    np.fill_diagonal(correlation, 1)
+    return correlation
+
+
+def nearest_positive_semi_definite(matrix):
+    """The closest positive semi-definite matrix (in Frobenius norm): negative eigenvalues set to zero."""
+    eigvals, eigvecs = np.linalg.eigh((matrix + matrix.T) / 2)
+    return (eigvecs * np.clip(eigvals, 0, None)) @ eigvecs.T
+
+
+def estimate_moments(stats, estimator='sample'):
+    """Daily mean vector and positive semi-definite covariance matrix from (sliced) statistics."""
+    covariance = COVARIANCE_ESTIMATORS[estimator](stats)
+    covariance = (covariance + covariance.T) / 2
+    # Pairs measured over histories of different lengths need not make a valid
+    # covariance matrix; some portfolios would have a negative variance
+    if np.linalg.eigvalsh(covariance)[0] < 0:
+        covariance = nearest_positive_semi_definite(covariance)
+    return mean_returns(stats), np.ascontiguousarray(covariance)
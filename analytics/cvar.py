@@ -0,0 +1,53 @@
+# analytics/cvar.py
+import numpy as np
+from scipy.optimize import linprog
+
+
+def portfolio_cvar(scenarios, weights, confidence=0.95):
+    """Expected loss over the worst ``1 - confidence`` share of scenarios."""
+    losses = -(scenarios @ np.asarray(weights, dtype=scenarios.dtype)).astype(np.float64)
+    tail_size = max(1, int(np.ceil((1 - confidence) * len(losses))))
+    return float(np.partition(losses, -tail_size)[-tail_size:].mean())
+
+
+def min_cvar_weights(scenarios, confidence=0.95, bounds=(0, 1), tolerance=1e-6, max_iterations=200):
+    """Minimize portfolio CVaR over a scenario matrix by cutting planes.
+
+    CVaR is convex and piecewise linear in the weights, and the mean return of the
+    current tail scenarios is a subgradient. Each iteration therefore costs one pass
+    over the scenarios plus a linear program with only ``assets + 1`` variables,
+    instead of the full Rockafellar-Uryasev program with one variable per scenario.
+    Stops once the gap between the best CVaR found and the LP lower bound is below
+    ``tolerance`` (relative). Returns ``(weights, cvar)``.
+    """
+    num_scenarios, num_assets = scenarios.shape
+    tail_size = max(1, int(np.ceil((1 - confidence) * num_scenarios)))
+    if isinstance(bounds, tuple):
+        bounds = [bounds] * num_assets
+
+    cost = np.concatenate([np.zeros(num_assets), [1.0]])
+    a_eq = np.concatenate([np.ones(num_assets), [0.0]])[np.newaxis, :]
+    variable_bounds = list(bounds) + [(None, None)]
+
+    weights = np.full(num_assets, 1 / num_assets)
+    best_weights, best_cvar = weights, np.inf
+    cuts = []
+    for _ in range(max_iterations):
+        losses = -(scenarios @ weights.astype(scenarios.dtype))
+        tail = np.argpartition(losses, -tail_size)[-tail_size:]
+        cvar = float(losses[tail].astype(np.float64).mean())
+        if cvar < best_cvar:
+            best_weights, best_cvar = weights, cvar
+
+        # CVaR is positively homogeneous, so each cut is simply theta >= subgradient @ w
+        cuts.append(np.concatenate([-scenarios[tail].mean(axis=0, dtype=np.float64), [-1.0]]))
+        result = linprog(cost, A_ub=np.array(cuts), b_ub=np.zeros(len(cuts)), A_eq=a_eq, b_eq=[1.0],
+                         bounds=variable_bounds, method='highs')
+        if not result.success:
+            raise ValueError(f"CVaR optimization failed: {result.message}")
+
+        weights = result.x[:num_assets]
+        if best_cvar - result.fun <= tolerance * max(1.0, abs(best_cvar)):
+            break
+
+    return best_weights, best_cvar
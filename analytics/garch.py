@@ -0,0 +1,46 @@
+# analytics/garch.py
+import numpy as np
+
+
+def fit_garch(returns):
+    """Fit a constant-mean GARCH(1,1) to one asset's daily returns.
+
+    Returns a dict of plain floats in return units (not percent): the mean ``mu``,
+    ``omega``, ``alpha``, ``beta`` and ``next_variance``, the conditional variance
+    forecast for the day after the sample.
+    """
+    from arch import arch_model
+
+    # arch's optimizer is best conditioned on percent returns
+    returns = 100 * np.asarray(returns, dtype=float)
+    fitted = arch_model(returns, mean='Constant', vol='GARCH', p=1, q=1, rescale=False).fit(disp='off')
+    params = fitted.params
+    next_variance = fitted.forecast(horizon=1, reindex=False).variance.values[-1, 0]
+    return {
+        'mu': float(params['mu']) / 100,
+        'omega': float(params['omega']) / 100 ** 2,
+        'alpha': float(params['alpha[1]']),
+        'beta': float(params['beta[1]']),
+        'next_variance': float(next_variance) / 100 ** 2,
+    }
+
+
+def variance_forecast(fit, horizon):
+    """Conditional variances for days 1..``horizon`` after the sample."""
+    persistence = fit['alpha'] + fit['beta']
+    steps = np.arange(horizon)
+    if persistence >= 1:
+        # Integrated process: the variance drifts up by omega each day
+        return fit['next_variance'] + fit['omega'] * steps
+    long_run = fit['omega'] / (1 - persistence)
+    return long_run + persistence ** steps * (fit['next_variance'] - long_run)
+
+
+def garch_covariance(correlation, fits, horizon=1):
+    """Daily covariance whose variances are the GARCH forecasts averaged over ``horizon``.
+
+    The correlation structure is kept from the sample; only the volatilities move,
+    so ``horizon * result`` is the forecast covariance of the summed returns.
+    """
+    volatility = np.sqrt([variance_forecast(fit, horizon).mean() for fit in fits])
+    return np.asarray(correlation) * np.outer(volatility, volatility)
@@ -0,0 +1,195 @@
+# analytics/optimizer.py
+import numpy as np
+from scipy.optimize import minimize
+
+TRADING_DAYS = 252
+
+
+def annualized_moments(log_returns, periods_per_year=TRADING_DAYS):
+    """Mean vector and covariance of a returns frame as contiguous, annualized arrays.
+
+    Build these once per request; every objective below works on the arrays only.
+    """
+    values = np.asarray(log_returns, dtype=float)
+    mean_returns = np.ascontiguousarray(values.mean(axis=0) * periods_per_year)
+    cov_matrix = np.ascontiguousarray(np.cov(values, rowvar=False).reshape(values.shape[1], values.shape[1]) * periods_per_year)
+    return mean_returns, cov_matrix
+
+
+def portfolio_return(weights, mean_returns):
+    return float(weights @ mean_returns)
+
+
+def portfolio_volatility(weights, cov_matrix):
+    # Rounding can leave the variance a hair below zero for a singular covariance
+    return float(np.sqrt(max(weights @ cov_matrix @ weights, 0.0)))
+
+
+def sharpe_ratio(weights, mean_returns, cov_matrix, risk_free_rate):
+    return (portfolio_return(weights, mean_returns) - risk_free_rate) / portfolio_volatility(weights, cov_matrix)
+
+
+# Objectives return (value, gradient) so SLSQP does not estimate the Jacobian by finite differences
+
+def neg_sharpe_objective(weights, mean_returns, cov_matrix, risk_free_rate):
+    cov_weights = cov_matrix @ weights
+    volatility = np.sqrt(weights @ cov_weights)
+    excess_return = weights @ mean_returns - risk_free_rate
+    value = -excess_return / volatility
+    gradient = -(mean_returns / volatility - excess_return * cov_weights / volatility ** 3)
+    return value, gradient
+
+
+def volatility_objective(weights, mean_returns, cov_matrix, risk_free_rate):
+    cov_weights = cov_matrix @ weights
+    volatility = np.sqrt(weights @ cov_weights)
+    return volatility, cov_weights / volatility
+
+
+def variance_objective(weights, mean_returns, cov_matrix, risk_free_rate):
+    cov_weights = cov_matrix @ weights
+    return weights @ cov_weights, 2 * cov_weights
+
+
+def neg_return_objective(weights, mean_returns, cov_matrix, risk_free_rate):
+    return -(weights @ mean_returns), -mean_returns
+
+
+OBJECTIVES = {
+    'sharpe': neg_sharpe_objective,
+    'volatility': volatility_objective,
+    'variance': variance_objective,
+    'return': neg_return_objective,
+}
+
+WEIGHT_SUM_CONSTRAINT = {
+    'type': 'eq',
+    'fun': lambda weights: np.sum(weights) - 1,
+    'jac': lambda weights: np.ones_like(weights),
+}
+
+
+def max_sharpe_weights(mean_returns, cov_matrix, risk_free_rate, bounds):
+    """Maximize the Sharpe ratio through its convex reformulation.
+
+    With ``y = w / k`` scaled so that ``(mean - rf) @ y == 1``, maximizing the Sharpe
+    ratio becomes minimizing ``y @ cov @ y``; weight bounds turn into the linear
+    constraints ``low * sum(y) <= y <= high * sum(y)``. This converges in far fewer
+    SLSQP iterations than the ratio itself. Returns None when no asset earns more
+    than the risk-free rate, where the reformulation does not apply.
+    """
+    excess_returns = mean_returns - risk_free_rate
+    if not np.any(excess_returns > 0):
+        return None
+
+    low = np.array([bound[0] for bound in bounds], dtype=float)
+    high = np.array([1 if bound[1] is None else bound[1] for bound in bounds], dtype=float)
+    num_assets = len(mean_returns)
+    identity = np.eye(num_assets)
+    constraints = [{'type': 'eq', 'fun': lambda y: y @ excess_returns - 1, 'jac': lambda y: excess_returns}]
+    if np.any(low > 0):
+        lower = identity - np.outer(low, np.ones(num_assets))
+        constraints.append({'type': 'ineq', 'fun': lambda y: lower @ y, 'jac': lambda y: lower})
+    if np.any(high < 1):
+        upper = np.outer(high, np.ones(num_assets)) - identity
+        constraints.append({'type': 'ineq', 'fun': lambda y: upper @ y, 'jac': lambda y: upper})
+
+    # Start from equal holdings of the assets that beat the risk-free rate
+    positive = (excess_returns > 0).astype(float)
+    initial_y = positive / (positive @ excess_returns)
+    result = minimize(
+        lambda y: (y @ cov_matrix @ y, 2 * (cov_matrix @ y)),
+        initial_y,
+        method='SLSQP',
+        jac=True,
+        bounds=[(0, None)] * num_assets,
+        constraints=constraints
+    )
+    if not result.success or result.x.sum() <= 0:
+        return None
+
+    weights = result.x / result.x.sum()
+    result.x = weights
+    result.fun = neg_sharpe_objective(weights, mean_returns, cov_matrix, risk_free_rate)[0]
+    return result
+
+
+def expand_bounds(bounds, num_assets):
+    """Per-asset ``(low, high)`` pairs from one pair or a sequence of pairs."""
+    # A tuple of pairs, e.g. ((0, 1), (0, 0.5)), is already per asset
+    if len(bounds) == 2 and not isinstance(bounds[0], (tuple, list)):
+        return [tuple(bounds)] * num_assets
+    return list(bounds)
+
+
+def optimize_weights(mean_returns, cov_matrix, objective='sharpe', risk_free_rate=0.0,
+                     bounds=(0, 1), initial_weights=None, constraints=()):
+    """Solve a fully-invested problem with SLSQP and exact gradients.
+
+    ``bounds`` is either one ``(low, high)`` pair applied to every asset or a list of
+    pairs; ``constraints`` are appended to the weights-sum-to-one constraint.
+    """
+    num_assets = len(mean_returns)
+    if initial_weights is None:
+        initial_weights = np.full(num_assets, 1 / num_assets)
+    bounds = expand_bounds(bounds, num_assets)
+
+    if objective == 'sharpe' and not constraints and all(bound[0] is not None and bound[0] >= 0 for bound in bounds):
+        result = max_sharpe_weights(mean_returns, cov_matrix, risk_free_rate, bounds)
+        if result is not None:
+            return result
+
+    return minimize(
+        OBJECTIVES[objective],
+        np.asarray(initial_weights, dtype=float),
+        args=(mean_returns, cov_matrix, risk_free_rate),
+        method='SLSQP',
+        jac=True,
+        bounds=bounds,
+        constraints=[WEIGHT_SUM_CONSTRAINT, *constraints]
+    )
+
+
+def max_return_weights(mean_returns, bounds):
+    # With box bounds and a budget constraint the best return is found greedily
+    weights = np.array([bound[0] for bound in bounds], dtype=float)
+    remaining = 1 - weights.sum()
+    for index in np.argsort(mean_returns)[::-1]:
+        if remaining <= 0:
+            break
+        room = (1 if bounds[index][1] is None else bounds[index][1]) - weights[index]
+        step = min(room, remaining)
+        weights[index] += step
+        remaining -= step
+    return weights
+
+
+def efficient_frontier(mean_returns, cov_matrix, points=20, bounds=(0, 1)):
+    """Minimum-volatility portfolios for ``points`` target returns, from one moments build.
+
+    Targets run from the minimum-volatility portfolio's return up to the highest
+    attainable return; every solve is warm-started from the previous point's weights.
+    Returns a list of weight vectors ordered by increasing target return.
+    """
+    num_assets = len(mean_returns)
+    bounds = expand_bounds(bounds, num_assets)
+
+    # Variance has the same minimizers as volatility and is better conditioned for SLSQP
+    min_vol = optimize_weights(mean_returns, cov_matrix, 'variance', bounds=bounds)
+    max_return = max_return_weights(mean_returns, bounds)
+    targets = np.linspace(portfolio_return(min_vol.x, mean_returns), portfolio_return(max_return, mean_returns), points)
+
+    frontier = [min_vol.x]
+    weights = min_vol.x
+    for target in targets[1:-1]:
+        target_constraint = {
+            'type': 'eq',
+            'fun': lambda w, target=target: w @ mean_returns - target,
+            'jac': lambda w: mean_returns,
+        }
+        weights = optimize_weights(mean_returns, cov_matrix, 'variance', bounds=bounds,
+                                   initial_weights=weights, constraints=[target_constraint]).x
+        frontier.append(weights)
+    if points > 1:
+        frontier.append(max_return)
+    return frontier
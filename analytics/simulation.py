@@ -0,0 +1,69 @@
+# analytics/simulation.py
+import numpy as np
+
+# Scenarios are drawn in fixed-size chunks so that memory stays bounded no
+# matter how many scenarios a request asks for.
+DEFAULT_CHUNK_SIZE = 250_000
+
+
+def cholesky_factor(cov_matrix):
+    """Return ``L`` with ``L @ L.T == cov_matrix`` so correlated draws are ``z @ L.T``."""
+    cov_matrix = np.ascontiguousarray(cov_matrix, dtype=float)
+    try:
+        return np.linalg.cholesky(cov_matrix)
+    except np.linalg.LinAlgError:
+        # Singular or slightly indefinite sample covariance: use the symmetric square root
+        eigvals, eigvecs = np.linalg.eigh((cov_matrix + cov_matrix.T) / 2)
+        return eigvecs * np.sqrt(np.clip(eigvals, 0, None))
+
+
+def scenario_chunks(num_scenarios, chunk_size=DEFAULT_CHUNK_SIZE, seed=None):
+    """Split ``num_scenarios`` into chunks, each with its own reproducible seed.
+
+    Returns a list of ``(offset, size, seed_sequence)``; passing the same list to
+    ``np.random.default_rng`` twice replays exactly the same draws.
+    """
+    chunk_size = max(1, int(chunk_size))
+    num_chunks = -(-num_scenarios // chunk_size)
+    children = np.random.SeedSequence(seed).spawn(num_chunks)
+    return [
+        (i * chunk_size, min(chunk_size, num_scenarios - i * chunk_size), child)
+        for i, child in enumerate(children)
+    ]
+
+
+def iter_scenarios(mean_returns, cov_matrix, num_scenarios, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield ``(offset, chunk)`` blocks of correlated normal float32 return scenarios."""
+    mean_returns = np.asarray(mean_returns, dtype=np.float32)
+    factor_t = cholesky_factor(cov_matrix).T.astype(np.float32)
+    for offset, size, chunk_seed in scenario_chunks(num_scenarios, chunk_size, seed):
+        z = np.random.default_rng(chunk_seed).standard_normal((size, len(mean_returns)), dtype=np.float32)
+        yield offset, mean_returns + z @ factor_t
+
+
+def generate_scenarios(mean_returns, cov_matrix, num_scenarios, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Full float32 scenario matrix, filled chunk by chunk."""
+    scenarios = np.empty((num_scenarios, len(mean_returns)), dtype=np.float32)
+    for offset, chunk in iter_scenarios(mean_returns, cov_matrix, num_scenarios, seed, chunk_size):
+        scenarios[offset:offset + len(chunk)] = chunk
+    return scenarios
+
+
+def scenario_moments(chunks):
+    """Mean vector and population covariance of scenario chunks, accumulated in float64.
+
+    Any portfolio's scenario mean and standard deviation follow exactly from these,
+    so optimizers never need to touch the scenarios again.
+    """
+    count = 0
+    total = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if total is None:
+            total = np.zeros(chunk.shape[1])
+            cross = np.zeros((chunk.shape[1], chunk.shape[1]))
+        count += len(chunk)
+        total += chunk.sum(axis=0)
+        cross += chunk.T @ chunk
+    mean = total / count
+    return mean, cross / count - np.outer(mean, mean)
@@ -0,0 +1,33 @@
+# analytics/summary.py
+import numpy as np
+
+SUMMARY_QUANTILES = (0.001, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.975, 0.99, 0.999)
+DEFAULT_HISTOGRAM_BINS = 50
+
+
+def summarize(values, bins=DEFAULT_HISTOGRAM_BINS):
+    """Compact description of a simulated distribution: quantiles, moments and a histogram."""
+    values = np.asarray(values, dtype=float)
+    mean = values.mean()
+    std = values.std()
+    centered = values - mean
+    skewness = (centered ** 3).mean() / std ** 3 if std > 0 else 0.0
+    kurtosis = (centered ** 4).mean() / std ** 4 - 3 if std > 0 else 0.0
+    counts, edges = np.histogram(values, bins=bins)
+
+    return {
+        'count': int(values.size),
+        'quantiles': {str(q): float(v) for q, v in zip(SUMMARY_QUANTILES, np.quantile(values, SUMMARY_QUANTILES))},
+        'moments': {
+            'mean': float(mean),
+            'std_dev': float(std),
+            'skewness': float(skewness),
+            'excess_kurtosis': float(kurtosis),
+            'min': float(values.min()),
+            'max': float(values.max()),
+        },
+        'histogram': {
+            'bin_edges': edges.tolist(),
+            'counts': counts.tolist(),
+        },
+    }
@@ -0,0 +1,229 @@
+# analytics/var.py
+import numpy as np
+from analytics.simulation import DEFAULT_CHUNK_SIZE, cholesky_factor
+
+
+VAR_METHODS = ('monte-carlo', 'historical', 'parametric')
+SAMPLING_METHODS = ('pseudo', 'antithetic', 'sobol')
+
+# Monte Carlo scenarios are drawn in batches of this size; the spread of the
+# per-batch VaR estimates gives the standard error
+VAR_BATCH_SIZE = 2 ** 13
+# Batches needed before the standard error is trusted to stop a simulation
+MIN_VAR_BATCHES = 8
+
+
+def simulate_var(mean_returns, cov_matrix, weights, portfolio_value, days, simulations,
+                 confidence_interval=0.95, seed=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Monte Carlo VaR from correlated per-asset normal returns.
+
+    ``mean_returns`` and ``cov_matrix`` are daily; the horizon drift scales with
+    ``days`` and the shocks with ``sqrt(days)``. Returns a dict with the VaR, the
+    Expected Shortfall, each asset's contribution to the Expected Shortfall and
+    the simulated portfolio gains/losses. ``progress`` is called with the fraction
+    of scenarios drawn so far.
+    """
+    result = simulate_var_grid(mean_returns, [cov_matrix], weights, portfolio_value, [days], [confidence_interval],
+                               simulations, seed=seed, chunk_size=chunk_size, progress=progress)
+    return {**result['grid'][0], 'scenario_pnl': result['scenario_pnl'][0]}
+
+
+def simulate_var_grid(mean_returns, cov_matrices, weights, portfolio_value, horizons, confidence_levels, simulations,
+                      seed=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, sampling='pseudo',
+                      control_variate=False, max_standard_error=None):
+    """Monte Carlo VaR for every horizon and confidence level from one set of shocks.
+
+    ``cov_matrices`` holds the daily covariance used for each horizon (the same
+    matrix unless volatility is forecast per horizon). Every horizon reuses the
+    same standard normal draws, so a grid costs one simulation. Returns ``grid``,
+    a list of dicts with ``days``, ``confidence``, ``var``, ``standard_error``
+    (None when a single batch was drawn), ``expected_shortfall`` and
+    ``contributions`` in horizon-major order, ``scenario_pnl``, the simulated
+    gains/losses of each horizon, and ``simulations``, the number of scenarios
+    drawn.
+
+    Shocks are drawn in independently seeded batches (``sampling`` is one of
+    SAMPLING_METHODS; Sobol batches are independently scrambled), and a VaR's
+    standard error is the spread of the per-batch estimates. ``control_variate``
+    uses the portfolio's known P&L mean and standard deviation as controls,
+    rescaling the scenarios so their sample moments match. With
+    ``max_standard_error`` batches stop as soon as every VaR's standard error
+    is below it, and ``simulations`` is only the cap.
+    """
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Sampling must be one of: {', '.join(SAMPLING_METHODS)}")
+    mean_returns = np.asarray(mean_returns, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    confidence_levels = np.asarray(confidence_levels, dtype=float)
+    factors = [cholesky_factor(cov_matrix) for cov_matrix in cov_matrices]
+
+    exposure = portfolio_value * weights
+    scales = np.sqrt(np.asarray(horizons, dtype=float))
+    # Portfolio P&L is linear in the shocks, so each scenario only needs z @ (L.T @ exposure) per horizon
+    loadings = np.column_stack([scale * (factor.T @ exposure) for scale, factor in zip(scales, factors)])
+    expected_pnl = (exposure @ mean_returns) * np.asarray(horizons, dtype=float)
+    pnl_volatility = np.sqrt((loadings ** 2).sum(axis=0))
+    percentiles = 100 * (1 - confidence_levels)
+
+    simulations = max(int(simulations), 1)
+    batch_size = min(int(chunk_size), VAR_BATCH_SIZE)
+    if sampling == 'sobol':
+        # Sobol points are balanced in blocks of powers of two
+        batch_size = 2 ** int(np.log2(max(batch_size, 2)))
+    else:
+        # Equal batches adding up to (about) ``simulations``
+        batch_size = -(-simulations // -(-simulations // batch_size))
+        if sampling == 'antithetic':
+            batch_size += batch_size % 2
+    batch_seeds = np.random.SeedSequence(seed).spawn(max(1, -(-simulations // batch_size)))
+
+    batches = []
+    batch_var = []
+    shock_sum = np.zeros(len(weights))
+    for seed_sequence in batch_seeds:
+        z = _draw_shocks(sampling, seed_sequence, batch_size, len(weights))
+        shock_sum += z.sum(axis=0)
+        pnl = expected_pnl + z @ loadings
+        batches.append(pnl)
+        if control_variate:
+            pnl = _match_moments(pnl, expected_pnl, pnl_volatility)
+        # (horizons, confidence levels)
+        batch_var.append(-np.percentile(pnl, percentiles, axis=0).T)
+        if progress:
+            progress(min(len(batches) * batch_size / simulations, 1.0))
+        if (max_standard_error is not None and len(batches) >= MIN_VAR_BATCHES
+                and (_standard_error(batch_var) <= max_standard_error).all()):
+            break
+
+    scenario_pnl = np.vstack(batches)
+    mean_shock = np.zeros(len(weights))
+    ratio = np.ones(len(horizons))
+    if control_variate:
+        # pnl' = E[pnl] + ratio * (pnl - mean(pnl)), i.e. the shocks are centered and scaled
+        mean_shock = shock_sum / len(scenario_pnl)
+        ratio = pnl_volatility / np.maximum(scenario_pnl.std(axis=0), np.finfo(float).tiny)
+        scenario_pnl = _match_moments(scenario_pnl, expected_pnl, pnl_volatility)
+    var = -np.percentile(scenario_pnl, percentiles, axis=0).T
+    # One batch has no spread to estimate the standard error from
+    standard_error = _standard_error(batch_var) if len(batches) > 1 else None
+
+    # Second pass replays the same shocks to average them over each tail
+    tail_shock_sum = np.zeros((var.size, len(weights)))
+    tail_count = np.zeros(var.size)
+    for b, seed_sequence in enumerate(batch_seeds[:len(batches)]):
+        z = _draw_shocks(sampling, seed_sequence, batch_size, len(weights))
+        pnl = scenario_pnl[b * batch_size:(b + 1) * batch_size]
+        tail = (pnl[:, :, None] <= -var).reshape(batch_size, -1)
+        tail_shock_sum += tail.T.astype(float) @ z
+        tail_count += tail.sum(axis=0)
+
+    tail_shock = (tail_shock_sum / np.maximum(tail_count, 1)[:, None]).reshape(*var.shape, len(weights))
+    grid = []
+    for h, days in enumerate(horizons):
+        for c, confidence in enumerate(confidence_levels):
+            shock = ratio[h] * (tail_shock[h, c] - mean_shock)
+            contributions = -(exposure * (mean_returns * days + scales[h] * (factors[h] @ shock)))
+            entry = _grid_entry(days, confidence, var[h, c], contributions)
+            entry['standard_error'] = float(standard_error[h, c]) if standard_error is not None else None
+            grid.append(entry)
+    return {
+        'grid': grid,
+        'scenario_pnl': [scenario_pnl[:, h] for h in range(len(horizons))],
+        'simulations': len(scenario_pnl),
+    }
+
+
+def _draw_shocks(sampling, seed_sequence, size, num_assets):
+    rng = np.random.default_rng(seed_sequence)
+    if sampling == 'antithetic':
+        half = rng.standard_normal((size // 2, num_assets))
+        return np.vstack([half, -half])
+    if sampling == 'sobol':
+        from scipy.special import ndtri
+        from scipy.stats import qmc
+
+        # An integer seed, so a batch's scrambling (and shocks) replay in the second pass
+        seed = int(seed_sequence.generate_state(1)[0])
+        points = qmc.Sobol(num_assets, scramble=True, seed=seed).random_base2(int(np.log2(size)))
+        return ndtri(np.clip(points, 1e-12, 1 - 1e-12))
+    return rng.standard_normal((size, num_assets))
+
+
+def _match_moments(pnl, expected_pnl, pnl_volatility):
+    sample_volatility = np.maximum(pnl.std(axis=0), np.finfo(float).tiny)
+    return expected_pnl + (pnl - pnl.mean(axis=0)) * (pnl_volatility / sample_volatility)
+
+
+def _standard_error(batch_estimates):
+    estimates = np.asarray(batch_estimates)
+    return estimates.std(axis=0, ddof=1) / np.sqrt(len(estimates))
+
+
+def historical_var_grid(returns, weights, portfolio_value, horizons, confidence_levels):
+    """Historical-simulation VaR over every overlapping ``days``-day window of ``returns``.
+
+    ``returns`` are daily log returns (days x assets) with NaN on days an asset
+    did not trade. Only the common history is replayed, from the first day on
+    which every asset has a return; an asset that had not listed yet would
+    otherwise count as flat and understate the risk. Later gaps (e.g. a holiday
+    on one exchange) count as flat days. P&L is linear in the window's summed
+    returns, as in the Monte Carlo model. Returns the same ``grid`` and
+    ``scenario_pnl`` as ``simulate_var_grid``.
+    """
+    returns = np.asarray(returns, dtype=float)
+    observed = ~np.isnan(returns)
+    if not observed.any(axis=0).all():
+        raise ValueError('Every asset needs some history')
+    common_start = observed.argmax(axis=0).max()
+    returns = np.nan_to_num(returns[common_start:])
+    exposure = portfolio_value * np.asarray(weights, dtype=float)
+    # Window sums are differences of the running sum
+    cumulative = np.vstack([np.zeros((1, returns.shape[1])), np.cumsum(returns, axis=0)])
+
+    grid = []
+    scenario_pnl = []
+    for days in horizons:
+        if days > len(returns):
+            raise ValueError(f'Not enough common history for a {days}-day horizon')
+        window_returns = cumulative[days:] - cumulative[:-days]
+        pnl = window_returns @ exposure
+        for confidence in confidence_levels:
+            var = -np.percentile(pnl, 100 * (1 - confidence))
+            contributions = -(exposure * window_returns[pnl <= -var].mean(axis=0))
+            grid.append(_grid_entry(days, confidence, var, contributions))
+        scenario_pnl.append(pnl)
+    return {'grid': grid, 'scenario_pnl': scenario_pnl}
+
+
+def parametric_var_grid(mean_returns, cov_matrices, weights, portfolio_value, horizons, confidence_levels):
+    """Variance-covariance (normal) VaR; contributions are the Euler allocation of the Expected Shortfall.
+
+    Has no scenarios, so ``scenario_pnl`` is None.
+    """
+    from scipy.stats import norm
+
+    mean_returns = np.asarray(mean_returns, dtype=float)
+    exposure = portfolio_value * np.asarray(weights, dtype=float)
+    grid = []
+    for days, cov_matrix in zip(horizons, cov_matrices):
+        marginal = np.asarray(cov_matrix, dtype=float) @ exposure
+        volatility = np.sqrt(max(exposure @ marginal, 0.0))
+        # d(volatility)/d(exposure) scaled by exposure sums to the volatility
+        risk_share = exposure * marginal / volatility if volatility > 0 else np.zeros_like(exposure)
+        for confidence in confidence_levels:
+            quantile = norm.ppf(confidence)
+            var = -(exposure @ mean_returns) * days + np.sqrt(days) * volatility * quantile
+            tail_factor = norm.pdf(quantile) / (1 - confidence)
+            contributions = -exposure * mean_returns * days + np.sqrt(days) * risk_share * tail_factor
+            grid.append(_grid_entry(days, confidence, var, contributions))
+    return {'grid': grid, 'scenario_pnl': None}
+
+
+def _grid_entry(days, confidence, var, contributions):
+    return {
+        'days': int(days),
+        'confidence': float(confidence),
+        'var': float(var),
+        'expected_shortfall': float(contributions.sum()),
+        'contributions': contributions,
+    }
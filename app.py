@@ -1,32 +1,127 @@
 # app.py
-from flask import Flask
-from endpoints.optimize_portfolio import optimize_portfolio_bp
-from endpoints.monte_carlo_var import monte_carlo_var_bp
-from endpoints.add_tickers import add_tickers_bp
-from endpoints.get_tickers import get_tickers_bp
-from endpoints.remove_ticker import remove_ticker_bp
-from endpoints.update_ticker_value import update_ticker_value_bp
-from endpoints.account import account_bp
-from endpoints.day_history import day_history_bp
-from endpoints.monte_carlo_optimize import monte_carlo_optimization_bp
+import os
+import sys
+import json
+import time
+import logging
+import click
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+# Root log level; DEBUG also enables (sampled) request payload logging
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
 
-app.register_blueprint(optimize_portfolio_bp)
-app.register_blueprint(monte_carlo_var_bp)
-app.register_blueprint(add_tickers_bp)
-app.register_blueprint(get_tickers_bp)
-app.register_blueprint(remove_ticker_bp)
-app.register_blueprint(update_ticker_value_bp)
-app.register_blueprint(account_bp)
-app.register_blueprint(day_history_bp)
-app.register_blueprint(monte_carlo_optimization_bp)
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return 'OK', 200
+def create_app(preload=None):
+    """Build the Flask application.
+
+    Blueprint modules only import Flask at load time; numpy/pandas/scipy, yfinance,
+    arch and the FRED and Firestore clients are loaded on first use. Set
+    ``preload`` (or APP_PRELOAD=1) to import the analytic stack up front, and
+    APP_PRELOAD_CLIENTS=1 to also create the FRED and Firestore clients.
+    """
+    started = time.perf_counter()
+    logging.basicConfig(level=LOG_LEVEL)
+
+    from endpoints.optimize_portfolio import optimize_portfolio_bp
+    from endpoints.monte_carlo_var import monte_carlo_var_bp
+    from endpoints.add_tickers import add_tickers_bp
+    from endpoints.get_tickers import get_tickers_bp
+    from endpoints.remove_ticker import remove_ticker_bp
+    from endpoints.update_ticker_value import update_ticker_value_bp
+    from endpoints.account import account_bp
+    from endpoints.day_history import day_history_bp
+    from endpoints.monte_carlo_optimize import monte_carlo_optimization_bp
+    from endpoints.efficient_frontier import efficient_frontier_bp
+    from endpoints.jobs import jobs_bp
+    from endpoints.stream import stream_bp
+    from endpoints.bulk_valuation import bulk_valuation_bp
+    from endpoints.ticker_suggest import ticker_suggest_bp
+    from endpoints.market_data import market_data_bp
+    from endpoints.positions import positions_bp
+    from services.startup import format_report, import_report, warm_up
+    from services import instrumentation
+
+    app = Flask(__name__)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+
+    app.register_blueprint(optimize_portfolio_bp)
+    app.register_blueprint(monte_carlo_var_bp)
+    app.register_blueprint(add_tickers_bp)
+    app.register_blueprint(get_tickers_bp)
+    app.register_blueprint(remove_ticker_bp)
+    app.register_blueprint(update_ticker_value_bp)
+    app.register_blueprint(account_bp)
+    app.register_blueprint(day_history_bp)
+    app.register_blueprint(monte_carlo_optimization_bp)
+    app.register_blueprint(efficient_frontier_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(stream_bp)
+    app.register_blueprint(bulk_valuation_bp)
+    app.register_blueprint(ticker_suggest_bp)
+    app.register_blueprint(market_data_bp)
+    app.register_blueprint(positions_bp)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_duration(response):
+        # Streamed responses are timed up to their first byte
+        instrumentation.observe('http_request_duration_seconds', time.perf_counter() - g.request_started,
+                                endpoint=request.endpoint or 'unmatched', method=request.method,
+                                status=response.status_code)
+        return response
+
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        return 'OK', 200
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.cli.command('startup-report')
+    def startup_report():
+        """Print the import cost of each lazily loaded module."""
+        print(format_report(import_report()))
+
+    @app.cli.command('value-portfolios')
+    @click.option('--user-id', 'user_ids', multiple=True, help='user to value; repeatable, all users when omitted')
+    @click.option('--output', type=click.File('w'), default='-', help='NDJSON destination (stdout by default)')
+    def value_portfolios_command(user_ids, output):
+        """Value many portfolios at once and write one JSON line per user."""
+        from services.valuation import value_portfolios
+        for record in value_portfolios(list(user_ids) or None):
+            output.write(json.dumps(record) + '\n')
+
+    @app.cli.command('build-return-matrix')
+    def build_return_matrix_command():
+        """Rebuild the shared return matrix from the price store."""
+        from services.return_matrix import build
+        print(f"Return matrix v{build()}")
+
+    @app.cli.command('update-ticker-list')
+    def update_ticker_list_command():
+        """Download the list of traded symbols used for ticker suggestions."""
+        from services.ticker_index import TICKER_LIST_PATH, update_ticker_list
+        print(f"Wrote {update_ticker_list()} symbols to {TICKER_LIST_PATH}")
+
+    if preload is None:
+        preload = os.getenv('APP_PRELOAD', '0') == '1'
+    if preload:
+        warm_up(init_clients=os.getenv('APP_PRELOAD_CLIENTS', '0') == '1')
+
+    logging.info(f"App created in {time.perf_counter() - started:.3f}s (preload={preload})")
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
+    if '--startup-report' in sys.argv:
+        from services.startup import format_report, import_report
+        print(format_report(import_report()))
+        sys.exit(0)
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,240 @@
+# benchmarks/bench_kernels.py
+"""Offline micro-benchmarks for the risk and optimization kernels.
+
+Prices come from a synthetic geometric-Brownian panel (or a recorded CSV panel
+via --prices), and the endpoint benchmarks swap the price store and FRED client
+for in-memory fakes, so nothing here touches Yahoo or FRED.
+
+    python benchmarks/bench_kernels.py --output bench_results.json
+    python benchmarks/bench_kernels.py --baseline bench_results.json --output bench_new.json --max-slowdown 1.25
+"""
+import os
+import sys
+import json
+import logging
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('FRED_API_KEY', 'offline-benchmark')
+
+from analytics.optimizer import annualized_moments, optimize_weights
+from analytics.var import simulate_var
+from analytics.simulation import generate_scenarios, iter_scenarios, scenario_moments
+from analytics.cvar import min_cvar_weights
+
+
+def synthetic_panel(num_tickers, num_days, seed=0):
+    """Correlated GBM closes on business days ending yesterday."""
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 1, (3, num_tickers))
+    factors = rng.normal(0, 0.006, (num_days, 3))
+    idiosyncratic = rng.normal(0, 0.01, (num_days, num_tickers))
+    drift = rng.normal(0.0003, 0.0002, num_tickers)
+    log_returns = drift + factors @ loadings + idiosyncratic
+    end = pd.Timestamp(dt.date.today()) - pd.tseries.offsets.BDay(1)
+    index = pd.bdate_range(end=end, periods=num_days)
+    columns = [f'T{i:03d}' for i in range(num_tickers)]
+    return pd.DataFrame(100 * np.exp(np.cumsum(log_returns, axis=0)), index=index, columns=columns)
+
+
+def recorded_panel(path, num_tickers):
+    panel = pd.read_csv(path, index_col=0, parse_dates=True)
+    if num_tickers > panel.shape[1]:
+        raise ValueError(f"{path} has only {panel.shape[1]} tickers, {num_tickers} requested")
+    return panel.iloc[:, :num_tickers]
+
+
+class FakeFred:
+    def __init__(self, api_key=None):
+        pass
+
+    def get_series_latest_release(self, series_id):
+        return self.get_series(series_id)
+
+    def get_series(self, series_id, observation_start=None, **kwargs):
+        return pd.Series([4.0], index=pd.DatetimeIndex([dt.date.today()]))
+
+
+def install_fake_providers(panel):
+    """Point the price store and FRED client at in-memory fakes serving ``panel``."""
+    import fred_config
+    import services.price_store as price_store
+    import services.covariance as covariance
+    import services.return_matrix as return_matrix
+    import services.result_cache as result_cache
+    import services.instrumentation as instrumentation
+    import endpoints.optimize_portfolio as optimize_portfolio
+    import endpoints.monte_carlo_var as monte_carlo_var
+    import endpoints.monte_carlo_optimize as monte_carlo_optimize
+
+    def get_close_history(tickers, start_date, end_date=None):
+        frame = panel[[ticker for ticker in tickers if ticker in panel.columns]]
+        return frame[(frame.index >= pd.Timestamp(start_date)) & (frame.index < pd.Timestamp(end_date or dt.date.today() + dt.timedelta(days=1)))]
+
+    # The endpoints import their providers at call time, so patch them at the source
+    price_store.get_close_history = get_close_history
+    covariance.get_close_history = get_close_history
+    covariance.clear()
+    # A private matrix of the panel, built up front like the daily rebuild
+    return_matrix.get_close_history = get_close_history
+    return_matrix.stored_tickers = lambda: list(panel.columns)
+    return_matrix.RETURN_MATRIX_DIR = tempfile.mkdtemp(prefix='bench-returns-')
+    return_matrix.build()
+    return_matrix._current = None
+    fred_config._fred = FakeFred()
+    # Time the computations rather than the result memo
+    result_cache.RESULT_CACHE_SIZE = 0
+    # Metric snapshots stay out of the working tree
+    instrumentation.METRICS_DIR = tempfile.mkdtemp(prefix='bench-metrics-')
+    return optimize_portfolio, monte_carlo_var, monte_carlo_optimize
+
+
+def timed(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_benchmarks(ticker_counts, scenario_counts, num_days, repeat, prices=None):
+    results = []
+
+    def record(name, params, durations):
+        results.append({
+            'name': name,
+            'params': params,
+            'repeat': len(durations),
+            'min_s': min(durations),
+            'median_s': statistics.median(durations),
+        })
+        print(f"{name:<32} {json.dumps(params):<45} median {statistics.median(durations) * 1000:10.2f} ms")
+
+    for num_tickers in ticker_counts:
+        panel = recorded_panel(prices, num_tickers) if prices else synthetic_panel(num_tickers, num_days)
+        tickers = list(panel.columns)
+        params = {'tickers': num_tickers, 'days': len(panel)}
+
+        log_returns = np.log(panel / panel.shift(1)).dropna()
+        record('returns_covariance', params, timed(
+            lambda: annualized_moments(np.log(panel / panel.shift(1)).dropna()), repeat))
+
+        mean_returns, cov_matrix = annualized_moments(log_returns)
+        record('optimize_sharpe_slsqp', params, timed(
+            lambda: optimize_weights(mean_returns, cov_matrix, 'sharpe', 0.04), repeat))
+
+        daily_mean = log_returns.mean().values
+        daily_cov = log_returns.cov().values
+        weights = np.full(num_tickers, 1 / num_tickers)
+        for num_scenarios in scenario_counts:
+            scenario_params = {**params, 'scenarios': num_scenarios}
+            record('var_simulation', scenario_params, timed(
+                lambda: simulate_var(daily_mean, daily_cov, weights, 10000, 5, num_scenarios, 0.95, seed=1), repeat))
+            record('scenario_moments_sharpe', scenario_params, timed(
+                lambda: optimize_weights(*scenario_moments(
+                    chunk for _, chunk in iter_scenarios(daily_mean, daily_cov, num_scenarios, 1)), 'sharpe', 0.0), repeat))
+            record('scenario_cvar', scenario_params, timed(
+                lambda: min_cvar_weights(generate_scenarios(daily_mean, daily_cov, num_scenarios, 1)), repeat))
+
+        # Whole request handlers with in-memory providers
+        optimize_portfolio, monte_carlo_var, monte_carlo_optimize = install_fake_providers(panel)
+        years = max(1, len(panel) // 252)
+
+        from services.covariance import get_moments
+        subset = tickers[:max(2, num_tickers // 2)]
+        get_moments(tickers, years=years)
+        for estimator in ('sample', 'ledoit-wolf'):
+            record(f'covariance_engine_{estimator}', {**params, 'subset': len(subset)}, timed(
+                lambda: get_moments(subset, years=years, estimator=estimator), repeat))
+        record('endpoint_optimize_portfolio', params, timed(
+            lambda: optimize_portfolio.run_optimize_portfolio(
+                {'tickers': tickers, 'weights': [1] * num_tickers, 'years': years}), repeat))
+        record('endpoint_monte_carlo_var', {**params, 'scenarios': 100000}, timed(
+            lambda: monte_carlo_var.run_monte_carlo_var(
+                {'tickers': tickers, 'years': years, 'simulations': 100000, 'seed': 1, 'output': 'summary'}), repeat))
+        record('endpoint_monte_carlo_optimize', {**params, 'scenarios': 100000}, timed(
+            lambda: monte_carlo_optimize.run_monte_carlo_optimization({
+                'ticker_weights': [{'ticker': ticker, 'weight': 1} for ticker in tickers],
+                'start_date': panel.index[0].strftime('%Y-%m-%d'),
+                'end_date': (panel.index[-1] + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+                'num_scenarios': 100000,
+                'seed': 1}), repeat))
+
+    return results
+
+
+def load_baseline(baseline_path):
+    with open(baseline_path) as f:
+        return {(entry['name'], json.dumps(entry['params'], sort_keys=True)): entry
+                for entry in json.load(f)['results']}
+
+
+def compare(results, baseline, max_slowdown):
+    """Return the benchmarks whose median is more than ``max_slowdown`` times the ``load_baseline`` entry."""
+    regressions = []
+    for entry in results:
+        previous = baseline.get((entry['name'], json.dumps(entry['params'], sort_keys=True)))
+        if previous and entry['median_s'] > previous['median_s'] * max_slowdown:
+            regressions.append({**entry, 'baseline_median_s': previous['median_s']})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', default='5,50,200', help='comma-separated ticker counts')
+    parser.add_argument('--scenarios', default='10000,100000', help='comma-separated scenario counts')
+    parser.add_argument('--days', type=int, default=252 * 15, help='trading days in the synthetic panel')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--prices', help='recorded panel CSV: date index, one close column per ticker')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous results JSON to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=1.25)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        # Writing the results over the baseline would compare them with themselves
+        if os.path.realpath(args.baseline) == os.path.realpath(args.output):
+            parser.error('--output must not be the --baseline file')
+        baseline = load_baseline(args.baseline)
+
+    logging.basicConfig(level=os.getenv('BENCH_LOG_LEVEL', 'WARNING'))
+
+    results = run_benchmarks(
+        [int(count) for count in args.tickers.split(',')],
+        [int(count) for count in args.scenarios.split(',')],
+        args.days,
+        args.repeat,
+        args.prices,
+    )
+    report = {
+        'created_at': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.max_slowdown)
+        for entry in regressions:
+            print(f"REGRESSION {entry['name']} {json.dumps(entry['params'])}: "
+                  f"{entry['baseline_median_s'] * 1000:.2f} ms -> {entry['median_s'] * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
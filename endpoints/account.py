@@ -1,36 +1,26 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from firebase_config import db
-import yfinance as yf
+from services.portfolio_repository import delete_portfolio, get_portfolio, update_portfolio
+from services.quotes import get_last_prices
+from services.positions import position_list, replacement_fields
+from services.instrumentation import log_payload
 import logging
 from datetime import datetime
 
-logging.basicConfig(level=logging.DEBUG)
-
 account_bp = Blueprint('account', __name__)
 
 @account_bp.route('/api/v1/account/<user_id>', methods=['GET'])
 @cross_origin()
 def get_account(user_id):
     try:
-        user_collection_ref = db.collection(f'portfolios_{user_id}')
-        owned = None
-        tickers = []
-        first_name = ""
-        last_name = ""
-        state_of_residence = ""
-        start_date = None
-        doc_id = None
-        
-        for doc in user_collection_ref.stream():
-            doc_data = doc.to_dict()
-            tickers.extend(doc_data.get('tickers', []))
-            owned = doc_data.get('owned', None)
-            first_name = doc_data.get('first_name', "")
-            last_name = doc_data.get('last_name', "")
-            state_of_residence = doc_data.get('state_of_residence', "")
-            start_date = doc_data.get('start_date', None)
-            doc_id = doc.id
+        portfolio = get_portfolio(user_id)
+        doc_data = portfolio or {}
+        tickers = position_list(doc_data)
+        owned = doc_data.get('owned', None)
+        first_name = doc_data.get('first_name', "")
+        last_name = doc_data.get('last_name', "")
+        state_of_residence = doc_data.get('state_of_residence', "")
+        start_date = doc_data.get('start_date', None)
 
         if start_date:
             start_date = datetime.strptime(start_date, '%Y-%m-%d')
@@ -38,28 +28,26 @@ def get_account(user_id):
         else:
             years_owned = 0
 
-        # Update the years_owned field in Firestore
-        if doc_id:
-            doc_ref = user_collection_ref.document(doc_id)
-            doc_ref.update({'years_owned': years_owned})
+        # Update the years_owned field in Firestore only when it has changed
+        if portfolio is not None and doc_data.get('years_owned') != years_owned:
+            update_portfolio(user_id, {'years_owned': years_owned})
 
         total_portfolio_value = 0
         ticker_values = {}
+        prices = get_last_prices([ticker['ticker'] for ticker in tickers])
 
         for ticker in tickers:
             stock_ticker = ticker['ticker']
             shares = ticker['value']
-            stock_data = yf.Ticker(stock_ticker)
-            stock_price = stock_data.history(period='1d')['Close'].iloc[-1]
-            ticker_value = shares * stock_price
+            ticker_value = shares * prices[stock_ticker]
             ticker_values[stock_ticker] = ticker_value
             total_portfolio_value += ticker_value
 
         ticker_percentages = [{'ticker': ticker, 'percentage': (value / total_portfolio_value) * 100} for ticker, value in ticker_values.items()]
 
-        logging.debug(f"Retrieved tickers for user_id {user_id}: {tickers}")
+        log_payload(f"Retrieved tickers for user_id {user_id}", tickers)
         logging.debug(f"Total portfolio value for user_id {user_id}: {total_portfolio_value}")
-        logging.debug(f"Ticker percentages for user_id {user_id}: {ticker_percentages}")
+        log_payload(f"Ticker percentages for user_id {user_id}", ticker_percentages)
 
         return jsonify({
             'tickers': tickers,
@@ -80,25 +68,22 @@ def get_account(user_id):
 def update_account(user_id):
     try:
         data = request.json
-        logging.debug(f"Received data for updating account: {data}")
+        log_payload('Received data for updating account', data)
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        user_collection_ref = db.collection(f'portfolios_{user_id}')
-        docs = user_collection_ref.stream()
-        doc_id = None
-        
-        for doc in docs:
-            doc_id = doc.id
-            break
-        
-        if doc_id:
-            doc_ref = user_collection_ref.document(doc_id)
-            if 'years_owned' in data:
-                del data['years_owned']  # Remove years_owned from the data if present
-            doc_ref.update(data)
-            logging.debug(f"Updated account for user_id {user_id} with data {data}")
+        if 'years_owned' in data:
+            del data['years_owned']  # Remove years_owned from the data if present
+
+        # Positions change only through versioned updates; a tickers list replaces them all
+        data.pop('positions', None)
+        data.pop('positions_version', None)
+        if 'tickers' in data:
+            data.update(replacement_fields(data.pop('tickers')))
+
+        if update_portfolio(user_id, data):
+            log_payload(f"Updated account for user_id {user_id} with data", data)
             return jsonify({'message': 'Account updated successfully'}), 200
         else:
             return jsonify({'error': 'No document found for the user'}), 400
@@ -114,17 +99,7 @@ def set_status(user_id):
 @cross_origin()
 def delete_account(user_id):
     try:
-        user_collection_ref = db.collection(f'portfolios_{user_id}')
-        docs = user_collection_ref.stream()
-        doc_id = None
-        
-        for doc in docs:
-            doc_id = doc.id
-            break
-        
-        if doc_id:
-            doc_ref = user_collection_ref.document(doc_id)
-            doc_ref.delete()
+        if delete_portfolio(user_id):
             logging.debug(f"Deleted account for user_id {user_id}")
             return jsonify({'message': 'Account deleted successfully'}), 200
         else:
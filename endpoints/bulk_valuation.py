@@ -0,0 +1,53 @@
+# endpoints/bulk_valuation.py
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_cors import cross_origin
+import os
+import hmac
+import json
+import logging
+
+bulk_valuation_bp = Blueprint('bulk_valuation', __name__)
+
+# Valuing every user over HTTP needs `Authorization: Bearer <token>`; without a
+# token configured it is only available through `flask value-portfolios`
+BULK_VALUATION_TOKEN = os.getenv('BULK_VALUATION_TOKEN')
+
+
+def _authorized():
+    header = request.headers.get('Authorization', '')
+    if not BULK_VALUATION_TOKEN or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[len('Bearer '):].encode(), BULK_VALUATION_TOKEN.encode())
+
+@bulk_valuation_bp.route('/api/v1/valuations/bulk', methods=['POST'])
+@cross_origin()
+def bulk_valuation():
+    data = request.json or {}
+    user_ids = data.get('user_ids')
+    all_users = bool(data.get('all_users', False))
+
+    if all_users == (user_ids is not None):
+        return jsonify({'error': 'Provide either user_ids or all_users'}), 400
+    if user_ids is not None and (not isinstance(user_ids, list) or not all(isinstance(user_id, str) for user_id in user_ids)):
+        return jsonify({'error': 'user_ids must be a list of strings'}), 400
+    if all_users and not BULK_VALUATION_TOKEN:
+        return jsonify({'error': 'Valuing all users is only available through flask value-portfolios'}), 403
+    if all_users and not _authorized():
+        logging.warning(f"Rejected all_users bulk valuation from {request.remote_addr}")
+        return jsonify({'error': 'A valid bearer token is required for all_users'}), 401
+
+    from services.valuation import value_portfolios
+
+    def lines():
+        count = 0
+        try:
+            for record in value_portfolios(user_ids):
+                count += 1
+                yield json.dumps(record) + '\n'
+        except Exception as e:
+            # Headers are already sent, so the failure is reported as the last line
+            logging.error(f"Error in bulk valuation after {count} portfolios: {e}")
+            yield json.dumps({'error': str(e)}) + '\n'
+        logging.debug(f"Bulk valuation streamed {count} portfolios")
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
@@ -1,13 +1,10 @@
 # endpoints/day_history.py
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from firebase_config import db
-import yfinance as yf
-import pandas as pd
+from services.portfolio_repository import get_portfolio
+from services.positions import positions
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
-
 day_history_bp = Blueprint('day_history', __name__)
 
 @day_history_bp.route('/api/v1/day-history/<user_id>', methods=['GET'])
@@ -17,37 +14,22 @@ def day_history(user_id):
         return jsonify({'error': 'User ID is required'}), 400
 
     try:
-        # Access the user's collection
-        user_collection_ref = db.collection(f'portfolios_{user_id}')
-        tickers = []
-        for doc in user_collection_ref.stream():
-            tickers.extend(doc.to_dict().get('tickers', []))
-
-        if not tickers:
-            return jsonify({'error': 'No tickers found for the user'}), 404
+        from services.intraday import portfolio_intraday_values
 
-        # Fetch the day history for each ticker
-        portfolio_history = pd.DataFrame()
-        weights = {}
-        for ticker in tickers:
-            stock_ticker = ticker['ticker']
-            shares = ticker['value']
-            stock_data = yf.Ticker(stock_ticker)
-            history = stock_data.history(period='1d', interval='15m')  # Fetch 15-minute interval data for the last day
-            portfolio_history[stock_ticker] = history['Close']
-            weights[stock_ticker] = shares
+        portfolio = get_portfolio(user_id) or {}
+        holdings = {ticker: float(value) for ticker, value in positions(portfolio).items()}
 
-        # Calculate the total portfolio value at each time point
-        for ticker, shares in weights.items():
-            portfolio_history[ticker] *= shares
+        if not holdings:
+            return jsonify({'error': 'No tickers found for the user'}), 404
 
-        portfolio_performance = portfolio_history.sum(axis=1)
+        # Bars of the latest session from the shared intraday cache
+        portfolio_performance = portfolio_intraday_values(holdings)
 
         # Convert the index (timestamps) to strings for JSON serialization
         portfolio_performance.index = portfolio_performance.index.astype(str)
 
         # Calculate the total portfolio value at the end of the day
-        total_portfolio_value = portfolio_performance.iloc[-1]
+        total_portfolio_value = float(portfolio_performance.iloc[-1])
 
         logging.debug(f"Retrieved day history for user_id {user_id}")
         return jsonify({
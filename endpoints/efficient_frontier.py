@@ -0,0 +1,108 @@
+# endpoints/efficient_frontier.py
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from werkzeug.exceptions import BadRequest
+from dotenv import load_dotenv
+import logging
+from services.rates import get_risk_free_rate
+from services.instrumentation import log_payload, span
+
+load_dotenv()
+
+efficient_frontier_bp = Blueprint('efficient_frontier', __name__)
+
+MAX_FRONTIER_POINTS = 200
+
+
+@efficient_frontier_bp.route('/api/v1/efficient-frontier', methods=['POST'])
+@cross_origin()
+def get_efficient_frontier():
+    data = request.json
+    log_payload('Received data', data)
+
+    try:
+        result = run_efficient_frontier(data)
+        with span('serialize'):
+            return jsonify(result)
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+    except Exception as e:
+        logging.error(f"Error computing efficient frontier: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def run_efficient_frontier(data, progress=None):
+    """Frontier points for the request payload; also runs inside job workers."""
+    from services.covariance import get_moments
+    from analytics.covariance import ESTIMATORS
+    from analytics.optimizer import (
+        TRADING_DAYS,
+        efficient_frontier,
+        optimize_weights,
+        portfolio_return,
+        portfolio_volatility,
+        sharpe_ratio,
+    )
+
+    tickers = data.get('tickers', [])
+    if not isinstance(tickers, list) or not tickers or not all(isinstance(ticker, str) for ticker in tickers):
+        raise BadRequest('Tickers data must be a non-empty list of strings')
+    tickers = list(dict.fromkeys(tickers))
+
+    try:
+        years = int(data.get('years', 30))
+        points = int(data.get('points', 20))
+        max_weight = float(data.get('max_weight', 1))
+    except (TypeError, ValueError):
+        raise BadRequest('Years, points and max_weight must be numbers')
+    cov_estimator = data.get('cov_estimator', 'sample')
+
+    if cov_estimator not in ESTIMATORS:
+        raise BadRequest(f"Covariance estimator must be one of: {', '.join(ESTIMATORS)}")
+
+    if not 2 <= points <= MAX_FRONTIER_POINTS:
+        raise BadRequest(f'Points must be between 2 and {MAX_FRONTIER_POINTS}')
+    if max_weight * len(tickers) < 1:
+        raise BadRequest('max_weight is too small for the weights to sum to 1')
+
+    risk_free_rate = data.get('risk_free_rate')
+    if risk_free_rate is not None:
+        try:
+            risk_free_rate = float(risk_free_rate)
+        except (TypeError, ValueError):
+            raise BadRequest('risk_free_rate must be a number')
+
+    # Build the moments once; every frontier point is solved from the same arrays
+    try:
+        tickers, mean_returns, cov_matrix = get_moments(tickers, years=years, estimator=cov_estimator)
+    except ValueError as e:
+        raise BadRequest(str(e))
+    # Tickers without history are dropped, which can leave too few for max_weight
+    if max_weight * len(tickers) < 1:
+        raise BadRequest(f'max_weight is too small for the weights of the {len(tickers)} tickers with data to sum to 1')
+    mean_returns, cov_matrix = mean_returns * TRADING_DAYS, cov_matrix * TRADING_DAYS
+    if progress:
+        progress(0.3)
+
+    if risk_free_rate is None:
+        risk_free_rate = float(get_risk_free_rate())
+
+    bounds = (0, max_weight)
+    with span('optimizer'):
+        frontier = efficient_frontier(mean_returns, cov_matrix, points, bounds)
+        max_sharpe = optimize_weights(mean_returns, cov_matrix, 'sharpe', risk_free_rate, bounds=bounds).x
+
+    def describe(weights):
+        return {
+            'weights': dict(zip(tickers, weights.tolist())),
+            'return': portfolio_return(weights, mean_returns),
+            'volatility': portfolio_volatility(weights, cov_matrix),
+            'sharpe_ratio': sharpe_ratio(weights, mean_returns, cov_matrix, risk_free_rate)
+        }
+
+    return {
+        'tickers': tickers,
+        'risk_free_rate': risk_free_rate,
+        'frontier': [describe(weights) for weights in frontier],
+        'max_sharpe': describe(max_sharpe)
+    }
@@ -1,11 +1,11 @@
 # endpoints/get_tickers.py
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from firebase_config import db
+from services.portfolio_repository import get_portfolio
+from services.positions import position_list
 import logging
-import yfinance as yf
-
-logging.basicConfig(level=logging.DEBUG)
+from services.quotes import get_last_prices
+from services.instrumentation import log_payload
 
 get_tickers_bp = Blueprint('get_tickers', __name__)
 
@@ -17,22 +17,16 @@ def get_tickers():
         return jsonify({'error': 'User ID is required'}), 400
 
     try:
-        # Access the user's collection
-        user_collection_ref = db.collection(f'portfolios_{user_id}')
-        tickers = []
-        for doc in user_collection_ref.stream():
-            tickers.extend(doc.to_dict().get('tickers', []))
+        portfolio = get_portfolio(user_id) or {}
+        tickers = position_list(portfolio)
 
-        # Fetch the latest stock prices
+        # Fetch the latest stock prices in one batched, cached call
+        prices = get_last_prices([ticker['ticker'] for ticker in tickers])
         total_portfolio_value = 0
         for ticker in tickers:
-            stock_ticker = ticker['ticker']
-            shares = ticker['value']
-            stock_data = yf.Ticker(stock_ticker)
-            stock_price = stock_data.history(period='1d')['Close'].iloc[-1]
-            total_portfolio_value += shares * stock_price
+            total_portfolio_value += ticker['value'] * prices[ticker['ticker']]
 
-        logging.debug(f"Retrieved tickers for user_id {user_id}: {tickers}")
+        log_payload(f"Retrieved tickers for user_id {user_id}", tickers)
         logging.debug(f"Total portfolio value for user_id {user_id}: {total_portfolio_value}")
         return jsonify({'tickers': tickers, 'total_portfolio_value': total_portfolio_value}), 200
     except Exception as e:
@@ -0,0 +1,40 @@
+# endpoints/jobs.py
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from services.jobs import JOB_KINDS, get_job, submit_job
+import logging
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/api/v1/jobs/<kind>', methods=['POST'])
+@cross_origin()
+def create_job(kind):
+    data = request.json
+    logging.debug(f"Received job request for {kind}")
+
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f"Job kind must be one of: {', '.join(JOB_KINDS)}"}), 404
+
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Job payload must be a JSON object'}), 400
+
+    try:
+        job_id = submit_job(kind, data)
+    except Exception as e:
+        logging.error(f"Error queueing job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/api/v1/jobs/{job_id}'}), 202
+
+@jobs_bp.route('/api/v1/jobs/<job_id>', methods=['GET'])
+@cross_origin()
+def job_status(job_id):
+    try:
+        job = get_job(job_id)
+    except Exception as e:
+        logging.error(f"Error retrieving job {job_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job), 200
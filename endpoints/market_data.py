@@ -0,0 +1,12 @@
+# endpoints/market_data.py
+from flask import Blueprint, jsonify
+from flask_cors import cross_origin
+from services.single_flight import stats
+
+market_data_bp = Blueprint('market_data', __name__)
+
+@market_data_bp.route('/api/v1/market-data/stats', methods=['GET'])
+@cross_origin()
+def market_data_stats():
+    # Ticker downloads this worker ran, and how many requests shared another's download
+    return jsonify({'single_flight': stats()}), 200
@@ -1,170 +1,190 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_cors import cross_origin
-import numpy as np
-import pandas as pd
-import yfinance as yf
-from scipy.optimize import minimize
+from werkzeug.exceptions import BadRequest
 import logging
-from arch import arch_model  # For GARCH modeling
-from fredapi import Fred  # For macroeconomic data
-from multiprocessing import Pool  # For parallel processing
-import os
 from dotenv import load_dotenv
+from services.rates import get_risk_free_rate
+from services.result_cache import cached, result_key
+from services.instrumentation import log_payload, span
 
 load_dotenv()
-logging.basicConfig(level=logging.DEBUG)
-
 monte_carlo_optimization_bp = Blueprint('monte_carlo_optimization', __name__)
 
-# Initialize FRED API
-fred_api_key = os.getenv('FRED_API_KEY')
-fred = Fred(api_key=fred_api_key)
+OPTIMIZATION_MODES = ('moments', 'cvar')
 
 @monte_carlo_optimization_bp.route('/api/v1/optimize/monte-carlo', methods=['POST'])
 @cross_origin()
 def monte_carlo_optimization():
     data = request.json
-    logging.debug(f"Received data: {data}")
+    log_payload('Received data', data)
+
+    try:
+        params = monte_carlo_request(data)
+        # Only a seeded simulation is reproducible, so only then can it be memoized and revalidated
+        etag = result_key('monte-carlo-optimize', params) if params['seed'] is not None else None
+        if etag is not None and request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            result = monte_carlo_result(params)
+            with span('serialize'):
+                response = jsonify(result)
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+    except Exception as e:
+        logging.error(f"Error in optimization: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def run_monte_carlo_optimization(data, progress=None):
+    """Scenario-optimized weights for the request payload; also runs inside job workers."""
+    return monte_carlo_result(monte_carlo_request(data), progress)
+
+
+def monte_carlo_request(data):
+    """Validate the payload into canonical parameters.
+
+    Positive weights of duplicate tickers are summed and the tickers sorted, so
+    the same basket listed differently maps to the same parameters.
+    """
+    from analytics.covariance import ESTIMATORS
+    from analytics.simulation import DEFAULT_CHUNK_SIZE
+    from services.volatility import VOL_MODELS
 
     ticker_weights = data.get('ticker_weights', [])
     start_date = data.get('start_date', '2020-01-01')
     end_date = data.get('end_date', '2023-01-01')
-    num_scenarios = int(data.get('num_scenarios', 1000))
-    risk_free_rate = float(data.get('risk_free_rate', 0.02))
+    mode = data.get('mode', 'moments')
+    cvar_confidence = float(data.get('cvar_confidence', 0.95))
+    seed = data.get('seed')
+    seed = int(seed) if seed is not None else None
+    vol_model = data.get('vol_model', 'historical')
+    cov_estimator = data.get('cov_estimator', 'sample')
 
     if not ticker_weights:
-        return jsonify({'error': 'Ticker weights are required'}), 400
-
-    def fetch_historical_data(tickers, start_date, end_date):
-        valid_tickers = []
-        for ticker in tickers:
-            try:
-                data = yf.download(ticker, start=start_date, end=end_date, progress=False)
-                if not data.empty:
-                    valid_tickers.append(ticker)
-            except Exception as e:
-                logging.error(f"Error fetching data for {ticker}: {e}")
-        
-        if not valid_tickers:
-            raise ValueError("No valid tickers found.")
-        
-        data = yf.download(valid_tickers, start=start_date, end=end_date)['Close']
-        return data
-
-    def calculate_returns(data):
-        returns = data.pct_change().dropna()
-        return returns
-
-    def fetch_macroeconomic_data():
-        # Fetch risk-free rate (10-year Treasury yield) from FRED
-        risk_free_rate = fred.get_series('DGS10').iloc[-1] / 100
-        logging.debug(f"Fetched risk-free rate: {risk_free_rate}")
-        return risk_free_rate
-
-    def fit_garch_model(returns):
-        # Fit a GARCH(1,1) model to the returns
-        model = arch_model(returns, vol='Garch', p=1, q=1)
-        fitted_model = model.fit(disp='off')
-        return fitted_model
-
-    def generate_stochastic_scenarios(returns, num_scenarios=1000):
-        mean_returns = returns.mean()
-        cov_matrix = returns.cov()
-
-        # Ensure covariance matrix is positive semi-definite
-        if not np.all(np.linalg.eigvals(cov_matrix) >= 0):
-            cov_matrix = nearest_positive_semi_definite(cov_matrix)
-
-        simulated_returns = np.random.multivariate_normal(mean_returns, cov_matrix, num_scenarios)
-        return simulated_returns
-
-    def nearest_positive_semi_definite(matrix):
-        from scipy.linalg import sqrtm
-        sym_matrix = (matrix + matrix.T) / 2
-        eigvals, eigvecs = np.linalg.eig(sym_matrix)
-        eigvals[eigvals < 0] = 0
-        return eigvecs @ np.diag(eigvals) @ eigvecs.T
-
-    def objective_function(weights, simulated_returns, risk_free_rate):
-        portfolio_returns = np.dot(simulated_returns, weights)
-        portfolio_mean_return = np.mean(portfolio_returns)
-        portfolio_std = np.std(portfolio_returns)
-        sharpe_ratio = (portfolio_mean_return - risk_free_rate) / portfolio_std
-        return -sharpe_ratio
-    
-    def validate_and_normalize_weights(ticker_weights):
-        valid_tickers = []
-        valid_weights = []
-        total_weight = 0
-
-        for item in ticker_weights:
-            ticker = item['ticker']
-            weight = item['weight']
-            if isinstance(weight, (int, float)) and weight > 0:
-                valid_tickers.append(ticker)
-                valid_weights.append(weight)
-                total_weight += weight
-
-        if not valid_tickers:
-            raise ValueError("No valid tickers or weights found.")
-
-        # Normalize weights
-        normalized_weights = [weight / total_weight for weight in valid_weights]
-
-        return valid_tickers, normalized_weights
-
-    def optimize_portfolio(ticker_weights, start_date, end_date, num_scenarios=1000, risk_free_rate=0.02):
-        # Validate and normalize weights
-        tickers, initial_weights = validate_and_normalize_weights(ticker_weights)
-
-        # Fetch historical data
-        historical_data = fetch_historical_data(tickers, start_date, end_date)
-        if historical_data.empty:
-            raise ValueError("No historical data found for the given tickers.")
-
-        # Calculate returns
-        returns = calculate_returns(historical_data)
-        if returns.empty:
-            raise ValueError("No returns calculated for the given tickers.")
-
-        # Generate stochastic scenarios
-        simulated_returns = generate_stochastic_scenarios(returns, num_scenarios)
-
-        # Optimize portfolio
-        constraints = ({'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
-        bounds = tuple((0, 1) for _ in range(len(tickers)))
-        result = minimize(
-            objective_function,
-            initial_weights,
-            args=(simulated_returns, risk_free_rate),
-            method='SLSQP',
-            bounds=bounds,
-            constraints=constraints
-        )
-
-        # Extract optimized weights
-        optimized_weights = result.x
-
-        # Calculate portfolio performance metrics
-        portfolio_returns = np.dot(simulated_returns, optimized_weights)
-        portfolio_mean_return = np.mean(portfolio_returns)
-        portfolio_std = np.std(portfolio_returns)
-        sharpe_ratio = (portfolio_mean_return - risk_free_rate) / portfolio_std
-
-        return {
-            'optimized_weights': dict(zip(tickers, optimized_weights)),
-            'mean_return': portfolio_mean_return,
-            'std_dev': portfolio_std,
-            'sharpe_ratio': sharpe_ratio
-        }
+        raise BadRequest('Ticker weights are required')
 
     try:
-        # Fetch macroeconomic data (e.g., risk-free rate)
-        risk_free_rate = fetch_macroeconomic_data()
+        num_scenarios = int(data.get('num_scenarios', 1000))
+        chunk_size = int(data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError):
+        raise BadRequest('num_scenarios and chunk_size must be integers')
+    if num_scenarios < 1 or chunk_size < 1:
+        raise BadRequest('num_scenarios and chunk_size must be at least 1')
+
+    if mode not in OPTIMIZATION_MODES:
+        raise BadRequest(f"Mode must be one of: {', '.join(OPTIMIZATION_MODES)}")
+
+    if vol_model not in VOL_MODELS:
+        raise BadRequest(f"Volatility model must be one of: {', '.join(VOL_MODELS)}")
+
+    if cov_estimator not in ESTIMATORS:
+        raise BadRequest(f"Covariance estimator must be one of: {', '.join(ESTIMATORS)}")
+
+    weights = {}
+    for item in ticker_weights:
+        ticker = item['ticker']
+        weight = item['weight']
+        if isinstance(weight, (int, float)) and weight > 0:
+            weights[ticker] = weights.get(ticker, 0) + weight
+
+    if not weights:
+        raise ValueError("No valid tickers or weights found.")
+
+    # Normalize weights
+    total_weight = sum(weights.values())
+    tickers = sorted(weights)
+
+    return {
+        'tickers': tickers,
+        'weights': [round(weights[ticker] / total_weight, 12) for ticker in tickers],
+        'start_date': start_date,
+        'end_date': end_date,
+        'num_scenarios': num_scenarios,
+        'mode': mode,
+        'cvar_confidence': cvar_confidence,
+        'seed': seed,
+        'chunk_size': chunk_size,
+        'vol_model': vol_model,
+        'cov_estimator': cov_estimator,
+        # Risk-free rate (10-year Treasury yield by default) from the shared rate cache
+        'risk_free_rate': get_risk_free_rate(),
+    }
+
+
+def monte_carlo_result(params, progress=None):
+    if params['seed'] is None:
+        return _optimize_portfolio(params, progress)
+    return cached(result_key('monte-carlo-optimize', params), lambda: _optimize_portfolio(params, progress))
+
+
+def _optimize_portfolio(params, progress=None):
+    from services.covariance import get_moments, get_returns
+    from analytics.covariance import correlation_matrix
+    from analytics.simulation import generate_scenarios, iter_scenarios, scenario_moments
+    from analytics.optimizer import optimize_weights, portfolio_return, portfolio_volatility
+    from analytics.cvar import min_cvar_weights
+    from services.volatility import forecast_covariance
+
+    tickers = params['tickers']
+    start_date = params['start_date']
+    end_date = params['end_date']
+    num_scenarios = params['num_scenarios']
+    mode = params['mode']
+    seed = params['seed']
+    chunk_size = params['chunk_size']
+    risk_free_rate = params['risk_free_rate']
+    logging.debug(f"Fetched risk-free rate: {risk_free_rate}")
+
+    # Daily simple-return moments over [start_date, end_date), sliced from the shared covariance engine
+    found, mean_returns, cov_matrix = get_moments(tickers, start_date=start_date, end_date=end_date,
+                                                  estimator=params['cov_estimator'], kind='simple')
+    initial_weights = [params['weights'][tickers.index(ticker)] for ticker in found]
+    initial_weights = [weight / sum(initial_weights) for weight in initial_weights]
+    if progress:
+        progress(0.3)
+
+    if params['vol_model'] == 'garch':
+        # Next-day GARCH(1,1) volatility forecasts with the estimated correlations
+        returns = get_returns(found, start_date=start_date, end_date=end_date, kind='simple')
+        cov_matrix = forecast_covariance(returns, correlation=correlation_matrix(cov_matrix))
+
+    if mode == 'cvar':
+        # Minimize CVaR directly over a float32 scenario matrix
+        with span('simulation'):
+            simulated_returns = generate_scenarios(mean_returns, cov_matrix, num_scenarios, seed, chunk_size)
+        with span('optimizer'):
+            optimized_weights, cvar = min_cvar_weights(simulated_returns, params['cvar_confidence'])
+        scenario_mean, scenario_cov = scenario_moments(
+            simulated_returns[offset:offset + chunk_size] for offset in range(0, num_scenarios, chunk_size)
+        )
+    else:
+        # The scenario mean and standard deviation of any portfolio follow from the
+        # scenario moments, so they are accumulated once chunk by chunk and the
+        # optimizer never touches the scenarios again
+        with span('simulation'):
+            scenario_mean, scenario_cov = scenario_moments(
+                chunk for _, chunk in iter_scenarios(mean_returns, cov_matrix, num_scenarios, seed, chunk_size)
+            )
+        with span('optimizer'):
+            result = optimize_weights(scenario_mean, scenario_cov, 'sharpe', risk_free_rate,
+                                      bounds=(0, 1), initial_weights=initial_weights)
+        optimized_weights = result.x
 
-        # Optimize portfolio
-        result = optimize_portfolio(ticker_weights, start_date, end_date, num_scenarios, risk_free_rate)
-        return jsonify(result), 200
-    except Exception as e:
-        logging.error(f"Error in optimization: {e}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+    # Calculate portfolio performance metrics
+    portfolio_mean_return = portfolio_return(optimized_weights, scenario_mean)
+    portfolio_std = portfolio_volatility(optimized_weights, scenario_cov)
+    sharpe_ratio = (portfolio_mean_return - risk_free_rate) / portfolio_std
+
+    response = {
+        'optimized_weights': dict(zip(found, optimized_weights.tolist())),
+        'mean_return': portfolio_mean_return,
+        'std_dev': portfolio_std,
+        'sharpe_ratio': sharpe_ratio
+    }
+    if mode == 'cvar':
+        response['cvar'] = cvar
+    return response
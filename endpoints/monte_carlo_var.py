@@ -1,10 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from flask_cors import cross_origin
-import numpy as np
-import pandas as pd
-import datetime as dt
-import yfinance as yf
-from scipy.stats import norm
+from werkzeug.exceptions import BadRequest
+import io
+import logging
+from services.instrumentation import span
+
+OUTPUT_MODES = ('json', 'summary', 'npy', 'arrow')
+
+# Upper bound on the histogram bins of the summary output
+MAX_HISTOGRAM_BINS = 10000
 
 monte_carlo_var_bp = Blueprint('monte_carlo_var', __name__)
 
@@ -12,61 +16,264 @@ monte_carlo_var_bp = Blueprint('monte_carlo_var', __name__)
 @cross_origin()
 def monte_carlo_var():
     data = request.json
+    output = data.get('output', 'json')
+
+    if output not in OUTPUT_MODES:
+        return jsonify({'error': f"Output must be one of: {', '.join(OUTPUT_MODES)}"}), 400
+
+    try:
+        bins = _histogram_bins(data)
+        result, tickers = simulate_portfolio_var(data)
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+    except Exception as e:
+        logging.error(f"Error simulating VaR: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    if output in ('npy', 'arrow'):
+        if result['scenario_pnl'] is None:
+            return jsonify({'error': 'Parametric VaR has no scenarios to return'}), 400
+        return scenario_binary_response(result, output)
+    response = var_response(result, tickers, output, bins)
+    with span('serialize'):
+        return jsonify(response)
+
+
+def run_monte_carlo_var(data, progress=None):
+    """JSON VaR result for the request payload; also runs inside job workers."""
+    output = data.get('output', 'json')
+    if output not in ('json', 'summary'):
+        raise BadRequest('Only json and summary output are available for this request')
+    bins = _histogram_bins(data)
+    result, tickers = simulate_portfolio_var(data, progress)
+    return var_response(result, tickers, output, bins)
+
+
+def _histogram_bins(data):
+    from analytics.summary import DEFAULT_HISTOGRAM_BINS
+
+    bins = data.get('bins')
+    if bins is None:
+        return DEFAULT_HISTOGRAM_BINS
+    try:
+        # Whole numbers only; int() would truncate 2.5 and accept True
+        if isinstance(bins, (bool, float)):
+            raise ValueError(bins)
+        bins = int(bins)
+    except (TypeError, ValueError):
+        bins = None
+    if bins is None or not 1 <= bins <= MAX_HISTOGRAM_BINS:
+        raise BadRequest(f'bins must be an integer between 1 and {MAX_HISTOGRAM_BINS}')
+    return bins
+
+
+def _float_list(value, name):
+    values = value if isinstance(value, list) else [value]
+    try:
+        return [float(item) for item in values]
+    except (TypeError, ValueError):
+        raise BadRequest(f'{name} must be numbers')
+
+
+def _require_price_data(tickers, found):
+    # A VaR of part of the portfolio would understate the risk of the whole
+    missing = [ticker for ticker in tickers if ticker not in found]
+    if missing:
+        raise BadRequest(f"No price data found for: {', '.join(missing)}")
+
+
+def simulate_portfolio_var(data, progress=None):
+    import numpy as np
+    from services.covariance import get_moments, get_returns
+    from services.volatility import VOL_MODELS, forecast_covariance
+    from analytics.covariance import ESTIMATORS, correlation_matrix
+    from analytics.simulation import DEFAULT_CHUNK_SIZE
+    from analytics.var import SAMPLING_METHODS, VAR_METHODS, historical_var_grid, parametric_var_grid, simulate_var_grid
+
     tickers = data.get('tickers', ['SPY', 'BND', 'GLD', 'QQQ', 'VTI'])
 
     years = int(data.get('years', 15))  # Ensure years is an integer
     portfolio_value = float(data.get('portfolio_value', 10000))  # Ensure portfolio_value is a float
     days = int(data.get('days', 5))  # Ensure days is an integer
-    simulations = int(data.get('simulations', 100000))  # Ensure simulations is an integer
     confidence_interval = float(data.get('confidence_interval', 0.95))  # Ensure confidence_interval is a float
     weights = data.get('weights')
+    seed = data.get('seed')
+    seed = int(seed) if seed is not None else None
+    vol_model = data.get('vol_model', 'historical')
+    cov_estimator = data.get('cov_estimator', 'sample')
+    method = data.get('method', 'monte-carlo')
+    sampling = data.get('sampling', 'pseudo')
+    control_variate = bool(data.get('control_variate', False))
+    # Adaptive Monte Carlo: stop once every VaR's standard error is below this, with `simulations` as the cap
+    max_standard_error = data.get('max_standard_error')
 
-    endDate = dt.datetime.now()
-    startDate = endDate - dt.timedelta(days=years*365)
-    adj_close_df = pd.DataFrame()
+    # Every horizon and confidence level is answered from one returns build and one scenario set;
+    # the first of each is reported at the top level as before
+    horizons = _float_list(data.get('horizons', days), 'horizons')
+    confidence_levels = _float_list(data.get('confidence_levels', confidence_interval), 'confidence_levels')
+    if not horizons or any(horizon < 1 or horizon != int(horizon) for horizon in horizons):
+        raise BadRequest('horizons must be whole numbers of days, at least 1')
+    horizons = [int(horizon) for horizon in horizons]
+    if not confidence_levels or any(not 0 < level < 1 for level in confidence_levels):
+        raise BadRequest('confidence_levels must be between 0 and 1')
 
-    for ticker in tickers:
+    if method not in VAR_METHODS:
+        raise BadRequest(f"Method must be one of: {', '.join(VAR_METHODS)}")
+
+    if sampling not in SAMPLING_METHODS:
+        raise BadRequest(f"Sampling must be one of: {', '.join(SAMPLING_METHODS)}")
+
+    if max_standard_error is not None:
         try:
-            data = yf.download(ticker, start=startDate, end=endDate, progress=False)
-            if 'Close' in data.columns:
-                adj_close_df[ticker] = data['Close']
-        except Exception as e:
-            return jsonify({'error': str(e)}), 500
+            max_standard_error = float(max_standard_error)
+        except (TypeError, ValueError):
+            raise BadRequest('max_standard_error must be a number')
+        if max_standard_error <= 0:
+            raise BadRequest('max_standard_error must be positive')
 
-    log_returns = np.log(adj_close_df / adj_close_df.shift(1)).dropna()
-    cov_matrix = log_returns.cov()
+    try:
+        simulations = int(data.get('simulations', 100000))
+        chunk_size = int(data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except (TypeError, ValueError):
+        raise BadRequest('simulations and chunk_size must be integers')
+    if simulations < 1 or chunk_size < 1:
+        raise BadRequest('simulations and chunk_size must be at least 1')
 
-    def expected_return(weights, log_returns):
-        return np.sum(log_returns.mean() * weights)
+    if vol_model not in VOL_MODELS:
+        raise BadRequest(f"Volatility model must be one of: {', '.join(VOL_MODELS)}")
 
-    def standard_deviation(weights, cov_matrix):
-        variance = weights.T @ cov_matrix @ weights
-        return np.sqrt(variance)
+    if method == 'historical' and vol_model != 'historical':
+        raise BadRequest('Historical simulation replays past returns and takes no volatility model')
+
+    if cov_estimator not in ESTIMATORS:
+        raise BadRequest(f"Covariance estimator must be one of: {', '.join(ESTIMATORS)}")
 
     if weights:
         if len(weights) != len(tickers):
-            return jsonify({'error': 'Number of weights must match number of tickers'}), 400
+            raise BadRequest('Number of weights must match number of tickers')
         weights = np.array(weights, dtype=float)  # Ensure weights are floats
     else:
         weights = np.array([1/len(tickers)] * len(tickers), dtype=float)  # Ensure weights are floats
 
-    portfolio_expected_return = expected_return(weights, log_returns)
-    portfolio_std_dev = standard_deviation(weights, cov_matrix)
+    if method == 'historical':
+        returns = get_returns(tickers, years=years)
+        found = list(returns.columns)
+        _require_price_data(tickers, found)
+        weights = weights[[tickers.index(ticker) for ticker in found]]
+        if progress:
+            progress(0.5)
+        try:
+            with span('simulation'):
+                result = historical_var_grid(returns.to_numpy(), weights, portfolio_value, horizons, confidence_levels)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        return _primary_result(result), found
+
+    # Daily log-return moments of the last `years` years, sliced from the shared covariance engine
+    try:
+        found, mean_returns, cov_matrix = get_moments(tickers, years=years, estimator=cov_estimator)
+    except ValueError as e:
+        raise BadRequest(str(e))
+    _require_price_data(tickers, found)
+    weights = weights[[tickers.index(ticker) for ticker in found]]
+    if vol_model == 'garch':
+        # GARCH volatilities forecast over each horizon with the estimated correlations
+        returns = get_returns(found, years=years)
+        correlation = correlation_matrix(cov_matrix)
+        cov_matrices = [forecast_covariance(returns, horizon=horizon, correlation=correlation) for horizon in horizons]
+    else:
+        cov_matrices = [cov_matrix] * len(horizons)
+    if progress:
+        progress(0.2)
+
+    if method == 'parametric':
+        with span('simulation'):
+            result = parametric_var_grid(mean_returns, cov_matrices, weights, portfolio_value, horizons, confidence_levels)
+        return _primary_result(result), found
+
+    def simulation_progress(fraction):
+        if progress:
+            progress(0.2 + 0.7 * fraction)
 
-    def random_z_score():
-        return np.random.normal(0, 1)
+    # Simulate every scenario in vectorized chunks from the correlated asset returns
+    with span('simulation'):
+        result = simulate_var_grid(
+            mean_returns,
+            cov_matrices,
+            weights,
+            portfolio_value,
+            horizons,
+            confidence_levels,
+            simulations,
+            seed=seed,
+            chunk_size=chunk_size,
+            progress=simulation_progress,
+            sampling=sampling,
+            control_variate=control_variate,
+            max_standard_error=max_standard_error
+        )
+    return _primary_result(result), found
 
-    def scenario_gain_loss(portfolio_value, portfolio_std_dev, z_score, days):
-        return portfolio_value * portfolio_expected_return * days + portfolio_value * portfolio_std_dev * z_score * np.sqrt(days)
 
-    scenario_return = []
-    for i in range(simulations):
-        z_score = random_z_score()
-        scenario_return.append(scenario_gain_loss(portfolio_value, portfolio_std_dev, z_score, days))
+def _primary_result(result):
+    # The first horizon at the first confidence level, plus the whole grid
+    return {
+        **result['grid'][0],
+        'grid': result['grid'],
+        'scenario_pnl': result['scenario_pnl'][0] if result['scenario_pnl'] is not None else None,
+        'simulations': result.get('simulations'),
+    }
 
-    VaR = -np.percentile(scenario_return, 100 * (1 - confidence_interval))
 
-    return jsonify({
-        'VaR': VaR,
-        'scenario_return': scenario_return
-    })
\ No newline at end of file
+def var_response(result, tickers, output, bins=None):
+    from analytics.summary import DEFAULT_HISTOGRAM_BINS, summarize
+
+    def cell(entry):
+        fields = {
+            'VaR': entry['var'],
+            'expected_shortfall': entry['expected_shortfall'],
+            'contributions': dict(zip(tickers, entry['contributions'].tolist())),
+        }
+        # Monte Carlo estimates carry their standard error once there are two batches to compare
+        if entry.get('standard_error') is not None:
+            fields['standard_error'] = entry['standard_error']
+        return fields
+
+    response = {
+        **cell(result),
+        'grid': [{'days': entry['days'], 'confidence_interval': entry['confidence'], **cell(entry)}
+                 for entry in result['grid']],
+    }
+    if result['simulations'] is not None:
+        response['simulations'] = result['simulations']
+    # Parametric VaR has no scenarios to return
+    if result['scenario_pnl'] is not None:
+        if output == 'summary':
+            response['summary'] = summarize(result['scenario_pnl'], bins=bins or DEFAULT_HISTOGRAM_BINS)
+        else:
+            response['scenario_return'] = result['scenario_pnl'].tolist()
+    return response
+
+
+def scenario_binary_response(result, output):
+    import numpy as np
+
+    # Stream the raw float64 scenario vector; the headline numbers travel in headers
+    buffer = io.BytesIO()
+    if output == 'npy':
+        np.save(buffer, result['scenario_pnl'], allow_pickle=False)
+        mimetype = 'application/octet-stream'
+    else:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return jsonify({'error': 'Arrow output requires the pyarrow package'}), 400
+        table = pa.table({'scenario_return': result['scenario_pnl']})
+        with pa.ipc.new_stream(buffer, table.schema) as writer:
+            writer.write_table(table)
+        mimetype = 'application/vnd.apache.arrow.stream'
+
+    return Response(buffer.getvalue(), mimetype=mimetype, headers={
+        'X-VaR': str(result['var']),
+        'X-Expected-Shortfall': str(result['expected_shortfall'])
+    })
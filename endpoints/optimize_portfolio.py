@@ -1,14 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_cors import cross_origin
-import numpy as np
-import pandas as pd
-import datetime as dt
-import yfinance as yf
-from scipy.optimize import minimize
-from fredapi import Fred
-import os
+from werkzeug.exceptions import BadRequest
 from dotenv import load_dotenv
 import logging
+from services.rates import get_risk_free_rate
+from services.result_cache import cached, result_key
+from services.instrumentation import log_payload, span
 
 load_dotenv()
 
@@ -18,34 +15,66 @@ optimize_portfolio_bp = Blueprint('optimize_portfolio', __name__)
 @cross_origin()
 def optimize_portfolio():
     data = request.json
-    logging.debug(f"Received data: {data}")
+    log_payload('Received data', data)
 
+    try:
+        params, tickers = optimize_request(data)
+        etag = result_key('optimize-portfolio-response', {'params': params, 'tickers': tickers})
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            result = optimize_response(params, tickers)
+            with span('serialize'):
+                response = jsonify(result)
+    except BadRequest as e:
+        return jsonify({'error': e.description}), 400
+    except Exception as e:
+        logging.error(f"Error optimizing portfolio: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    response.set_etag(etag)
+    return response
+
+
+def run_optimize_portfolio(data, progress=None):
+    """Max-Sharpe weights for the request payload; also runs inside job workers."""
+    params, tickers = optimize_request(data)
+    return optimize_response(params, tickers, progress)
+
+
+def optimize_request(data):
+    """Validate the payload into canonical parameters and the aggregated tickers in request order.
+
+    The parameters hold the sorted ticker set with aggregated weights, the years,
+    the covariance estimator and the risk-free rate, so requests that list the
+    same basket differently share one computation.
+    """
     tickers = data.get('tickers', [])
     weights = data.get('weights', [])
 
-    logging.debug(f"Tickers data: {tickers}")
-    logging.debug(f"Weights data: {weights}")
+    log_payload('Tickers data', tickers)
+    log_payload('Weights data', weights)
 
     # Ensure tickers is a list of strings and weights is a list of floats
     if not isinstance(tickers, list) or not all(isinstance(ticker, str) for ticker in tickers):
         logging.error(f"Tickers data is not a list of strings: {tickers}")
-        return jsonify({'error': 'Tickers data must be a list of strings'}), 400
+        raise BadRequest('Tickers data must be a list of strings')
 
     if not isinstance(weights, list) or not all(isinstance(weight, (int, float, str)) for weight in weights):
         logging.error(f"Weights data is not a list of numbers: {weights}")
-        return jsonify({'error': 'Weights data must be a list of numbers'}), 400
+        raise BadRequest('Weights data must be a list of numbers')
 
     # Convert weights to floats
     try:
         weights = [float(weight) for weight in weights]
     except ValueError as e:
         logging.error(f"Error converting weights to floats: {e}")
-        return jsonify({'error': 'Weights must be convertible to floats'}), 400
+        raise BadRequest('Weights must be convertible to floats')
 
     # Ensure the number of tickers matches the number of weights
     if len(tickers) != len(weights):
         logging.error(f"Number of tickers does not match number of weights: {len(tickers)} vs {len(weights)}")
-        return jsonify({'error': 'Number of tickers must match number of weights'}), 400
+        raise BadRequest('Number of tickers must match number of weights')
 
     # Aggregate values of duplicate tickers
     tickers_dict = {}
@@ -55,64 +84,59 @@ def optimize_portfolio():
         else:
             tickers_dict[ticker] = weight
 
-    tickers = list(tickers_dict.keys())
-    weights = list(tickers_dict.values())
-
-    logging.debug(f"Aggregated tickers: {tickers}")
-    logging.debug(f"Aggregated weights: {weights}")
+    log_payload('Aggregated tickers', list(tickers_dict))
+    log_payload('Aggregated weights', list(tickers_dict.values()))
 
     years = int(data.get('years', 30))  # Ensure years is an integer
-    end_date = dt.datetime.today()
-    start_date = end_date - dt.timedelta(days=years*365)
-    adj_close_df = pd.DataFrame()
-
-    for ticker in tickers:
-        try:
-            logging.debug(f"Processing ticker: {ticker}")
-            data = yf.download(ticker, start=start_date, end=end_date, progress=False)
-            if 'Close' in data.columns:
-                adj_close_df[ticker] = data['Close']
-        except Exception as e:
-            logging.error(f"Error downloading data for ticker {ticker}: {e}")
-            return jsonify({'error': str(e)}), 500
-
-    log_returns = np.log(adj_close_df / adj_close_df.shift(1)).dropna()
-    cov_matrix = log_returns.cov() * 252
-
-    def standard_deviation(weights, cov_matrix):
-        variance = weights.T @ cov_matrix @ weights
-        return np.sqrt(variance)
-
-    def expected_return(weights, log_returns):
-        logging.debug(f"log_returns.mean(): {log_returns.mean()}")
-        logging.debug(f"weights: {weights}")
-        return np.sum(log_returns.mean() * weights) * 252
-
-    def sharpe_ratio(weights, log_returns, cov_matrix, risk_free_rate):
-        return (expected_return(weights, log_returns) - risk_free_rate) / standard_deviation(weights, cov_matrix)
-
-    fred_api_key = os.getenv('FRED_API_KEY')
-    fred = Fred(api_key=fred_api_key)
-    ten_year_treasury_rate = fred.get_series_latest_release('GS10') / 100
-    risk_free_rate = ten_year_treasury_rate.iloc[-1]
-
-    def neg_sharpe_ratio(weights, log_returns, cov_matrix, risk_free_rate):
-        return -sharpe_ratio(weights, log_returns, cov_matrix, risk_free_rate)
-
-    def weight_sum_constraint(weights):
-        return np.sum(weights) - 1
-
-    constraints = [
-        {'type': 'eq', 'fun': weight_sum_constraint},  # Sum of weights must be 1
-    ]
-    bounds = [(0, 1) for _ in range(len(tickers))]  # Each weight can be between 0 and 1
+    cov_estimator = data.get('cov_estimator', 'sample')
+
+    from analytics.covariance import ESTIMATORS
+    if cov_estimator not in ESTIMATORS:
+        raise BadRequest(f"Covariance estimator must be one of: {', '.join(ESTIMATORS)}")
+
+    params = {
+        'tickers': sorted(tickers_dict),
+        'weights': [round(tickers_dict[ticker], 12) for ticker in sorted(tickers_dict)],
+        'years': years,
+        'cov_estimator': cov_estimator,
+        'risk_free_rate': get_risk_free_rate(),
+    }
+    return params, list(tickers_dict)
+
+
+def optimize_response(params, tickers, progress=None):
+    """The response for ``tickers`` (request order) from the memoized canonical result."""
+    result = cached(result_key('optimize-portfolio', params), lambda: _optimize(params, progress))
+    weights = result['weights']
+    return {
+        'optimal_weights': [weights[ticker] for ticker in tickers if ticker in weights],
+        'optimal_portfolio_return': result['optimal_portfolio_return'],
+        'optimal_portfolio_volatility': result['optimal_portfolio_volatility'],
+        'optimal_portfolio_sharpe_ratio': result['optimal_portfolio_sharpe_ratio'],
+    }
+
+
+def _optimize(params, progress=None):
+    import numpy as np
+    from services.covariance import get_moments
+    from analytics.optimizer import TRADING_DAYS, optimize_weights, portfolio_return, portfolio_volatility, sharpe_ratio
+
+    # Daily log-return moments of the last `years` years, sliced from the shared covariance engine
+    tickers, mean_returns, cov_matrix = get_moments(params['tickers'], years=params['years'],
+                                                    estimator=params['cov_estimator'])
+    mean_returns, cov_matrix = mean_returns * TRADING_DAYS, cov_matrix * TRADING_DAYS
+    if progress:
+        progress(0.5)
+
+    risk_free_rate = params['risk_free_rate']
+
     initial_weights = np.array([1/len(tickers)] * len(tickers), dtype=float)  # Ensure initial_weights are floats
 
-    logging.debug(f"Initial weights: {initial_weights}")
-    logging.debug(f"Log returns shape: {log_returns.shape}")
+    log_payload('Initial weights', initial_weights)
     logging.debug(f"Covariance matrix shape: {cov_matrix.shape}")
 
-    optimized_results = minimize(neg_sharpe_ratio, initial_weights, args=(log_returns, cov_matrix, risk_free_rate), method='SLSQP', constraints=constraints, bounds=bounds)
+    with span('optimizer'):
+        optimized_results = optimize_weights(mean_returns, cov_matrix, 'sharpe', risk_free_rate, bounds=(0, 1), initial_weights=initial_weights)
     optimal_weights = optimized_results.x
 
     # Round the weights to the nearest two decimals
@@ -122,9 +146,9 @@ def optimize_portfolio():
     if np.sum(optimal_weights) > 1:
         optimal_weights = optimal_weights / np.sum(optimal_weights)
 
-    return jsonify({
-        'optimal_weights': optimal_weights.tolist(),
-        'optimal_portfolio_return': expected_return(optimal_weights, log_returns),
-        'optimal_portfolio_volatility': standard_deviation(optimal_weights, cov_matrix),
-        'optimal_portfolio_sharpe_ratio': sharpe_ratio(optimal_weights, log_returns, cov_matrix, risk_free_rate)
-    })
\ No newline at end of file
+    return {
+        'weights': dict(zip(tickers, optimal_weights.tolist())),
+        'optimal_portfolio_return': portfolio_return(optimal_weights, mean_returns),
+        'optimal_portfolio_volatility': portfolio_volatility(optimal_weights, cov_matrix),
+        'optimal_portfolio_sharpe_ratio': sharpe_ratio(optimal_weights, mean_returns, cov_matrix, risk_free_rate)
+    }
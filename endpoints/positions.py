@@ -0,0 +1,45 @@
+# endpoints/positions.py
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from services.positions import VersionConflict, apply_operations
+from services.instrumentation import log_payload
+import logging
+
+positions_bp = Blueprint('positions', __name__)
+
+@positions_bp.route('/api/v1/positions/batch', methods=['POST'])
+@cross_origin()
+def batch_positions():
+    data = request.json
+    log_payload('Received data', data)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Payload must be a JSON object'}), 400
+
+    user_id = data.get('user_id')
+    operations = data.get('operations')
+    # Optional optimistic concurrency: the version the client last read
+    expected_version = data.get('expected_version')
+
+    if not user_id:
+        return jsonify({'error': 'User ID is required'}), 400
+
+    if expected_version is not None and (isinstance(expected_version, bool) or not isinstance(expected_version, int)):
+        return jsonify({'error': 'expected_version must be an integer'}), 400
+
+    try:
+        version = apply_operations(user_id, operations, expected_version)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'error': f'Ticker not found: {e.args[0]}'}), 404
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'positions_version': e.current}), 409
+    except Exception as e:
+        logging.error(f"Error applying position operations: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    if version is None:
+        return jsonify({'error': 'No document found for the user'}), 404
+
+    logging.debug(f"Applied {len(operations)} position operations for user_id {user_id}")
+    return jsonify({'message': 'Positions updated successfully', 'positions_version': version}), 200
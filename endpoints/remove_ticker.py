@@ -1,18 +1,17 @@
 # endpoints/remove_ticker.py
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from firebase_config import db
+from services.positions import apply_operations
+from services.instrumentation import log_payload
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
-
 remove_ticker_bp = Blueprint('remove_ticker', __name__)
 
 @remove_ticker_bp.route('/api/v1/remove-ticker', methods=['POST'])
 @cross_origin()
 def remove_ticker():
     data = request.json
-    logging.debug(f"Received data: {data}")
+    log_payload('Received data', data)
     user_id = data.get('user_id')
     ticker_to_remove = data.get('ticker')
 
@@ -23,21 +22,12 @@ def remove_ticker():
         return jsonify({'error': 'Ticker is required'}), 400
 
     try:
-        # Access the user's collection
-        user_collection_ref = db.collection(f'portfolios_{user_id}')
-        tickers = []
-        for doc in user_collection_ref.stream():
-            tickers.extend(doc.to_dict().get('tickers', []))
-
-        # Filter out the ticker to remove
-        updated_tickers = [ticker for ticker in tickers if ticker['ticker'] != ticker_to_remove]
-
-        # Update the user's collection with the updated tickers
-        for doc in user_collection_ref.stream():
-            doc.reference.update({'tickers': updated_tickers})
+        apply_operations(user_id, [{'op': 'remove', 'ticker': ticker_to_remove}])
 
         logging.debug(f"Removed ticker {ticker_to_remove} for user_id {user_id}")
         return jsonify({'message': 'Ticker removed successfully'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error removing ticker: {e}")
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,58 @@
+# endpoints/stream.py
+from flask import Blueprint, Response, jsonify, stream_with_context
+from flask_cors import cross_origin
+from services.portfolio_repository import get_portfolio
+import os
+import json
+import queue
+import logging
+
+stream_bp = Blueprint('stream', __name__)
+
+# Comment lines keep proxies and load balancers from closing idle streams
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+
+# Seconds a client is asked to wait when the process has no room for another stream
+STREAM_RETRY_AFTER_SECONDS = 30
+
+@stream_bp.route('/api/v1/stream/portfolio/<user_id>', methods=['GET'])
+@cross_origin()
+def stream_portfolio(user_id):
+    try:
+        if get_portfolio(user_id) is None:
+            return jsonify({'error': 'Portfolio not found'}), 404
+    except Exception as e:
+        logging.error(f"Error opening portfolio stream: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    from services.streaming import TooManySubscribers, subscribe, unsubscribe
+
+    # Subscribe before answering, so a full process can refuse the stream
+    try:
+        subscriber_id, updates = subscribe(user_id)
+    except TooManySubscribers:
+        logging.warning(f"Refused portfolio stream for user_id {user_id}: too many open streams")
+        response = jsonify({'error': 'Too many open streams, try again later'})
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER_SECONDS)
+        return response, 503
+    logging.debug(f"Opened portfolio stream {subscriber_id} for user_id {user_id}")
+
+    def events():
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                update = updates.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield f"event: valuation\ndata: {json.dumps(update)}\n\n"
+
+    def close():
+        unsubscribe(subscriber_id)
+        logging.debug(f"Closed portfolio stream {subscriber_id} for user_id {user_id}")
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the client disconnects, and also if the stream never started
+    response.call_on_close(close)
+    return response
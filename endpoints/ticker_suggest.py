@@ -0,0 +1,22 @@
+# endpoints/ticker_suggest.py
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from services.ticker_index import suggest
+import logging
+
+ticker_suggest_bp = Blueprint('ticker_suggest', __name__)
+
+@ticker_suggest_bp.route('/api/v1/tickers/suggest', methods=['GET'])
+@cross_origin()
+def suggest_tickers():
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    try:
+        return jsonify({'query': query, 'suggestions': suggest(query, limit)}), 200
+    except Exception as e:
+        logging.error(f"Error suggesting tickers: {e}")
+        return jsonify({'error': str(e)}), 500
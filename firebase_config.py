@@ -1,13 +1,33 @@
 # firebase_config.py
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
+import threading
 
-service_account_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+# The Firestore client is created on first use so that importing the app does not
+# pay for firebase_admin/grpc or contact Google before the first request.
+_db = None
+_lock = threading.Lock()
 
-if not service_account_path:
-    raise ValueError('No service account provided')
-cred = credentials.Certificate(service_account_path) # Replace with your own file
-firebase_admin.initialize_app(cred)
 
-db = firestore.client()
\ No newline at end of file
+def get_db():
+    global _db
+    with _lock:
+        if _db is None:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+
+            service_account_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+
+            if not service_account_path:
+                raise ValueError('No service account provided')
+            cred = credentials.Certificate(service_account_path) # Replace with your own file
+            firebase_admin.initialize_app(cred)
+
+            _db = firestore.client()
+    return _db
+
+
+def __getattr__(name):
+    # Keeps `from firebase_config import db` working
+    if name == 'db':
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,19 @@
+# fred_config.py
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared FRED client, created on first use
+_fred = None
+_lock = threading.Lock()
+
+
+def get_fred():
+    global _fred
+    with _lock:
+        if _fred is None:
+            from fredapi import Fred
+            _fred = Fred(api_key=os.getenv('FRED_API_KEY'))
+    return _fred
@@ -2,7 +2,7 @@ import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
-from scipy.optimize import minimize
+from analytics.optimizer import annualized_moments, optimize_weights, portfolio_return, portfolio_volatility, sharpe_ratio
 
 from dotenv import load_dotenv
 import os
@@ -29,18 +29,8 @@ for ticker in tickers:
         
 log_returns = np.log(adj_close_df / adj_close_df.shift(1)).dropna()
 
-cov_matrix = log_returns.cov()*252 # Annualize the covariance matrix
-
-def standard_deviation (weights, cov_matrix):
-    variance = weights.T @ cov_matrix @ weights #Transposes the weights vector, multiplies it by the covariance matrix, and then multiplies the result by the weights vector
-    return np.sqrt(variance)
-
-def expected_return(weights, log_returns):
-    return np.sum(log_returns.mean() * weights)*252
-
-#Sharpe Ratio
-def sharpe_ratio(weights, log_returns, cov_matrix, risk_free_rate):
-    return(expected_return(weights, log_returns) - risk_free_rate) / standard_deviation(weights, cov_matrix)
+# Annualized mean vector and covariance matrix, computed once for the optimizer
+mean_returns, cov_matrix = annualized_moments(log_returns)
 
 #Set the risk free rate
 from fredapi import Fred
@@ -51,31 +41,27 @@ ten_year_treasury_rate = fred.get_series_latest_release('GS10') / 100
 risk_free_rate = ten_year_treasury_rate.iloc[-1]
 # print(risk_free_rate)
 
-def neg_sharpe_ratio(weights, log_returns, cov_matrix, risk_free_rate):
-    return -sharpe_ratio(weights, log_returns, cov_matrix, risk_free_rate)
-constraints = {'type': 'eq',
-               'fun': lambda x: np.sum(x) - 1}
-bounds =[(0, 0.5) for _ in range(len(tickers))]
+bounds = (0, 0.5)
 
 # Set initial weights
 initial_weights = np.array([1/len(tickers)] * len(tickers))
 
 #Optimize the weights to maximize Sharpe Ratio
-optimized_results = minimize(neg_sharpe_ratio, 
-                             initial_weights, 
-                             args=(log_returns, cov_matrix, risk_free_rate), 
-                             method='SLSQP', 
-                             constraints = constraints, 
-                             bounds = bounds)
+optimized_results = optimize_weights(mean_returns,
+                                     cov_matrix,
+                                     'sharpe',
+                                     risk_free_rate,
+                                     bounds = bounds,
+                                     initial_weights = initial_weights)
 
 optimal_weights = optimized_results.x
 print(f"Optimal Weights: {optimal_weights}")
 for ticker, weight in zip(tickers, optimal_weights):
     print(f"{ticker}: {weight:.4f}")
 
-optimal_portfolio_return = expected_return(optimal_weights, log_returns)
-optimal_portfolio_volatility = standard_deviation(optimal_weights, cov_matrix)
-optimal_portfolio_sharpe_ratio = sharpe_ratio(optimal_weights, log_returns, cov_matrix, risk_free_rate)
+optimal_portfolio_return = portfolio_return(optimal_weights, mean_returns)
+optimal_portfolio_volatility = portfolio_volatility(optimal_weights, cov_matrix)
+optimal_portfolio_sharpe_ratio = sharpe_ratio(optimal_weights, mean_returns, cov_matrix, risk_free_rate)
 
 print(f"Optimal Portfolio Return: {optimal_portfolio_return:.4f}")
 print(f"Optimal Portfolio Volatility: {optimal_portfolio_volatility:.4f}")
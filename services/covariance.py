@@ -0,0 +1,407 @@
+# services/covariance.py
+import os
+import threading
+import logging
+import contextlib
+import datetime as dt
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from services import instrumentation, return_matrix
+from services.price_store import get_close_history
+from analytics.covariance import (
+    DEFAULT_EWMA_DECAY,
+    ESTIMATORS,
+    EWMA_FIELDS,
+    STAT_FIELDS,
+    cross_statistics,
+    estimate_moments,
+    ewma_statistics,
+)
+
+# One covariance engine per return window (a rolling number of years, or a fixed
+# date range) covering every ticker any request has asked for. Each window keeps
+# the date-aligned daily return matrix of its universe together with running
+# pairwise statistics. New trading days are appended, days that fall out of a
+# rolling window are subtracted, and a new ticker only adds its own rows and
+# columns. A request then slices its tickers' k x k statistics, so
+# building its covariance no longer scans the return history.
+#
+# Windows that the shared return matrix (services/return_matrix.py) covers keep
+# only their statistics and read returns from the memory-mapped matrix, so
+# workers do not each hold a copy of the history.
+#
+# The statistics are dense N x N arrays, so a window tracks at most
+# COVARIANCE_MAX_TICKERS tickers (a request that would grow it further is
+# estimated from a one-off window of its own tickers) and the least recently used
+# windows are dropped once all of them together exceed COVARIANCE_MAX_CELLS
+# ticker pairs (8 float64 arrays, i.e. 64 bytes, per pair).
+COVARIANCE_EWMA_DECAY = float(os.getenv('COVARIANCE_EWMA_DECAY', DEFAULT_EWMA_DECAY))
+COVARIANCE_MAX_WINDOWS = int(os.getenv('COVARIANCE_MAX_WINDOWS', 8))
+COVARIANCE_MAX_TICKERS = int(os.getenv('COVARIANCE_MAX_TICKERS', 500))
+COVARIANCE_MAX_CELLS = int(os.getenv('COVARIANCE_MAX_CELLS', 1_000_000))
+
+RETURN_KINDS = ('log', 'simple')
+
+# Calendar days fetched before a window so its first return has a previous close
+LOOKBACK_PADDING_DAYS = 10
+
+_windows = OrderedDict()
+_windows_lock = threading.Lock()
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return dt.datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if isinstance(value, dt.datetime):
+        return value.date()
+    return value
+
+
+def _returns(closes, kind):
+    """Per-ticker returns between consecutive closes of that ticker."""
+    if kind == 'log':
+        return np.log(closes / closes.shift(1)).dropna()
+    return (closes / closes.shift(1) - 1).dropna()
+
+
+class _Window:
+    def __init__(self, kind, years=None, start=None, end=None):
+        self.kind = kind
+        self.years = years
+        self.start = start
+        self.end = end
+        self.lock = threading.Lock()
+        self.tickers = []
+        self.columns = {}
+        self.dates = pd.DatetimeIndex([])
+        self.returns = np.empty((0, 0))
+        self.last_close = {}
+        self.stats = {field: np.empty((0, 0)) for field in STAT_FIELDS + EWMA_FIELDS}
+        self.refreshed_on = None
+
+    def window_start(self, today):
+        if self.years is not None:
+            return today - dt.timedelta(days=self.years * 365)
+        return self.start
+
+    def _rebuild(self):
+        self.stats = {
+            **cross_statistics(self.returns, self.returns),
+            **ewma_statistics(self.returns, self.returns, COVARIANCE_EWMA_DECAY),
+        }
+
+    def _merge(self, frame):
+        """Place ``frame`` (dates x tickers) into the return matrix, rebuilding when it reshapes history."""
+        dates = self.dates.union(frame.index)
+        tickers = self.tickers + [ticker for ticker in frame.columns if ticker not in self.columns]
+        aligned = pd.DataFrame(self.returns, index=self.dates, columns=self.tickers).reindex(index=dates, columns=tickers)
+        aligned.update(frame)
+        self.dates = dates
+        self.tickers = tickers
+        self.columns = {ticker: i for i, ticker in enumerate(tickers)}
+        self.returns = aligned.to_numpy()
+        self._rebuild()
+
+    def _append_rows(self, frame):
+        rows = frame.reindex(columns=self.tickers).to_numpy()
+        added = cross_statistics(rows, rows)
+        for field in STAT_FIELDS:
+            self.stats[field] += added[field]
+        decayed = COVARIANCE_EWMA_DECAY ** len(rows)
+        added = ewma_statistics(rows, rows, COVARIANCE_EWMA_DECAY)
+        for field in EWMA_FIELDS:
+            self.stats[field] = decayed * self.stats[field] + added[field]
+        self.dates = self.dates.append(frame.index)
+        self.returns = np.vstack([self.returns, rows])
+
+    def _drop_rows_before(self, start):
+        keep = self.dates >= pd.Timestamp(start)
+        if keep.all():
+            return
+        removed = cross_statistics(self.returns[~keep], self.returns[~keep])
+        for field in STAT_FIELDS:
+            self.stats[field] -= removed[field]
+        # The EWMA weights of rows older than the window are negligible and stay
+        self.dates = self.dates[keep]
+        self.returns = self.returns[keep]
+
+    def _add_columns(self, frame):
+        new = frame.reindex(index=self.dates).to_numpy()
+        old = self.returns
+        blocks = [
+            (cross_statistics(old, new), cross_statistics(new, old), cross_statistics(new, new)),
+            (ewma_statistics(old, new, COVARIANCE_EWMA_DECAY), ewma_statistics(new, old, COVARIANCE_EWMA_DECAY),
+             ewma_statistics(new, new, COVARIANCE_EWMA_DECAY)),
+        ]
+        for upper_right, lower_left, lower_right in blocks:
+            for field, block in upper_right.items():
+                self.stats[field] = np.block([[self.stats[field], block], [lower_left[field], lower_right[field]]])
+        self.tickers = self.tickers + list(frame.columns)
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.returns = np.hstack([old, new])
+
+    def _load(self, tickers, start, end):
+        """Returns of ``tickers`` dated on or after ``start`` and after their last known close.
+
+        The window holds every return dated inside it, so a ticker's first return is
+        taken against its last close before ``start``.
+        """
+        since = min((self.last_close[ticker][0] for ticker in tickers if ticker in self.last_close),
+                    default=start - dt.timedelta(days=LOOKBACK_PADDING_DAYS))
+        closes = get_close_history(tickers, since, end)
+        columns = {}
+        for ticker in closes.columns:
+            series = closes[ticker].dropna()
+            if ticker in self.last_close:
+                last_date, last_value = self.last_close[ticker]
+                series = series[series.index > last_date]
+                if series.empty:
+                    continue
+                series = pd.concat([pd.Series([last_value], index=[last_date]), series])
+            if len(series):
+                self.last_close[ticker] = (series.index[-1], float(series.iloc[-1]))
+            returns = _returns(series, self.kind)
+            returns = returns[returns.index >= pd.Timestamp(start)]
+            if not returns.empty:
+                columns[ticker] = returns
+        return pd.DataFrame(columns)
+
+    def refresh(self, today):
+        """Append trading days newer than the stored ones and slide a rolling window."""
+        if self.refreshed_on == today or not self.tickers:
+            return
+        start = self.window_start(today)
+        # A fixed range that ended before the last refresh cannot gain new days
+        if self.end is None or self.end > self.refreshed_on:
+            frame = self._load(self.tickers, start, self.end)
+            if not frame.empty:
+                if len(self.dates) and frame.index.min() <= self.dates[-1]:
+                    # A late bar for a day already in the matrix: rebuild once
+                    self._merge(frame)
+                else:
+                    self._append_rows(frame)
+        self._drop_rows_before(start)
+        self.refreshed_on = today
+
+    def track(self, tickers, today):
+        """Make sure every ticker in ``tickers`` with history in the window is a column."""
+        new = [ticker for ticker in tickers if ticker not in self.columns]
+        if not new:
+            return
+        start = self.window_start(today)
+        frame = self._load(new, start, self.end)
+        if frame.empty:
+            return
+        logging.debug(f"Covariance window {self.key()} tracks {len(frame.columns)} new tickers")
+        if not self.tickers or not frame.index.isin(self.dates).all():
+            self._merge(frame)
+        else:
+            self._add_columns(frame)
+        if self.refreshed_on is None:
+            self.refreshed_on = today
+
+    def sync(self, tickers, today, matrix=None):
+        self.refresh(today)
+        self.track(tickers, today)
+
+    def fits(self, tickers):
+        """Whether tracking ``tickers`` keeps the window within COVARIANCE_MAX_TICKERS."""
+        new = sum(1 for ticker in tickers if ticker not in self.columns)
+        return len(self.tickers) + new <= COVARIANCE_MAX_TICKERS
+
+    def key(self):
+        return _window_key(self.kind, self.years, self.start, self.end)
+
+    def slice(self, tickers):
+        index = [self.columns[ticker] for ticker in tickers]
+        grid = np.ix_(index, index)
+        return {field: matrix[grid] for field, matrix in self.stats.items()}
+
+    def frame(self, tickers):
+        return pd.DataFrame(self.returns[:, [self.columns[ticker] for ticker in tickers]],
+                            index=self.dates, columns=tickers)
+
+
+class _SharedWindow(_Window):
+    """A window read from the shared return matrix; it keeps statistics but no returns.
+
+    ``dates`` are the rows of the mapped matrix inside the window. A rolling
+    window subtracts the days that leave it, and the statistics are recomputed
+    from the matrix once when a rebuilt version is mapped.
+    """
+
+    def __init__(self, kind, years=None, start=None, end=None):
+        super().__init__(kind, years, start, end)
+        self.matrix = None
+
+    def _read(self, matrix, tickers, start, end):
+        dates, values = matrix.read(tickers, start, end)
+        # The matrix stores log returns
+        return dates, np.expm1(values) if self.kind == 'simple' else values
+
+    def _rebuild_from(self, matrix, start):
+        self.dates, returns = self._read(matrix, self.tickers, start, self.end)
+        self.stats = {
+            **cross_statistics(returns, returns),
+            **ewma_statistics(returns, returns, COVARIANCE_EWMA_DECAY),
+        }
+
+    def _drop_rows_before(self, start):
+        keep = self.dates >= pd.Timestamp(start)
+        if keep.all():
+            return
+        _, removed = self._read(self.matrix, self.tickers, self.dates[0], start)
+        removed = cross_statistics(removed, removed)
+        for field in STAT_FIELDS:
+            self.stats[field] -= removed[field]
+        self.dates = self.dates[keep]
+
+    def refresh(self, today, matrix):
+        if self.matrix is matrix and self.refreshed_on == today:
+            return
+        if self.tickers:
+            start = self.window_start(today)
+            if self.matrix is not None and matrix.data_file == self.matrix.data_file:
+                # Only columns were appended, so the rows and their values are unchanged
+                self._drop_rows_before(start)
+            else:
+                logging.debug(f"Covariance window {self.key()} recomputed from return matrix v{matrix.version}")
+                self._rebuild_from(matrix, start)
+        self.matrix = matrix
+        self.refreshed_on = today
+
+    def track(self, tickers, today, matrix):
+        new = [ticker for ticker in tickers if ticker not in self.columns and ticker in matrix.columns]
+        if not new:
+            return
+        start = self.window_start(today)
+        _, added = self._read(matrix, new, start, self.end)
+        # Tickers whose history ends before or starts after the window
+        present = ~np.isnan(added).all(axis=0)
+        new = [ticker for ticker, keep in zip(new, present) if keep]
+        if not new:
+            return
+        added = added[:, present]
+        logging.debug(f"Covariance window {self.key()} tracks {len(new)} new tickers")
+        if not self.tickers:
+            self.tickers = new
+            self.columns = {ticker: i for i, ticker in enumerate(new)}
+            self._rebuild_from(matrix, start)
+            return
+        _, old = self._read(matrix, self.tickers, start, self.end)
+        blocks = [
+            (cross_statistics(old, added), cross_statistics(added, old), cross_statistics(added, added)),
+            (ewma_statistics(old, added, COVARIANCE_EWMA_DECAY), ewma_statistics(added, old, COVARIANCE_EWMA_DECAY),
+             ewma_statistics(added, added, COVARIANCE_EWMA_DECAY)),
+        ]
+        for upper_right, lower_left, lower_right in blocks:
+            for field, block in upper_right.items():
+                self.stats[field] = np.block([[self.stats[field], block], [lower_left[field], lower_right[field]]])
+        self.tickers = self.tickers + new
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    def sync(self, tickers, today, matrix=None):
+        self.refresh(today, matrix)
+        self.track(tickers, today, matrix)
+
+    def frame(self, tickers):
+        dates, returns = self._read(self.matrix, tickers, self.window_start(self.refreshed_on), self.end)
+        return pd.DataFrame(returns, index=dates, columns=tickers)
+
+
+def _window_key(kind, years, start, end):
+    return (kind, years) if years is not None else (kind, start, end)
+
+
+def _get_window(tickers, kind, years, start, end, today):
+    """The window for the given range and the return matrix it reads from, if any."""
+    matrix = return_matrix.get_matrix()
+    window_start = today - dt.timedelta(days=years * 365) if years is not None else start
+    if matrix is not None and matrix.covers(window_start):
+        # None while a rebuild holds the lock and some tickers are not in the matrix yet
+        matrix = return_matrix.ensure_tickers(tickers)
+    else:
+        matrix = None
+    window_class = _SharedWindow if matrix is not None else _Window
+
+    key = _window_key(kind, years, start, end)
+    with _windows_lock:
+        window = _windows.get(key)
+        # A private window is replaced once the matrix covers its range
+        if window is None or type(window) is not window_class:
+            window = _windows[key] = window_class(kind, years, start, end)
+        _windows.move_to_end(key)
+    _trim_windows()
+    return window, matrix
+
+
+def _trim_windows():
+    # Drop the least recently used windows, never the one just used
+    with _windows_lock:
+        while len(_windows) > 1 and (len(_windows) > COVARIANCE_MAX_WINDOWS or
+                                     sum(len(window.tickers) ** 2 for window in _windows.values()) > COVARIANCE_MAX_CELLS):
+            _windows.popitem(last=False)
+
+
+@contextlib.contextmanager
+def _synced_window(tickers, kind, years, start, end, today):
+    """The window for the range synced with ``tickers``, locked while the caller reads it."""
+    window, matrix = _get_window(tickers, kind, years, start, end, today)
+    with window.lock:
+        if window.fits(tickers):
+            window.sync(tickers, today, matrix)
+            # The window may have grown past what the others leave room for
+            _trim_windows()
+            yield window
+            return
+    # Too many tickers to keep: a one-off window of just these, dropped after the request
+    logging.debug(f"Covariance window {window.key()} is full, estimating {len(tickers)} tickers directly")
+    direct = type(window)(kind, years, start, end)
+    direct.sync(tickers, today, matrix)
+    yield direct
+
+
+def clear():
+    """Drop every window, e.g. after the price source changed."""
+    with _windows_lock:
+        _windows.clear()
+
+
+def get_moments(tickers, years=None, start_date=None, end_date=None, estimator='sample', kind='log'):
+    """Daily mean returns and covariance of ``tickers`` over a window.
+
+    The window is the last ``years`` years or [start_date, end_date). Returns
+    ``(tickers, mean_returns, cov_matrix)`` where ``tickers`` keeps the requested
+    order but omits tickers without history in the window. Pairs use every day
+    on which both tickers traded.
+    """
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Covariance estimator must be one of: {', '.join(ESTIMATORS)}")
+    if kind not in RETURN_KINDS:
+        raise ValueError(f"Return kind must be one of: {', '.join(RETURN_KINDS)}")
+
+    tickers = list(dict.fromkeys(tickers))
+    today = dt.date.today()
+    start, end = _to_date(start_date), _to_date(end_date)
+    with instrumentation.span('returns'), _synced_window(tickers, kind, years, start, end, today) as window:
+        found = [ticker for ticker in tickers if ticker in window.columns]
+        if not found:
+            raise ValueError('No price data found for the given tickers')
+        stats = window.slice(found)
+    with instrumentation.span('covariance'):
+        mean_returns, cov_matrix = estimate_moments(stats, estimator)
+    return found, mean_returns, cov_matrix
+
+
+def get_returns(tickers, years=None, start_date=None, end_date=None, kind='log'):
+    """Date-aligned daily returns of ``tickers`` from the same windows as ``get_moments``."""
+    tickers = list(dict.fromkeys(tickers))
+    today = dt.date.today()
+    start, end = _to_date(start_date), _to_date(end_date)
+    with instrumentation.span('returns'), _synced_window(tickers, kind, years, start, end, today) as window:
+        found = [ticker for ticker in tickers if ticker in window.columns]
+        frame = window.frame(found)
+    return frame.dropna(how='all')
@@ -0,0 +1,247 @@
+# services/instrumentation.py
+import os
+import json
+import time
+import uuid
+import atexit
+import random
+import logging
+import threading
+import contextlib
+
+# Counters and timing histograms rendered in the Prometheus text format by
+# /metrics. Every process (gunicorn workers and job workers) counts in memory and
+# leaves a snapshot in METRICS_DIR at most every METRICS_FLUSH_SECONDS; the
+# process that serves /metrics adds the other processes' snapshots to its own
+# live values, so a scrape sees the whole deployment whichever worker answers.
+# Snapshots of processes that have exited are deleted when they are read.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join('data', 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+# Fraction of DEBUG payload log lines that are written; payloads are never
+# formatted unless DEBUG is enabled
+DEBUG_PAYLOAD_SAMPLE_RATE = float(os.getenv('DEBUG_PAYLOAD_SAMPLE_RATE', 1.0))
+
+# Upper bounds in seconds of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Time to handle a request, by endpoint, method and status'),
+    'span_duration_seconds': ('histogram', 'Time spent in a named stage of a request'),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result (hit, stale or miss)'),
+    'upstream_requests_total': ('counter', 'Calls to Yahoo Finance, FRED and Firestore'),
+    'upstream_errors_total': ('counter', 'Calls to Yahoo Finance, FRED and Firestore that raised'),
+    'single_flight_tickers_total': ('counter', 'Ticker downloads run or served by another download'),
+}
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flushed_at = time.monotonic()
+# Snapshots are named <pid>-<token>.json; the token tells this process from an
+# earlier one that had the same pid
+_process_token = uuid.uuid4().hex[:8]
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise ValueError(f"Unknown metric {name}")
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Add ``amount`` to the counter ``name`` with ``labels``."""
+    if not amount:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in the histogram ``name`` with ``labels``."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'sum': 0.0}
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+    _maybe_flush()
+
+
+@contextlib.contextmanager
+def span(name):
+    """Time the block as the stage ``name``, whether or not it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('span_duration_seconds', time.perf_counter() - started, span=name)
+
+
+@contextlib.contextmanager
+def upstream(service, kind):
+    """Count a call to an external ``service`` (and its failure) and time it as the span ``service_kind``."""
+    increment('upstream_requests_total', service=service, kind=kind)
+    try:
+        with span(f'{service}_{kind}'):
+            yield
+    except Exception:
+        increment('upstream_errors_total', service=service, kind=kind)
+        raise
+
+
+def log_payload(message, payload):
+    """Log ``message: payload`` at DEBUG for a DEBUG_PAYLOAD_SAMPLE_RATE fraction of calls."""
+    if logging.getLogger().isEnabledFor(logging.DEBUG) and random.random() < DEBUG_PAYLOAD_SAMPLE_RATE:
+        logging.debug(f"{message}: {payload}")
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, dict(labels), {**histogram, 'buckets': list(histogram['buckets'])}]
+                           for (name, labels), histogram in _histograms.items()],
+        }
+
+
+def _write():
+    # Called with _flush_lock held, so threads never share the temporary file
+    global _flushed_at
+    _flushed_at = time.monotonic()
+    snapshot = _snapshot()
+    path = os.path.join(METRICS_DIR, f'{os.getpid()}-{_process_token}.json')
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not write metrics snapshot {path}: {e}")
+
+
+def flush():
+    """Write this process's values for the process serving /metrics."""
+    with _flush_lock:
+        _write()
+
+
+def _maybe_flush():
+    if time.monotonic() - _flushed_at < METRICS_FLUSH_SECONDS:
+        return
+    # One thread writes the snapshot; the others carry on instead of waiting
+    if _flush_lock.acquire(blocking=False):
+        try:
+            if time.monotonic() - _flushed_at >= METRICS_FLUSH_SECONDS:
+                _write()
+        finally:
+            _flush_lock.release()
+
+
+def process_exists(pid):
+    """Whether a process with ``pid`` is running on this host."""
+    # os.kill terminates the process on Windows, where this cannot be told
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+def _other_snapshots():
+    own_pid = os.getpid()
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        stem = name[:-len('.tmp')] if name.endswith('.tmp') else name
+        if not stem.endswith('.json'):
+            continue
+        pid, _, token = stem[:-len('.json')].partition('-')
+        if not pid.isdigit():
+            continue
+        pid = int(pid)
+        if pid == own_pid and token == _process_token:
+            continue
+        # Left by a process that exited, possibly one whose pid was reused since
+        if pid == own_pid or not token or not process_exists(pid):
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(METRICS_DIR, name))
+            continue
+        if name != stem:
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            # Being replaced, or left half-written by a killed process
+            continue
+
+
+def _merged():
+    counters = {}
+    histograms = {}
+    for snapshot in [_snapshot(), *_other_snapshots()]:
+        for name, labels, value in snapshot['counters']:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = _key(name, labels)
+            total = histograms.setdefault(key, {'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'sum': 0.0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+            total['count'] += histogram['count']
+            total['sum'] += histogram['sum']
+    return counters, histograms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+
+def render():
+    """Every metric of every process in the Prometheus text exposition format."""
+    counters, histograms = _merged()
+    lines = []
+    for name, (metric_type, description) in METRICS.items():
+        values = counters if metric_type == 'counter' else histograms
+        series = sorted(((labels, value) for (metric, labels), value in values.items() if metric == name),
+                        key=lambda item: item[0])
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in series:
+            if metric_type == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, value['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", repr(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {value["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value["sum"]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+@atexit.register
+def _flush_at_exit():
+    if _counters or _histograms:
+        flush()
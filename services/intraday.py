@@ -0,0 +1,134 @@
+# services/intraday.py
+import os
+import time
+import threading
+import logging
+import datetime as dt
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+from services import instrumentation, single_flight
+
+# Intraday bars of the latest session, shared by every user holding the ticker.
+# Each ticker keeps the bars of one session date; a refresh only asks Yahoo for
+# bars from the last cached bar onwards (the last bar is still forming) and a new
+# session replaces the old one. Refreshes run at most every
+# INTRADAY_REFRESH_SECONDS while US markets are open and every
+# INTRADAY_CLOSED_REFRESH_SECONDS otherwise, so other exchanges still update.
+# The cache is a bounded LRU, so tickers nobody asks for any more age out.
+INTRADAY_INTERVAL = os.getenv('INTRADAY_INTERVAL', '15m')
+INTRADAY_REFRESH_SECONDS = float(os.getenv('INTRADAY_REFRESH_SECONDS', 60))
+INTRADAY_CLOSED_REFRESH_SECONDS = float(os.getenv('INTRADAY_CLOSED_REFRESH_SECONDS', 1800))
+INTRADAY_CACHE_SIZE = int(os.getenv('INTRADAY_CACHE_SIZE', 2000))
+
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+# The close is padded so the final bar of the session is picked up
+MARKET_OPEN = dt.time(9, 30)
+MARKET_CLOSE = dt.time(16, 15)
+
+_bars = OrderedDict()
+_lock = threading.Lock()
+
+
+def market_is_open(now=None):
+    now = (now or dt.datetime.now(dt.timezone.utc)).astimezone(MARKET_TIMEZONE)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def _latest_session(bars):
+    """Keep only the bars of the newest session date, in the exchange's timezone."""
+    bars = bars.dropna()
+    if bars.empty:
+        return bars
+    dates = bars.index.date
+    return bars[dates == dates.max()]
+
+
+def _download(tickers, interval, **window):
+    import pandas as pd
+    import yfinance as yf
+
+    data = yf.download(tickers, interval=interval, progress=False, group_by='column', **window)
+    if data is None or data.empty or 'Close' not in data.columns:
+        return {}
+    close = data['Close']
+    if isinstance(close, pd.Series):
+        close = close.to_frame(tickers[0])
+    return {ticker: close[ticker].dropna() for ticker in close.columns if close[ticker].notna().any()}
+
+
+def _merge(entry, fetched):
+    import pandas as pd
+
+    if entry is None:
+        return _latest_session(fetched)
+    combined = pd.concat([entry['bars'], fetched])
+    # A refetched bar replaces the cached one, which may have been incomplete
+    combined = combined[~combined.index.duplicated(keep='last')].sort_index()
+    return _latest_session(combined)
+
+
+def get_intraday_bars(tickers):
+    """Return ``{ticker: close Series}`` with the latest session's intraday bars."""
+    tickers = list(dict.fromkeys(tickers))
+    now = time.monotonic()
+    max_age = INTRADAY_REFRESH_SECONDS if market_is_open() else INTRADAY_CLOSED_REFRESH_SECONDS
+
+    with _lock:
+        entries = {ticker: _bars.get(ticker) for ticker in tickers}
+        for ticker, entry in entries.items():
+            if entry is not None:
+                _bars.move_to_end(ticker)
+    missing = [ticker for ticker, entry in entries.items() if entry is None]
+    stale = [ticker for ticker, entry in entries.items()
+             if entry is not None and now - entry['checked_at'] >= max_age]
+    instrumentation.increment('cache_requests_total', len(tickers) - len(missing) - len(stale),
+                              cache='intraday', result='hit')
+    instrumentation.increment('cache_requests_total', len(stale), cache='intraday', result='stale')
+    instrumentation.increment('cache_requests_total', len(missing), cache='intraday', result='miss')
+
+    fetched = {}
+    if missing:
+        logging.debug(f"Fetching intraday bars for {len(missing)} uncached symbols")
+        fetched.update(single_flight.fetch('intraday', missing, _download, interval=INTRADAY_INTERVAL, period='1d'))
+    if stale:
+        # One batched call from the oldest last bar among the stale symbols
+        since = min(entries[ticker]['bars'].index[-1] for ticker in stale)
+        logging.debug(f"Fetching intraday bars since {since} for {len(stale)} symbols")
+        fetched.update(single_flight.fetch('intraday', stale, _download, interval=INTRADAY_INTERVAL, start=since))
+
+    checked_at = time.monotonic()
+    with _lock:
+        for ticker in missing + stale:
+            entry = _bars.get(ticker)
+            if ticker in fetched:
+                bars = _merge(entry, fetched[ticker])
+            elif entry is not None:
+                bars = entry['bars']
+            else:
+                continue
+            _bars[ticker] = {'bars': bars, 'checked_at': checked_at}
+            _bars.move_to_end(ticker)
+        result = {ticker: _bars[ticker]['bars'] for ticker in tickers if ticker in _bars}
+        while len(_bars) > INTRADAY_CACHE_SIZE:
+            _bars.popitem(last=False)
+
+    unpriced = [ticker for ticker in tickers if ticker not in result]
+    if unpriced:
+        raise ValueError(f"No intraday data found for: {', '.join(unpriced)}")
+    return result
+
+
+def portfolio_intraday_values(holdings):
+    """Portfolio value per intraday bar for ``{ticker: shares}``.
+
+    The bars are aligned into one price matrix (a ticker without a bar at some
+    timestamp carries its previous price forward, or counts as zero before its
+    first bar) and multiplied by the shares vector.
+    """
+    import numpy as np
+    import pandas as pd
+
+    bars = get_intraday_bars(list(holdings))
+    prices = pd.concat(bars, axis=1).sort_index().ffill()
+    shares = np.array([holdings[ticker] for ticker in prices.columns], dtype=float)
+    return pd.Series(np.nan_to_num(prices.to_numpy()) @ shares, index=prices.index)
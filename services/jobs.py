@@ -0,0 +1,178 @@
+# services/jobs.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import importlib
+import threading
+import multiprocessing
+from services.instrumentation import process_exists
+
+# Long-running simulations and optimizations run in a process pool instead of
+# tying up a gunicorn worker. Job state lives in SQLite so that any worker can
+# answer a status request, whichever worker accepted the job.
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join('data', 'jobs.sqlite'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_RESULT_TTL_SECONDS = float(os.getenv('JOB_RESULT_TTL_SECONDS', 3600))
+# A queued or running job that has not reported for this long is failed
+JOB_TIMEOUT_SECONDS = float(os.getenv('JOB_TIMEOUT_SECONDS', 3600))
+
+# Job kind -> "module:function"; the function takes (payload, progress=None)
+JOB_KINDS = {
+    'optimize-portfolio': 'endpoints.optimize_portfolio:run_optimize_portfolio',
+    'monte-carlo-var': 'endpoints.monte_carlo_var:run_monte_carlo_var',
+    'monte-carlo-optimize': 'endpoints.monte_carlo_optimize:run_monte_carlo_optimization',
+    'efficient-frontier': 'endpoints.efficient_frontier:run_efficient_frontier',
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _connect():
+    directory = os.path.dirname(JOB_STORE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(JOB_STORE_PATH, timeout=30)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, progress REAL NOT NULL, '
+        'result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, pid INTEGER)'
+    )
+    # pid is the process a job waits in (the submitting worker) or runs in (a pool process)
+    if 'pid' not in {column[1] for column in conn.execute('PRAGMA table_info(jobs)')}:
+        conn.execute('ALTER TABLE jobs ADD COLUMN pid INTEGER')
+    return conn
+
+
+def _update(job_id, expected_status, **fields):
+    """Update a job that is still in ``expected_status``; returns whether it was.
+
+    A job failed as abandoned stays failed even if its task finishes later.
+    """
+    fields['updated_at'] = time.time()
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    conn = _connect()
+    try:
+        cursor = conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ? AND status = ?',
+                              (*fields.values(), job_id, expected_status))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def _fail_abandoned(conn):
+    """Fail queued or running jobs whose process is gone (e.g. a restart) or that stopped reporting."""
+    now = time.time()
+    rows = conn.execute("SELECT id, updated_at, pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+    for job_id, updated_at, pid in rows:
+        if pid is not None and not process_exists(pid):
+            error = 'Job was lost when its worker process stopped'
+        elif updated_at < now - JOB_TIMEOUT_SECONDS:
+            error = f'Job timed out after {JOB_TIMEOUT_SECONDS:.0f} seconds without progress'
+        else:
+            continue
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'running')",
+            (error, now, job_id)
+        )
+
+
+def _purge_expired(conn):
+    _fail_abandoned(conn)
+    conn.execute(
+        "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+        (time.time() - JOB_RESULT_TTL_SECONDS,)
+    )
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn keeps the children independent of the web worker's threads and sockets
+            _pool = multiprocessing.get_context('spawn').Pool(processes=JOB_WORKERS)
+        return _pool
+
+
+def _run_job(job_id, kind, payload):
+    # Runs in a pool process
+    module_name, function_name = JOB_KINDS[kind].split(':')
+    function = getattr(importlib.import_module(module_name), function_name)
+    last_reported = [0.0]
+
+    def progress(fraction):
+        # Throttle progress writes to whole percents
+        if fraction - last_reported[0] >= 0.01:
+            last_reported[0] = fraction
+            _update(job_id, 'running', progress=round(min(fraction, 1.0), 2))
+
+    if not _update(job_id, 'queued', status='running', pid=os.getpid()):
+        logging.warning(f"Job {job_id} ({kind}) was failed or expired before it started")
+        return
+    try:
+        result = function(payload, progress)
+        finished = _update(job_id, 'running', status='succeeded', progress=1.0, result=json.dumps(result))
+    except Exception as e:
+        logging.error(f"Job {job_id} ({kind}) failed: {e}")
+        finished = _update(job_id, 'running', status='failed', error=getattr(e, 'description', None) or str(e))
+    if not finished:
+        logging.warning(f"Job {job_id} ({kind}) finished after it was failed as abandoned")
+
+
+def submit_job(kind, payload):
+    """Queue ``payload`` for the ``kind`` computation and return the new job id."""
+    if kind not in JOB_KINDS:
+        raise KeyError(kind)
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    try:
+        _purge_expired(conn)
+        conn.execute(
+            'INSERT INTO jobs (id, kind, status, progress, created_at, updated_at, pid) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, 'queued', 0.0, now, now, os.getpid())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    _get_pool().apply_async(_run_job, (job_id, kind, payload))
+    logging.debug(f"Queued job {job_id} ({kind})")
+    return job_id
+
+
+def get_job(job_id):
+    """Job status, progress and, once finished, the result or error; None if unknown or expired."""
+    conn = _connect()
+    try:
+        _purge_expired(conn)
+        conn.commit()
+        row = conn.execute(
+            'SELECT kind, status, progress, result, error, created_at, updated_at FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    kind, status, progress, result, error, created_at, updated_at = row
+    job = {
+        'job_id': job_id,
+        'kind': kind,
+        'status': status,
+        'progress': progress,
+        'created_at': created_at,
+        'updated_at': updated_at,
+    }
+    if result is not None:
+        job['result'] = json.loads(result)
+    if error is not None:
+        job['error'] = error
+    return job
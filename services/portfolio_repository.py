@@ -0,0 +1,204 @@
+# services/portfolio_repository.py
+import os
+import copy
+import time
+import threading
+import logging
+from firebase_config import get_db
+from services import instrumentation
+
+# Each user has one portfolio document inside their own `portfolios_<user_id>`
+# collection. The document reference is resolved once and reads are served from
+# an in-process cache that is dropped on every write through this module; the
+# short TTL bounds staleness from writes made by other workers.
+PORTFOLIO_CACHE_TTL_SECONDS = float(os.getenv('PORTFOLIO_CACHE_TTL_SECONDS', 30))
+
+COLLECTION_PREFIX = 'portfolios_'
+
+# Document references per batched get_all() call
+BATCH_READ_SIZE = 300
+
+_doc_refs = {}
+_cache = {}
+_lock = threading.Lock()
+
+
+def _collection(user_id):
+    return get_db().collection(f'{COLLECTION_PREFIX}{user_id}')
+
+
+def _remember(user_id, doc_ref, data):
+    with _lock:
+        _doc_refs[user_id] = doc_ref
+        _cache[user_id] = (data, time.monotonic())
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def _resolve(user_id):
+    # One query both finds the document and returns its data
+    with instrumentation.upstream('firestore', 'query'):
+        docs = list(_collection(user_id).limit(1).stream())
+    for doc in docs:
+        data = doc.to_dict() or {}
+        _remember(user_id, doc.reference, data)
+        return doc.reference, data
+    with _lock:
+        _doc_refs.pop(user_id, None)
+        _cache.pop(user_id, None)
+    return None, None
+
+
+def get_document_ref(user_id):
+    with _lock:
+        doc_ref = _doc_refs.get(user_id)
+    if doc_ref is None:
+        doc_ref, _ = _resolve(user_id)
+    return doc_ref
+
+
+def get_portfolio(user_id):
+    """Return a copy of the user's portfolio document, or None if they have none."""
+    with _lock:
+        entry = _cache.get(user_id)
+        doc_ref = _doc_refs.get(user_id)
+    if entry and time.monotonic() - entry[1] < PORTFOLIO_CACHE_TTL_SECONDS:
+        instrumentation.increment('cache_requests_total', cache='portfolios', result='hit')
+        return copy.deepcopy(entry[0])
+
+    instrumentation.increment('cache_requests_total', cache='portfolios', result='miss')
+    if doc_ref is not None:
+        with instrumentation.upstream('firestore', 'get'):
+            snapshot = doc_ref.get()
+        if snapshot.exists:
+            data = snapshot.to_dict() or {}
+            _remember(user_id, doc_ref, data)
+            return copy.deepcopy(data)
+
+    _, data = _resolve(user_id)
+    return copy.deepcopy(data)
+
+
+def list_user_ids():
+    """User ids of every portfolio collection."""
+    return [collection.id[len(COLLECTION_PREFIX):] for collection in get_db().collections()
+            if collection.id.startswith(COLLECTION_PREFIX)]
+
+
+def get_portfolios(user_ids):
+    """Return ``{user_id: portfolio copy or None}``, reading known documents in batches.
+
+    Cached portfolios are served from memory and users whose document reference is
+    known are read together with ``get_all``; only users seen for the first time
+    need a query of their own collection.
+    """
+    now = time.monotonic()
+    portfolios = {}
+    known = {}
+    hits = 0
+    with _lock:
+        for user_id in dict.fromkeys(user_ids):
+            entry = _cache.get(user_id)
+            if entry and now - entry[1] < PORTFOLIO_CACHE_TTL_SECONDS:
+                portfolios[user_id] = copy.deepcopy(entry[0])
+                hits += 1
+            elif user_id in _doc_refs:
+                known[user_id] = _doc_refs[user_id]
+            else:
+                portfolios[user_id] = None
+    instrumentation.increment('cache_requests_total', hits, cache='portfolios', result='hit')
+    instrumentation.increment('cache_requests_total', len(known) + len(portfolios) - hits,
+                              cache='portfolios', result='miss')
+
+    users_by_path = {doc_ref.path: user_id for user_id, doc_ref in known.items()}
+    refs = list(known.values())
+    for start in range(0, len(refs), BATCH_READ_SIZE):
+        with instrumentation.upstream('firestore', 'get_all'):
+            snapshots = list(get_db().get_all(refs[start:start + BATCH_READ_SIZE]))
+        for snapshot in snapshots:
+            user_id = users_by_path[snapshot.reference.path]
+            if snapshot.exists:
+                data = snapshot.to_dict() or {}
+                _remember(user_id, snapshot.reference, data)
+                portfolios[user_id] = copy.deepcopy(data)
+            else:
+                portfolios[user_id] = None
+
+    for user_id, data in portfolios.items():
+        if data is None:
+            _, data = _resolve(user_id)
+            portfolios[user_id] = copy.deepcopy(data)
+    return portfolios
+
+
+def create_portfolio(user_id, data):
+    with instrumentation.upstream('firestore', 'write'):
+        _, doc_ref = _collection(user_id).add(data)
+    _remember(user_id, doc_ref, copy.deepcopy(data))
+    logging.debug(f"Created portfolio document for user_id {user_id}")
+    return doc_ref
+
+
+def update_portfolio(user_id, fields):
+    """Blind update of top-level fields; returns False when the user has no document."""
+    doc_ref = get_document_ref(user_id)
+    if doc_ref is None:
+        return False
+    with instrumentation.upstream('firestore', 'write'):
+        doc_ref.update(fields)
+    invalidate(user_id)
+    return True
+
+
+def delete_portfolio(user_id):
+    doc_ref = get_document_ref(user_id)
+    if doc_ref is None:
+        return False
+    with instrumentation.upstream('firestore', 'write'):
+        doc_ref.delete()
+    with _lock:
+        _doc_refs.pop(user_id, None)
+        _cache.pop(user_id, None)
+    return True
+
+
+def update_in_transaction(user_id, mutate):
+    """Read-modify-write the user's document in a Firestore transaction.
+
+    ``mutate`` receives the current document data and returns the fields to update,
+    or None to leave the document untouched. Exceptions raised by ``mutate`` abort
+    the transaction and propagate. Returns False when the user has no document.
+    """
+    from firebase_admin import firestore
+
+    doc_ref = get_document_ref(user_id)
+
+    @firestore.transactional
+    def apply(transaction, doc_ref):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+        updates = mutate(snapshot.to_dict() or {})
+        if updates:
+            transaction.update(doc_ref, updates)
+        return True
+
+    # A cached reference may point at a document deleted by another worker;
+    # it is resolved again once before the user is reported as having none
+    for attempt in range(2):
+        if doc_ref is None:
+            return False
+        try:
+            with instrumentation.upstream('firestore', 'transaction'):
+                applied = apply(get_db().transaction(), doc_ref)
+        finally:
+            invalidate(user_id)
+        if applied:
+            return True
+        with _lock:
+            _doc_refs.pop(user_id, None)
+        doc_ref = _resolve(user_id)[0] if attempt == 0 else None
+    return False
@@ -0,0 +1,156 @@
+# services/positions.py
+import re
+import logging
+from services.portfolio_repository import create_portfolio, update_in_transaction
+
+# A portfolio document holds its positions as a `positions` map of
+# {ticker: shares} next to a `positions_version` counter that every mutation
+# increments. A mutation writes one field path per ticker it touches, so its
+# cost does not grow with the size of the portfolio and a ticker can never be
+# listed twice. Documents written before the map existed keep a `tickers` list
+# of {ticker, value} rows; it is read as a map (duplicate rows summed) and
+# replaced by one on the first mutation.
+POSITION_OPERATIONS = ('add', 'update', 'remove')
+
+# Operations per batch; one Firestore write carries all of them
+MAX_BATCH_OPERATIONS = 500
+
+# Field names Firestore accepts in a path without backtick quoting
+_SIMPLE_FIELD = re.compile(r'^[_a-zA-Z][_a-zA-Z0-9]*$')
+
+
+class VersionConflict(Exception):
+    """The portfolio changed since the version the caller expected."""
+
+    def __init__(self, expected, current):
+        super().__init__(f"Expected positions version {expected}, found {current}")
+        self.expected = expected
+        self.current = current
+
+
+def positions(data):
+    """``{ticker: shares}`` of a portfolio document (None or {} for none)."""
+    data = data or {}
+    if 'positions' in data:
+        return dict(data['positions'])
+    holdings = {}
+    for ticker in data.get('tickers', []):
+        holdings[ticker['ticker']] = holdings.get(ticker['ticker'], 0) + ticker['value']
+    return holdings
+
+
+def position_list(data):
+    """Positions as the ``[{'ticker', 'value'}]`` list the API returns, one row per ticker."""
+    return [{'ticker': ticker, 'value': value} for ticker, value in positions(data).items()]
+
+
+def replacement_fields(tickers):
+    """Update fields that replace every position with a ``[{'ticker', 'value'}]`` list."""
+    from firebase_admin import firestore
+
+    return {
+        'positions': positions({'tickers': tickers}),
+        'positions_version': firestore.Increment(1),
+        'tickers': firestore.DELETE_FIELD,
+    }
+
+
+def validate_operations(operations):
+    """Check a list of ``{'op', 'ticker', 'value'}`` operations; raises ValueError on the first bad one."""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('Operations must be a non-empty list')
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f'At most {MAX_BATCH_OPERATIONS} operations are allowed per batch')
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in POSITION_OPERATIONS:
+            raise ValueError(f"Each operation must have an op of: {', '.join(POSITION_OPERATIONS)}")
+        if not isinstance(operation.get('ticker'), str) or not operation['ticker']:
+            raise ValueError('Each operation must have a ticker')
+        if operation['op'] == 'remove':
+            continue
+        value = operation.get('value')
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"The {operation['op']} of {operation['ticker']} needs a numeric value")
+        if operation['op'] == 'add' and value <= 0:
+            raise ValueError(f"The add of {operation['ticker']} needs a positive value")
+        if operation['op'] == 'update' and value < 0:
+            raise ValueError(f"The update of {operation['ticker']} needs a value of at least 0")
+
+
+def _apply(holdings, operations):
+    """Apply ``operations`` to ``holdings`` in place; returns the tickers they touched."""
+    touched = set()
+    for operation in operations:
+        ticker = operation['ticker']
+        if operation['op'] == 'add':
+            holdings[ticker] = holdings.get(ticker, 0) + operation['value']
+        elif operation['op'] == 'update':
+            if ticker not in holdings:
+                raise LookupError(ticker)
+            # A value of 0 closes the position
+            if operation['value'] == 0:
+                del holdings[ticker]
+            else:
+                holdings[ticker] = operation['value']
+        else:
+            holdings.pop(ticker, None)
+        touched.add(ticker)
+    return touched
+
+
+def _field_path(ticker):
+    # Tickers such as BRK.B or ^GSPC must be quoted to stay one map key
+    if _SIMPLE_FIELD.match(ticker):
+        return f'positions.{ticker}'
+    return 'positions.`' + ticker.replace('\\', '\\\\').replace('`', '\\`') + '`'
+
+
+def apply_operations(user_id, operations, expected_version=None):
+    """Apply add/update/remove ``operations`` to the user's positions in one transaction.
+
+    Operations are validated with ``validate_operations`` and applied in order:
+    ``add`` increases a position (opening it if needed), ``update`` sets it (0
+    closes it) and ``remove`` closes it if open. Either all of them are applied
+    or none. Raises LookupError for an update of a ticker that is not held and
+    VersionConflict when ``expected_version`` is given and is not the current
+    version. A user without a portfolio gets one if the operations leave
+    positions open. Returns the new version, or None when the user has no
+    portfolio and none was created (including when an operation updates a
+    ticker).
+    """
+    from firebase_admin import firestore
+
+    validate_operations(operations)
+    new_version = None
+
+    def mutate(existing_data):
+        nonlocal new_version
+        current = existing_data.get('positions_version', 0)
+        if expected_version is not None and expected_version != current:
+            raise VersionConflict(expected_version, current)
+        holdings = positions(existing_data)
+        touched = _apply(holdings, operations)
+        new_version = current + 1
+        if 'positions' not in existing_data:
+            # First mutation of a document with the old tickers list
+            return {'positions': holdings, 'positions_version': new_version, 'tickers': firestore.DELETE_FIELD}
+        updates = {_field_path(ticker): holdings.get(ticker, firestore.DELETE_FIELD) for ticker in touched}
+        updates['positions_version'] = new_version
+        return updates
+
+    if update_in_transaction(user_id, mutate):
+        return new_version
+
+    if expected_version not in (None, 0):
+        raise VersionConflict(expected_version, 0)
+    holdings = {}
+    try:
+        _apply(holdings, operations)
+    except LookupError:
+        # Nothing is held without a portfolio
+        return None
+    if not holdings:
+        return None
+    create_portfolio(user_id, {'user_id': user_id, 'positions': holdings, 'positions_version': 1})
+    logging.debug(f"Created portfolio with {len(holdings)} positions for user_id {user_id}")
+    return 1
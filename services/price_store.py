@@ -0,0 +1,188 @@
+# services/price_store.py
+import os
+import sqlite3
+import threading
+import logging
+import datetime as dt
+import pandas as pd
+import yfinance as yf
+from services import single_flight
+
+# Local on-disk store of daily closes, one series per ticker. The analytics
+# endpoints read through it so that each ticker's history is downloaded once
+# and afterwards only the bars newer than the last stored date are appended.
+PRICE_STORE_PATH = os.getenv('PRICE_STORE_PATH', os.path.join('data', 'prices.sqlite'))
+
+DATE_FORMAT = '%Y-%m-%d'
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    directory = os.path.dirname(PRICE_STORE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(PRICE_STORE_PATH, timeout=30)
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS prices ('
+                'ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL, '
+                'PRIMARY KEY (ticker, date))'
+            )
+            # first_date is the earliest date the stored series covers, last_date the
+            # newest stored bar and checked_on the day we last asked Yahoo for new bars.
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS series ('
+                'ticker TEXT PRIMARY KEY, first_date TEXT, last_date TEXT, checked_on TEXT)'
+            )
+            conn.commit()
+            _schema_ready = True
+    return conn
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        return dt.datetime.strptime(value[:10], DATE_FORMAT).date()
+    if isinstance(value, dt.datetime):
+        return value.date()
+    return value
+
+
+def _extract_close(frame, ticker):
+    if frame is None or frame.empty or 'Close' not in frame.columns:
+        return pd.Series(dtype=float)
+    close = frame['Close']
+    # Newer yfinance releases return (field, ticker) columns even for one ticker
+    if isinstance(close, pd.DataFrame):
+        close = close[ticker] if ticker in close.columns else close.iloc[:, 0]
+    return close.dropna()
+
+
+def _download_closes(tickers, start, end, interval):
+    return {ticker: _extract_close(yf.download(ticker, start=start, end=end, interval=interval, progress=False), ticker)
+            for ticker in tickers}
+
+
+def _download(ticker, start, end):
+    # Concurrent syncs of the same ticker and range share one download
+    closes = single_flight.fetch('history', [ticker], _download_closes, start=start, end=end, interval='1d')
+    return closes[ticker]
+
+
+def _write_bars(conn, ticker, close):
+    rows = [(ticker, index.strftime(DATE_FORMAT), float(value)) for index, value in close.items()]
+    conn.executemany('INSERT OR REPLACE INTO prices (ticker, date, close) VALUES (?, ?, ?)', rows)
+
+
+def _sync_ticker(conn, ticker, start, end):
+    today = dt.date.today()
+    row = conn.execute(
+        'SELECT first_date, last_date, checked_on FROM series WHERE ticker = ?', (ticker,)
+    ).fetchone()
+
+    # A failed download comes back as an empty frame, so the series markers only
+    # move when bars arrive. Refreshes overlap a stored bar: a reply holding just
+    # that bar shows Yahoo answered and has nothing else for the range.
+    try:
+        if row is None:
+            logging.debug(f"Price store miss for {ticker}, downloading from {start}")
+            close = _download(ticker, start, today + dt.timedelta(days=1))
+            if close.empty:
+                # Unknown ticker or failed download; the next request asks again
+                logging.warning(f"No price history downloaded for {ticker}")
+                return
+            _write_bars(conn, ticker, close)
+            last_date = close.index[-1].strftime(DATE_FORMAT)
+            conn.execute(
+                'INSERT OR REPLACE INTO series (ticker, first_date, last_date, checked_on) VALUES (?, ?, ?, ?)',
+                (ticker, start.strftime(DATE_FORMAT), last_date, today.strftime(DATE_FORMAT))
+            )
+            conn.commit()
+            return
+
+        first_date, last_date, checked_on = row
+
+        # Backfill when a request reaches further back than the stored series
+        if start < _to_date(first_date):
+            first_bar = conn.execute('SELECT MIN(date) FROM prices WHERE ticker = ?', (ticker,)).fetchone()[0]
+            backfill_end = _to_date(first_bar) + dt.timedelta(days=1) if first_bar else _to_date(first_date)
+            logging.debug(f"Backfilling {ticker} from {start} to {backfill_end}")
+            close = _download(ticker, start, backfill_end)
+            if close.empty:
+                logging.warning(f"Could not backfill {ticker} from {start}, using stored bars")
+            else:
+                _write_bars(conn, ticker, close)
+                conn.execute('UPDATE series SET first_date = ? WHERE ticker = ?', (start.strftime(DATE_FORMAT), ticker))
+                conn.commit()
+
+        # Append only the bars from the last stored date on, at most once a day
+        if checked_on is None or _to_date(checked_on) < min(end, today):
+            fetch_from = _to_date(last_date) if last_date else start
+            logging.debug(f"Fetching new bars for {ticker} from {fetch_from}")
+            close = _download(ticker, fetch_from, today + dt.timedelta(days=1))
+            if close.empty:
+                logging.warning(f"Could not fetch new bars for {ticker}, using stored bars")
+                return
+            close = close[close.index >= pd.Timestamp(fetch_from)]
+            _write_bars(conn, ticker, close)
+            if not close.empty:
+                last_date = close.index[-1].strftime(DATE_FORMAT)
+            conn.execute(
+                'UPDATE series SET last_date = ?, checked_on = ? WHERE ticker = ?',
+                (last_date, today.strftime(DATE_FORMAT), ticker)
+            )
+            conn.commit()
+    except Exception as e:
+        # Serve whatever is stored when Yahoo is unreachable
+        conn.rollback()
+        logging.warning(f"Could not refresh price history for {ticker}, using stored bars: {e}")
+
+
+def stored_tickers():
+    """Every ticker the store has been asked for."""
+    conn = _connect()
+    try:
+        return [row[0] for row in conn.execute('SELECT ticker FROM series ORDER BY ticker')]
+    finally:
+        conn.close()
+
+
+def stored_ticker_count():
+    """Number of tickers the store has been asked for; it only grows."""
+    conn = _connect()
+    try:
+        return conn.execute('SELECT COUNT(*) FROM series').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_close_history(tickers, start_date, end_date=None):
+    """Return daily closes for ``tickers`` in [start_date, end_date) as a DataFrame.
+
+    Columns follow the order of ``tickers``; tickers without any data are omitted.
+    """
+    start = _to_date(start_date)
+    end = _to_date(end_date) if end_date is not None else dt.date.today() + dt.timedelta(days=1)
+
+    conn = _connect()
+    try:
+        columns = {}
+        for ticker in tickers:
+            _sync_ticker(conn, ticker, start, end)
+            rows = conn.execute(
+                'SELECT date, close FROM prices WHERE ticker = ? AND date >= ? AND date < ? ORDER BY date',
+                (ticker, start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT))
+            ).fetchall()
+            if rows:
+                dates, closes = zip(*rows)
+                columns[ticker] = pd.Series(closes, index=pd.to_datetime(dates), dtype=float)
+    finally:
+        conn.close()
+
+    if not columns:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
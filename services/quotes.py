@@ -0,0 +1,78 @@
+# services/quotes.py
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from services import instrumentation, single_flight
+
+# Last prices are kept in-process for a short time so that valuing a portfolio
+# costs at most one batched Yahoo call for the symbols that are not cached yet.
+# The cache is a bounded LRU, so symbols that stop being asked for age out.
+QUOTE_TTL_SECONDS = float(os.getenv('QUOTE_TTL_SECONDS', 60))
+QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', 10000))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _download_last_prices(tickers, period):
+    import pandas as pd
+    import yfinance as yf
+
+    data = yf.download(tickers, period=period, progress=False, group_by='column')
+    if data is None or data.empty or 'Close' not in data.columns:
+        return {}
+    close = data['Close']
+    if isinstance(close, pd.Series):
+        close = close.to_frame(tickers[0])
+    last = close.ffill().iloc[-1]
+    return {ticker: float(price) for ticker, price in last.items() if pd.notna(price)}
+
+
+def fetch_last_prices(tickers, max_age=None):
+    """Return ``{ticker: last close}`` for the symbols that have a price.
+
+    Symbols cached within ``max_age`` seconds (default QUOTE_TTL_SECONDS) are
+    served from memory; the rest are fetched in one call and cached.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    max_age = QUOTE_TTL_SECONDS if max_age is None else max_age
+    now = time.monotonic()
+    prices = {}
+    missing = []
+
+    with _cache_lock:
+        for ticker in tickers:
+            entry = _cache.get(ticker)
+            if entry and now - entry[1] < max_age:
+                _cache.move_to_end(ticker)
+                prices[ticker] = entry[0]
+            else:
+                missing.append(ticker)
+    instrumentation.increment('cache_requests_total', len(prices), cache='quotes', result='hit')
+    instrumentation.increment('cache_requests_total', len(missing), cache='quotes', result='miss')
+
+    if missing:
+        logging.debug(f"Fetching quotes for {len(missing)} symbols")
+        # A few days of history so symbols that have not traded today still get a price
+        fetched = single_flight.fetch('quotes', missing, _download_last_prices, period='5d')
+        fetched_at = time.monotonic()
+        with _cache_lock:
+            for ticker, price in fetched.items():
+                _cache[ticker] = (price, fetched_at)
+                _cache.move_to_end(ticker)
+            while len(_cache) > QUOTE_CACHE_SIZE:
+                _cache.popitem(last=False)
+        prices.update(fetched)
+
+    return prices
+
+
+def get_last_prices(tickers):
+    """Return ``{ticker: last close}`` for ``tickers``, fetching uncached symbols in one call."""
+    prices = fetch_last_prices(tickers)
+    unpriced = [ticker for ticker in dict.fromkeys(tickers) if ticker not in prices]
+    if unpriced:
+        raise ValueError(f"No price data found for: {', '.join(unpriced)}")
+    return prices
@@ -0,0 +1,131 @@
+# services/rates.py
+import os
+import json
+import time
+import threading
+import logging
+import datetime as dt
+from fred_config import get_fred
+from services import instrumentation
+
+# The risk-free rate moves at most once a day, so the latest observation of each
+# FRED series is kept in-process for RISK_FREE_TTL_SECONDS and mirrored to a small
+# JSON file. A stale value is served immediately while one background thread
+# refreshes it, and the last known value is used whenever FRED cannot be reached.
+RISK_FREE_SERIES = os.getenv('RISK_FREE_SERIES', 'GS10')
+RISK_FREE_TTL_SECONDS = float(os.getenv('RISK_FREE_TTL_SECONDS', 6 * 3600))
+RATE_CACHE_PATH = os.getenv('RATE_CACHE_PATH', os.path.join('data', 'rates.json'))
+
+# After a failed refresh the last known value is kept for this long before retrying
+RETRY_AFTER_FAILURE_SECONDS = 300
+
+# Only the recent tail of the series is requested; a year covers monthly series too
+LOOKBACK_DAYS = 400
+
+_rates = {}
+_refreshing = set()
+_lock = threading.Lock()
+_loaded = False
+
+
+def _load_persisted():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(RATE_CACHE_PATH) as f:
+            persisted = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable rate cache {RATE_CACHE_PATH}: {e}")
+        return
+    for series, entry in persisted.items():
+        # Persisted values are treated as stale so the first use refreshes them
+        _rates.setdefault(series, {**entry, 'fetched_at': None})
+
+
+def _persist():
+    snapshot = {series: {'rate': entry['rate'], 'date': entry['date']} for series, entry in _rates.items()}
+    directory = os.path.dirname(RATE_CACHE_PATH)
+    try:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{RATE_CACHE_PATH}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, RATE_CACHE_PATH)
+    except OSError as e:
+        logging.warning(f"Could not write rate cache {RATE_CACHE_PATH}: {e}")
+
+
+def _fetch(series):
+    start = dt.date.today() - dt.timedelta(days=LOOKBACK_DAYS)
+    with instrumentation.upstream('fred', 'series'):
+        observations = get_fred().get_series(series, observation_start=start).dropna()
+    if observations.empty:
+        raise ValueError(f"FRED returned no observations for {series}")
+    return float(observations.iloc[-1]) / 100, observations.index[-1].strftime('%Y-%m-%d')
+
+
+def refresh(series=None):
+    """Fetch the latest observation of ``series`` from FRED and cache it."""
+    series = series or RISK_FREE_SERIES
+    rate, date = _fetch(series)
+    with _lock:
+        _rates[series] = {'rate': rate, 'date': date, 'fetched_at': time.monotonic()}
+        _persist()
+    logging.debug(f"Refreshed {series}: {rate} as of {date}")
+    return rate
+
+
+def _refresh_in_background(series):
+    with _lock:
+        if series in _refreshing:
+            return
+        _refreshing.add(series)
+
+    def run():
+        try:
+            refresh(series)
+        except Exception as e:
+            logging.warning(f"Background refresh of {series} failed, keeping last known value: {e}")
+            with _lock:
+                entry = _rates.get(series)
+                if entry is not None:
+                    retry_delay = min(RETRY_AFTER_FAILURE_SECONDS, RISK_FREE_TTL_SECONDS)
+                    entry['fetched_at'] = time.monotonic() - RISK_FREE_TTL_SECONDS + retry_delay
+        finally:
+            with _lock:
+                _refreshing.discard(series)
+
+    threading.Thread(target=run, name=f'rate-refresh-{series}', daemon=True).start()
+
+
+def get_risk_free_rate(series=None):
+    """Latest value of the FRED ``series`` (default RISK_FREE_SERIES) as a decimal rate.
+
+    Fresh cached values are returned as is. A stale value is returned immediately
+    and refreshed in the background. With nothing cached the call fetches from
+    FRED, and raises only if FRED fails and no value was ever recorded.
+    """
+    series = series or RISK_FREE_SERIES
+    with _lock:
+        _load_persisted()
+        entry = _rates.get(series)
+
+    if entry is not None:
+        fetched_at = entry['fetched_at']
+        if fetched_at is None or time.monotonic() - fetched_at >= RISK_FREE_TTL_SECONDS:
+            instrumentation.increment('cache_requests_total', cache='rates', result='stale')
+            _refresh_in_background(series)
+        else:
+            instrumentation.increment('cache_requests_total', cache='rates', result='hit')
+        return entry['rate']
+
+    instrumentation.increment('cache_requests_total', cache='rates', result='miss')
+    try:
+        return refresh(series)
+    except Exception as e:
+        raise RuntimeError(f"Risk-free rate {series} is unavailable: {e}") from e
@@ -0,0 +1,56 @@
+# services/result_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+import datetime as dt
+from collections import OrderedDict
+from services import instrumentation
+
+# Results of deterministic computations, keyed by a digest of their canonical
+# inputs plus the date of the market data (the covariance windows and the price
+# store move forward once a day). Identical requests - e.g. many users holding
+# the same model ETF basket - are answered from a bounded LRU with a TTL, and the
+# digest doubles as the response ETag so clients can revalidate without a body.
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 512))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', 900))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def result_key(kind, params):
+    """Digest of the JSON-serializable ``params`` of a ``kind`` computation on today's data."""
+    canonical = json.dumps({'kind': kind, 'as_of': dt.date.today().isoformat(), 'params': params},
+                           sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+def cached(key, compute):
+    """The stored result for ``key``, or ``compute()`` stored under it."""
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry[1] < RESULT_CACHE_TTL_SECONDS:
+            _cache.move_to_end(key)
+            hit = True
+        else:
+            hit = False
+    if hit:
+        instrumentation.increment('cache_requests_total', cache='results', result='hit')
+        return entry[0]
+
+    instrumentation.increment('cache_requests_total', cache='results', result='miss')
+    value = compute()
+    with _lock:
+        _cache[key] = (value, time.monotonic())
+        _cache.move_to_end(key)
+        while len(_cache) > RESULT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,281 @@
+# services/return_matrix.py
+import os
+import json
+import time
+import threading
+import logging
+import contextlib
+import datetime as dt
+import numpy as np
+import pandas as pd
+from services.price_store import get_close_history, stored_tickers
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers run a single process
+    fcntl = None
+
+# Date-aligned daily log returns of every ticker in the price store over the last
+# RETURN_MATRIX_YEARS years, written once as a raw float64 file in column-major
+# order and memory-mapped read-only by every worker, so the pages are shared
+# through the OS page cache instead of being copied into each process. A column
+# (one ticker's history) is contiguous, so slicing a few tickers touches only
+# their pages. current.json points at the latest version; it is rebuilt once a
+# day and new tickers are appended as extra columns in place.
+RETURN_MATRIX_DIR = os.getenv('RETURN_MATRIX_DIR', os.path.join('data', 'returns'))
+RETURN_MATRIX_YEARS = int(os.getenv('RETURN_MATRIX_YEARS', 30))
+
+# How often a worker looks for a newer version of the matrix
+RETURN_MATRIX_CHECK_SECONDS = 5
+
+# Calendar days fetched before the start so the first return has a previous close
+LOOKBACK_PADDING_DAYS = 10
+
+POINTER_FILE = 'current.json'
+
+_current = None
+_checked_at = 0.0
+_building = False
+_lock = threading.Lock()
+
+
+class ReturnMatrix:
+    """A read-only mapping of one version of the matrix."""
+
+    def __init__(self, index):
+        self.version = index['version']
+        self.data_file = index['data_file']
+        self.start = dt.date.fromisoformat(index['start'])
+        self.built_on = dt.date.fromisoformat(index['built_on'])
+        self.dates = pd.DatetimeIndex(index['dates'])
+        self.tickers = index['tickers']
+        self.columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        shape = (len(self.dates), len(self.tickers))
+        path = _path(self.data_file)
+        self.values = np.memmap(path, dtype=np.float64, mode='r', shape=shape, order='F') if all(shape) else np.empty(shape)
+
+    def covers(self, start):
+        return start >= self.start
+
+    def read(self, tickers, start, end=None):
+        """Returns of ``tickers`` dated in [start, end) as ``(dates, rows x tickers array)``."""
+        first = self.dates.searchsorted(pd.Timestamp(start))
+        last = self.dates.searchsorted(pd.Timestamp(end)) if end is not None else len(self.dates)
+        columns = [self.columns[ticker] for ticker in tickers]
+        return self.dates[first:last], np.array(self.values[first:last, columns])
+
+
+def _path(name):
+    return os.path.join(RETURN_MATRIX_DIR, name)
+
+
+@contextlib.contextmanager
+def _exclusive(blocking=True):
+    """Cross-process writer lock; yields False when ``blocking`` is off and it is taken."""
+    os.makedirs(RETURN_MATRIX_DIR, exist_ok=True)
+    with open(_path('.lock'), 'w') as lock_file:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_index():
+    try:
+        with open(_path(POINTER_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_index(index):
+    tmp_path = _path(f'{POINTER_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _path(POINTER_FILE))
+
+
+def _log_returns(tickers, start):
+    """Per-ticker log returns dated on or after ``start`` as a DataFrame (NaN where a ticker did not trade)."""
+    closes = get_close_history(tickers, start - dt.timedelta(days=LOOKBACK_PADDING_DAYS))
+    columns = {}
+    for ticker in closes.columns:
+        series = closes[ticker].dropna()
+        returns = np.log(series / series.shift(1)).dropna()
+        returns = returns[returns.index >= pd.Timestamp(start)]
+        if not returns.empty:
+            columns[ticker] = returns
+    return pd.DataFrame(columns)
+
+
+def _write_columns(path, values, mode):
+    # Column-major layout is the transposed array written row by row
+    with open(path, mode) as f:
+        np.ascontiguousarray(values.T, dtype=np.float64).tofile(f)
+
+
+def _data_file_number(name):
+    return int(name[len('returns-'):-len('.bin')])
+
+
+def build(tickers=None):
+    """Rebuild the matrix from the price store; returns the new version number."""
+    previous = _read_index()
+    universe = set(stored_tickers()) | set(tickers or ())
+    if previous:
+        universe |= set(previous['tickers'])
+    today = dt.date.today()
+    start = today - dt.timedelta(days=RETURN_MATRIX_YEARS * 365)
+
+    # The long history load runs before taking the lock, so requests appending
+    # tickers in the meantime are not held up
+    started = time.perf_counter()
+    frame = _log_returns(sorted(universe), start)
+
+    with _exclusive():
+        previous = _read_index()
+        if previous:
+            appended = [ticker for ticker in previous['tickers'] if ticker not in universe]
+            if appended:
+                frame = pd.concat([frame, _log_returns(appended, start)], axis=1).sort_index()
+        version = previous['version'] + 1 if previous else 1
+        data_file = f'returns-{version}.bin'
+        _write_columns(_path(data_file), frame.to_numpy(), 'wb')
+        _write_index({
+            'version': version,
+            'data_file': data_file,
+            'start': start.isoformat(),
+            'built_on': today.isoformat(),
+            'dates': [date.strftime('%Y-%m-%d') for date in frame.index],
+            'tickers': list(frame.columns),
+        })
+
+        # The previous file stays for workers that read its index but have not mapped
+        # it yet; workers still mapping an older file keep it alive after the unlink
+        keep_from = _data_file_number(previous['data_file']) if previous else version
+        for name in os.listdir(RETURN_MATRIX_DIR):
+            if name.startswith('returns-') and name.endswith('.bin') and _data_file_number(name) < keep_from:
+                try:
+                    os.remove(_path(name))
+                except OSError as e:
+                    logging.debug(f"Could not remove old return matrix {name}: {e}")
+        logging.info(f"Built return matrix v{version}: {frame.shape[0]} days x {frame.shape[1]} tickers "
+                     f"in {time.perf_counter() - started:.1f}s")
+        return version
+
+
+def add_tickers(tickers, blocking=True):
+    """Append columns for ``tickers`` missing from the current matrix; returns the version.
+
+    Returns None when there is no matrix yet, or when ``blocking`` is off and
+    another process holds the lock (e.g. for the daily rebuild).
+    """
+    with _exclusive(blocking) as acquired:
+        if not acquired:
+            return None
+        index = _read_index()
+        if index is None:
+            return None
+        new = [ticker for ticker in dict.fromkeys(tickers) if ticker not in set(index['tickers'])]
+        if not new:
+            return index['version']
+        dates = pd.DatetimeIndex(index['dates'])
+        frame = _log_returns(new, dt.date.fromisoformat(index['start']))
+        if frame.empty:
+            return index['version']
+        # Days the matrix does not have are dropped until the next daily rebuild
+        frame = frame.reindex(dates)
+        _write_columns(_path(index['data_file']), frame.to_numpy(), 'ab')
+        index['tickers'] = index['tickers'] + list(frame.columns)
+        index['version'] += 1
+        _write_index(index)
+        logging.debug(f"Appended {len(frame.columns)} tickers to return matrix v{index['version']}")
+        return index['version']
+
+
+def _rebuild_in_background():
+    global _building
+    with _lock:
+        if _building:
+            return
+        _building = True
+
+    def run():
+        global _building
+        try:
+            with _exclusive(blocking=False) as acquired:
+                stale = acquired and ((_read_index() or {}).get('built_on') != dt.date.today().isoformat())
+            # Another process holds the lock or already rebuilt today
+            if stale:
+                build()
+        except Exception as e:
+            logging.error(f"Error building return matrix: {e}")
+        finally:
+            with _lock:
+                _building = False
+
+    threading.Thread(target=run, name='return-matrix-build', daemon=True).start()
+
+
+def get_matrix():
+    """The latest mapped matrix, or None while the first build is still running.
+
+    A matrix built before today is served while a background thread in one of the
+    workers rebuilds it.
+    """
+    global _current, _checked_at
+    now = time.monotonic()
+    with _lock:
+        current = _current
+        if current is not None and now - _checked_at < RETURN_MATRIX_CHECK_SECONDS:
+            return current
+        _checked_at = now
+
+    index = _read_index()
+    if index is not None and (current is None or index['version'] != current.version):
+        try:
+            mapped = ReturnMatrix(index)
+        except FileNotFoundError:
+            # Two rebuilds ran between reading the index and mapping its file
+            index = _read_index()
+            try:
+                mapped = ReturnMatrix(index)
+            except FileNotFoundError:
+                logging.warning(f"Return matrix v{index['version']} disappeared before it was mapped")
+                mapped = current
+        current = mapped
+        with _lock:
+            _current = current
+    if current is None or current.built_on < dt.date.today():
+        _rebuild_in_background()
+    return current
+
+
+def ensure_tickers(tickers):
+    """The current matrix with every ticker of ``tickers`` that has history added to it.
+
+    Returns None when the tickers cannot be added right away because another
+    process holds the matrix lock; the caller then reads the price store itself.
+    """
+    matrix = get_matrix()
+    if matrix is None or all(ticker in matrix.columns for ticker in tickers):
+        return matrix
+    version = add_tickers(tickers, blocking=False)
+    if version is None:
+        logging.debug("Return matrix is locked, reading new tickers from the price store")
+        return None
+    with _lock:
+        global _checked_at
+        _checked_at = 0.0
+    matrix = get_matrix()
+    if matrix is not None and version is not None and matrix.version < version:
+        logging.warning(f"Return matrix v{version} was written but v{matrix.version} is mapped")
+    return matrix
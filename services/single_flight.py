@@ -0,0 +1,188 @@
+# services/single_flight.py
+import os
+import time
+import pickle
+import hashlib
+import threading
+import logging
+import contextlib
+from services import instrumentation
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers run a single process
+    fcntl = None
+
+# Coalesces concurrent market-data downloads. A download is identified by
+# (kind, ticker, params) - e.g. ('history', 'AAPL', start, end, interval). Within
+# a process, a request for a ticker that is already being downloaded waits for
+# that download instead of starting its own. Across gunicorn workers, the
+# downloader holds a file lock per (kind, ticker) and leaves its result on disk,
+# so a worker that was blocked on the lock reads the result instead of asking
+# Yahoo again. Per-kind counters record how many ticker downloads ran and how
+# many were served by someone else's.
+SINGLE_FLIGHT_DIR = os.getenv('SINGLE_FLIGHT_DIR', os.path.join('data', 'single_flight'))
+
+# Results stay on disk this long for workers that were waiting on the lock
+SINGLE_FLIGHT_RESULT_SECONDS = 300
+
+_flights = {}
+_stats = {}
+_lock = threading.Lock()
+_purged_at = 0.0
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.found = False
+        self.value = None
+        self.error = None
+
+
+def _path(name, suffix):
+    digest = hashlib.sha1(repr(name).encode()).hexdigest()
+    return os.path.join(SINGLE_FLIGHT_DIR, digest + suffix)
+
+
+def _count(kind, field, amount):
+    if amount:
+        with _lock:
+            counts = _stats.setdefault(kind, {'downloads': 0, 'deduplicated': 0})
+            counts[field] += amount
+        instrumentation.increment('single_flight_tickers_total', amount, kind=kind, outcome=field)
+
+
+
+@contextlib.contextmanager
+def _file_locks(names):
+    """Hold the cross-process lock of every name, taken in sorted order so batches cannot deadlock."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(SINGLE_FLIGHT_DIR, exist_ok=True)
+    files = []
+    try:
+        for name in sorted(names):
+            lock_file = open(_path(name, '.lock'), 'w')
+            files.append(lock_file)
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+    finally:
+        for lock_file in reversed(files):
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+def _read_result(key, since):
+    """Another worker's result for ``key`` written after ``since``, as ``(found, value)``."""
+    path = _path(key, '.pkl')
+    try:
+        if os.path.getmtime(path) < since:
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _write_result(key, entry):
+    path = _path(key, '.pkl')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(entry, f)
+    os.replace(tmp_path, path)
+
+
+def _purge_results():
+    global _purged_at
+    now = time.time()
+    with _lock:
+        if fcntl is None or now - _purged_at < SINGLE_FLIGHT_RESULT_SECONDS:
+            return
+        _purged_at = now
+    for name in os.listdir(SINGLE_FLIGHT_DIR):
+        path = os.path.join(SINGLE_FLIGHT_DIR, name)
+        try:
+            if name.endswith('.pkl') and os.path.getmtime(path) < now - SINGLE_FLIGHT_RESULT_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def _lead(kind, flights, keys, download, params):
+    started = time.time()
+    try:
+        with _file_locks([(kind, ticker) for ticker in flights]):
+            entries = {}
+            if fcntl is not None:
+                # Downloaded by another worker while this one waited for the lock
+                for ticker in flights:
+                    entry = _read_result(keys[ticker], started)
+                    if entry is not None:
+                        entries[ticker] = entry
+                _count(kind, 'deduplicated', len(entries))
+            pending = [ticker for ticker in flights if ticker not in entries]
+            if pending:
+                _count(kind, 'downloads', len(pending))
+                with instrumentation.upstream('yahoo', kind):
+                    values = download(pending, **params)
+                for ticker in pending:
+                    entries[ticker] = (ticker in values, values.get(ticker))
+                    if fcntl is not None:
+                        _write_result(keys[ticker], entries[ticker])
+        for ticker, flight in flights.items():
+            flight.found, flight.value = entries[ticker]
+    except Exception as e:
+        for flight in flights.values():
+            flight.error = e
+    finally:
+        for flight in flights.values():
+            flight.done.set()
+    _purge_results()
+
+
+def fetch(kind, tickers, download, **params):
+    """Download ``tickers`` with ``download(tickers, **params) -> {ticker: value}``, sharing in-flight downloads.
+
+    Only the tickers nobody else is downloading are passed to ``download``, in one
+    call. Returns ``{ticker: value}`` for the tickers that had data; a failed
+    download raises in every request that was waiting for it.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    keys = {ticker: (kind, ticker, tuple(sorted(params.items()))) for ticker in tickers}
+    leading = {}
+    following = {}
+    with _lock:
+        for ticker, key in keys.items():
+            flight = _flights.get(key)
+            if flight is None:
+                leading[ticker] = _flights[key] = _Flight()
+            else:
+                following[ticker] = flight
+    _count(kind, 'deduplicated', len(following))
+    if following:
+        logging.debug(f"Waiting for {len(following)} {kind} downloads already in flight")
+
+    if leading:
+        try:
+            _lead(kind, leading, keys, download, params)
+        finally:
+            with _lock:
+                for ticker in leading:
+                    _flights.pop(keys[ticker], None)
+
+    result = {}
+    for ticker, flight in {**leading, **following}.items():
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        if flight.found:
+            result[ticker] = flight.value
+    return {ticker: result[ticker] for ticker in tickers if ticker in result}
+
+
+def stats():
+    """``{kind: {'downloads': n, 'deduplicated': n}}`` counted in ticker downloads for this process."""
+    with _lock:
+        return {kind: dict(counts) for kind, counts in _stats.items()}
@@ -0,0 +1,82 @@
+# services/startup.py
+import sys
+import time
+import logging
+import importlib
+
+# Modules that are deliberately imported on first use rather than at app import.
+# Order matters for the report: a module's cost includes whatever it pulls in
+# that was not loaded yet.
+HEAVY_MODULES = (
+    'numpy',
+    'pandas',
+    'scipy.optimize',
+    'scipy.stats',
+    'yfinance',
+    'fredapi',
+    'arch',
+    'firebase_admin.firestore',
+    'services.price_store',
+    'analytics.optimizer',
+    'analytics.simulation',
+    'analytics.var',
+    'analytics.cvar',
+    'analytics.summary',
+    'analytics.covariance',
+    'services.return_matrix',
+    'services.covariance',
+)
+
+
+def import_report(modules=HEAVY_MODULES):
+    """Import ``modules`` in order and time each one."""
+    report = []
+    for name in modules:
+        already_loaded = name in sys.modules
+        start = time.perf_counter()
+        error = None
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            error = str(e)
+        report.append({
+            'module': name,
+            'seconds': time.perf_counter() - start,
+            'already_loaded': already_loaded,
+            'error': error,
+        })
+    return report
+
+
+def format_report(report):
+    lines = [f"{'module':<28} {'import ms':>10}"]
+    for entry in report:
+        note = ' (already loaded)' if entry['already_loaded'] else ''
+        if entry['error']:
+            note = f" (failed: {entry['error']})"
+        lines.append(f"{entry['module']:<28} {entry['seconds'] * 1000:>10.1f}{note}")
+    lines.append(f"{'total':<28} {sum(entry['seconds'] for entry in report) * 1000:>10.1f}")
+    return '\n'.join(lines)
+
+
+def warm_up(init_clients=False):
+    """Import the analytic stack and, optionally, create the clients and load the risk-free rate.
+
+    Call it in the gunicorn master (``--preload``) so forked workers share the
+    loaded modules, or at worker start to move the cost off the first request.
+    Leave ``init_clients`` off before forking: the Firestore gRPC channel must be
+    created in the process that uses it.
+    """
+    report = import_report()
+    logging.info(f"Warm-up imports:\n{format_report(report)}")
+
+    if init_clients:
+        from fred_config import get_fred
+        from firebase_config import get_db
+        from services.rates import get_risk_free_rate
+        for name, factory in (('FRED', get_fred), ('Firestore', get_db), ('risk-free rate', get_risk_free_rate)):
+            try:
+                factory()
+            except Exception as e:
+                logging.warning(f"Could not initialize {name} during warm-up: {e}")
+    return report
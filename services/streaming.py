@@ -0,0 +1,138 @@
+# services/streaming.py
+import os
+import json
+import queue
+import itertools
+import threading
+import logging
+import datetime as dt
+from services.portfolio_repository import get_portfolio
+from services.quotes import fetch_last_prices
+from services.positions import position_list
+
+# Live portfolio valuations for the SSE stream. One poller thread per process
+# reads the holdings of every connected user, fetches the union of their tickers
+# in a single quote call and pushes each user's valuation to that user's
+# subscribers when it changed. The poller starts with the first subscriber and
+# exits when the last one disconnects.
+STREAM_POLL_SECONDS = float(os.getenv('STREAM_POLL_SECONDS', 15))
+
+# Each open stream holds a gunicorn worker thread, so a process accepts at most
+# this many at once and leaves the rest of its threads to the other routes
+STREAM_MAX_SUBSCRIBERS = int(os.getenv('STREAM_MAX_SUBSCRIBERS', 8))
+
+# Events waiting for a slow client; older ones are dropped since only the latest matters
+SUBSCRIBER_QUEUE_SIZE = 4
+
+_subscribers = {}
+_last_payloads = {}
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_wake = threading.Event()
+_poller = None
+
+
+class TooManySubscribers(Exception):
+    """This process already serves STREAM_MAX_SUBSCRIBERS streams."""
+
+
+def subscribe(user_id):
+    """Register a subscriber for ``user_id``; returns ``(subscriber_id, queue)``.
+
+    Raises TooManySubscribers when the process is at STREAM_MAX_SUBSCRIBERS.
+    """
+    global _poller
+    subscriber_id = next(_ids)
+    events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        if len(_subscribers) >= STREAM_MAX_SUBSCRIBERS:
+            raise TooManySubscribers()
+        _subscribers[subscriber_id] = (user_id, events)
+        # A new subscriber gets the current valuation right away
+        _last_payloads.pop(user_id, None)
+        if _poller is None or not _poller.is_alive():
+            _poller = threading.Thread(target=_poll_loop, name='portfolio-stream-poller', daemon=True)
+            _poller.start()
+    _wake.set()
+    return subscriber_id, events
+
+
+def unsubscribe(subscriber_id):
+    with _lock:
+        user_id, _ = _subscribers.pop(subscriber_id, (None, None))
+        if user_id is not None and all(user != user_id for user, _ in _subscribers.values()):
+            _last_payloads.pop(user_id, None)
+
+
+def _publish(events, event):
+    while True:
+        try:
+            events.put_nowait(event)
+            return
+        except queue.Full:
+            try:
+                events.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def valuation(tickers, prices):
+    """Valuation payload for a holdings list given ``{ticker: price}``."""
+    total_portfolio_value = 0.0
+    unpriced = []
+    for ticker in tickers:
+        price = prices.get(ticker['ticker'])
+        if price is None:
+            unpriced.append(ticker['ticker'])
+        else:
+            total_portfolio_value += ticker['value'] * price
+    return {
+        'tickers': tickers,
+        'prices': {ticker['ticker']: prices[ticker['ticker']] for ticker in tickers if ticker['ticker'] in prices},
+        'total_portfolio_value': total_portfolio_value,
+        'unpriced': unpriced,
+    }
+
+
+def poll_once():
+    """Value every subscribed portfolio with one quote call and notify on changes."""
+    with _lock:
+        user_ids = {user_id for user_id, _ in _subscribers.values()}
+
+    holdings = {}
+    for user_id in user_ids:
+        try:
+            holdings[user_id] = position_list(get_portfolio(user_id))
+        except Exception as e:
+            logging.error(f"Error reading portfolio for stream of user_id {user_id}: {e}")
+
+    symbols = sorted({ticker['ticker'] for tickers in holdings.values() for ticker in tickers})
+    prices = fetch_last_prices(symbols, max_age=STREAM_POLL_SECONDS) if symbols else {}
+    as_of = dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds')
+
+    with _lock:
+        for user_id, tickers in holdings.items():
+            payload = json.dumps(valuation(tickers, prices), sort_keys=True)
+            if _last_payloads.get(user_id) == payload:
+                continue
+            _last_payloads[user_id] = payload
+            event = {**json.loads(payload), 'as_of': as_of}
+            for user, events in _subscribers.values():
+                if user == user_id:
+                    _publish(events, event)
+    logging.debug(f"Stream poll valued {len(holdings)} portfolios over {len(symbols)} symbols")
+
+
+def _poll_loop():
+    global _poller
+    while True:
+        with _lock:
+            if not _subscribers:
+                _poller = None
+                return
+        _wake.clear()
+        try:
+            poll_once()
+        except Exception as e:
+            logging.error(f"Error polling prices for portfolio stream: {e}")
+        _wake.wait(STREAM_POLL_SECONDS)
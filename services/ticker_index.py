@@ -0,0 +1,154 @@
+# services/ticker_index.py
+import os
+import csv
+import time
+import bisect
+import threading
+import logging
+
+# Symbol and company-name prefix lookup for ticker autocomplete. The symbol list
+# is a local CSV (symbol,name) loaded into two sorted key arrays; a query is one
+# bisect into each plus a scan over at most ``limit`` matches, so a keystroke
+# costs microseconds however large the list is. The file is re-read when its
+# modification time changes, so replacing it (e.g. with `flask update-ticker-list`)
+# takes effect without a restart. Without a list the price store's tickers are
+# offered instead, reloaded whenever the store holds a different number of them.
+TICKER_LIST_PATH = os.getenv('TICKER_LIST_PATH', os.path.join('data', 'tickers.csv'))
+TICKER_LIST_URL = os.getenv('TICKER_LIST_URL', 'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqtraded.txt')
+
+# How often a lookup checks the list file (or the price store) for changes
+TICKER_LIST_CHECK_SECONDS = 5
+
+MAX_SUGGESTIONS = 50
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+class TickerIndex:
+    def __init__(self, rows, source_version=None):
+        names = {}
+        for symbol, name in rows:
+            symbol = symbol.strip().upper()
+            if symbol:
+                names.setdefault(symbol, ' '.join(name.split()))
+        self.symbols = sorted(names)
+        self.names = [names[symbol] for symbol in self.symbols]
+        # (normalized name, position in ``symbols``) sorted by name
+        by_name = sorted((_normalize(name), i) for i, name in enumerate(self.names) if name)
+        self.name_keys = [key for key, _ in by_name]
+        self.name_positions = [position for _, position in by_name]
+        # ('file', mtime) or ('store', ticker count) of what the index was built from
+        self.source_version = source_version
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def suggest(self, query, limit=10):
+        """Symbols starting with ``query`` first, then companies whose name does."""
+        query = _normalize(query)
+        if not query:
+            return []
+        positions = []
+        start = bisect.bisect_left(self.symbols, query.upper())
+        for position in range(start, min(start + limit, len(self.symbols))):
+            if not self.symbols[position].startswith(query.upper()):
+                break
+            positions.append(position)
+
+        start = bisect.bisect_left(self.name_keys, query)
+        for i in range(start, len(self.name_keys)):
+            if len(positions) >= limit or not self.name_keys[i].startswith(query):
+                break
+            if self.name_positions[i] not in positions:
+                positions.append(self.name_positions[i])
+        return [{'symbol': self.symbols[position], 'name': self.names[position]} for position in positions]
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def _read_list(path):
+    with open(path, newline='') as f:
+        return [(row.get('symbol', ''), row.get('name') or '') for row in csv.DictReader(f)]
+
+
+def _source_version():
+    try:
+        return 'file', os.path.getmtime(TICKER_LIST_PATH)
+    except FileNotFoundError:
+        from services.price_store import stored_ticker_count
+        return 'store', stored_ticker_count()
+
+
+def load():
+    """Build the index from the list file, or from the price store when there is none."""
+    version = _source_version()
+    if version[0] == 'file':
+        try:
+            rows = _read_list(TICKER_LIST_PATH)
+        except FileNotFoundError:
+            # Removed since the version was taken; the next check rebuilds from the store
+            rows = []
+    else:
+        from services.price_store import stored_tickers
+        logging.warning(f"No ticker list at {TICKER_LIST_PATH}, suggesting stored tickers only")
+        rows = [(ticker, '') for ticker in stored_tickers()]
+    index = TickerIndex(rows, version)
+    logging.info(f"Loaded ticker index with {len(index)} symbols")
+    return index
+
+
+def get_index():
+    """The current index, reloaded when the list file or the stored tickers have changed."""
+    global _index, _checked_at
+    now = time.monotonic()
+    with _lock:
+        index = _index
+        if index is not None and now - _checked_at < TICKER_LIST_CHECK_SECONDS:
+            return index
+        _checked_at = now
+    if index is None or _source_version() != index.source_version:
+        index = load()
+        with _lock:
+            _index = index
+    return index
+
+
+def suggest(query, limit=10):
+    return get_index().suggest(query, max(1, min(limit, MAX_SUGGESTIONS)))
+
+
+def update_ticker_list(url=TICKER_LIST_URL, path=TICKER_LIST_PATH):
+    """Download the Nasdaq Trader list of traded symbols and write it as the ticker list.
+
+    Test issues are skipped. Returns the number of symbols written.
+    """
+    import requests
+
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    lines = response.text.splitlines()
+    reader = csv.DictReader(lines, delimiter='|')
+    rows = []
+    for row in reader:
+        # The file ends with a "File Creation Time" line
+        if not row.get('Symbol') or row['Symbol'].startswith('File Creation Time'):
+            continue
+        if row.get('Test Issue') == 'Y':
+            continue
+        # Yahoo writes share classes with a dash (BRK-B), Nasdaq with a dot
+        rows.append((row['Symbol'].replace('.', '-'), row.get('Security Name', '')))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['symbol', 'name'])
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    return len(rows)
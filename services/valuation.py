@@ -0,0 +1,80 @@
+# services/valuation.py
+import os
+import logging
+import datetime as dt
+from services.portfolio_repository import get_portfolios, list_user_ids
+from services.quotes import fetch_last_prices
+from services.positions import position_list
+
+# Users are loaded and valued in batches so results can be streamed while the
+# rest of the run is still reading Firestore. Tickers are priced once per run no
+# matter how many portfolios hold them.
+BULK_VALUATION_BATCH_SIZE = int(os.getenv('BULK_VALUATION_BATCH_SIZE', 500))
+
+
+def value_positions(portfolios, prices):
+    """Value every position of ``{user_id: tickers list}`` in one vectorized pass.
+
+    Returns ``{user_id: (total value, [(ticker, value, percentage)], unpriced)}``;
+    positions without a price count as zero and are listed as unpriced.
+    """
+    import numpy as np
+
+    user_ids = list(portfolios)
+    positions = [(user_index, ticker['ticker'], ticker['value'])
+                 for user_index, user_id in enumerate(user_ids) for ticker in portfolios[user_id]]
+    if not positions:
+        return {user_id: (0.0, [], []) for user_id in user_ids}
+
+    user_index, symbols, shares = zip(*positions)
+    user_index = np.array(user_index)
+    position_prices = np.array([prices.get(symbol, np.nan) for symbol in symbols], dtype=float)
+    values = np.nan_to_num(np.asarray(shares, dtype=float) * position_prices)
+    totals = np.bincount(user_index, weights=values, minlength=len(user_ids))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentages = np.where(totals[user_index] > 0, values / totals[user_index] * 100, 0.0)
+
+    results = {user_id: (float(totals[index]), [], []) for index, user_id in enumerate(user_ids)}
+    for index, symbol, price, value, percentage in zip(user_index, symbols, position_prices, values, percentages):
+        _, rows, unpriced = results[user_ids[index]]
+        if np.isnan(price):
+            unpriced.append(symbol)
+        rows.append((symbol, float(value), float(percentage)))
+    return results
+
+
+def value_portfolios(user_ids=None, batch_size=BULK_VALUATION_BATCH_SIZE):
+    """Yield one valuation record per user (every user when ``user_ids`` is None)."""
+    if user_ids is None:
+        user_ids = list_user_ids()
+    user_ids = list(dict.fromkeys(user_ids))
+    as_of = dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds')
+    prices = {}
+    priced = set()
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = get_portfolios(user_ids[start:start + batch_size])
+        holdings = {user_id: position_list(data) for user_id, data in batch.items() if data is not None}
+
+        # Only symbols not seen earlier in this run go to the quote provider
+        symbols = {ticker['ticker'] for tickers in holdings.values() for ticker in tickers} - priced
+        if symbols:
+            prices.update(fetch_last_prices(sorted(symbols)))
+            priced.update(symbols)
+
+        valued = value_positions(holdings, prices)
+        for user_id in batch:
+            if user_id not in valued:
+                yield {'user_id': user_id, 'error': 'Portfolio not found'}
+                continue
+            total_portfolio_value, rows, unpriced = valued[user_id]
+            yield {
+                'user_id': user_id,
+                'as_of': as_of,
+                'total_portfolio_value': total_portfolio_value,
+                'ticker_values': [{'ticker': ticker, 'value': value} for ticker, value, _ in rows],
+                'ticker_percentages': [{'ticker': ticker, 'percentage': percentage} for ticker, _, percentage in rows],
+                'unpriced': unpriced,
+            }
+        logging.debug(f"Valued {min(start + batch_size, len(user_ids))} of {len(user_ids)} portfolios "
+                      f"({len(priced)} distinct tickers)")
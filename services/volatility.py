@@ -0,0 +1,161 @@
+# services/volatility.py
+import os
+import math
+import sqlite3
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# GARCH(1,1) fits per ticker, keyed by the return window they were fitted on
+# (ticker, first and last return date), so a repeat request over the same window
+# reuses the parameters. Fits live in memory and in a small SQLite table shared
+# by every worker and job process. Large batches of missing fits run in a process
+# pool that is created once and kept for later requests.
+GARCH_CACHE_PATH = os.getenv('GARCH_CACHE_PATH', os.path.join('data', 'garch.sqlite'))
+GARCH_WORKERS = int(os.getenv('GARCH_WORKERS', os.cpu_count() or 1))
+
+# A fit takes tens of milliseconds while a fresh worker spends seconds importing
+# arch, so only large batches of missing fits go to the pool
+GARCH_PARALLEL_MIN_FITS = int(os.getenv('GARCH_PARALLEL_MIN_FITS', 64))
+
+VOL_MODELS = ('historical', 'garch')
+
+FIT_FIELDS = ('mu', 'omega', 'alpha', 'beta', 'next_variance')
+
+_fits = {}
+_lock = threading.Lock()
+_pool = None
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    directory = os.path.dirname(GARCH_CACHE_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(GARCH_CACHE_PATH, timeout=30)
+    if not _schema_ready:
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS garch_fits ('
+            'ticker TEXT NOT NULL, start_date TEXT NOT NULL, end_date TEXT NOT NULL, '
+            'mu REAL, omega REAL, alpha REAL, beta REAL, next_variance REAL, '
+            'PRIMARY KEY (ticker, start_date, end_date))'
+        )
+        _schema_ready = True
+    return conn
+
+
+def _load(keys):
+    found = {}
+    conn = _connect()
+    try:
+        for key in keys:
+            row = conn.execute(
+                f"SELECT {', '.join(FIT_FIELDS)} FROM garch_fits WHERE ticker = ? AND start_date = ? AND end_date = ?",
+                key,
+            ).fetchone()
+            if row is not None:
+                found[key] = dict(zip(FIT_FIELDS, row))
+    finally:
+        conn.close()
+    return found
+
+
+def _save(fits):
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO garch_fits VALUES (?, ?, ?, {', '.join('?' * len(FIT_FIELDS))})",
+                [(*key, *(fit[field] for field in FIT_FIELDS)) for key, fit in fits.items()],
+            )
+    finally:
+        conn.close()
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=GARCH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _sample_fit(returns):
+    # Constant-variance stand-in for a ticker whose GARCH fit failed; the same
+    # window would fail again, so it is cached like a real fit
+    variance = float(returns.var(ddof=1))
+    return {'mu': float(returns.mean()), 'omega': variance, 'alpha': 0.0, 'beta': 0.0, 'next_variance': variance}
+
+
+def _fit_all(series):
+    """Fit every series, using the sample variance where GARCH fails."""
+    from analytics.garch import fit_garch
+
+    keys = list(series)
+    # Job workers are daemonic and may not start processes of their own
+    parallel = (len(keys) >= GARCH_PARALLEL_MIN_FITS and GARCH_WORKERS > 1
+                and not multiprocessing.current_process().daemon)
+    if parallel:
+        futures = {key: _get_pool().submit(fit_garch, series[key]) for key in keys}
+        outcomes = ((key, futures[key].result) for key in keys)
+    else:
+        outcomes = ((key, lambda key=key: fit_garch(series[key])) for key in keys)
+
+    fits = {}
+    for key, result in outcomes:
+        try:
+            fit = result()
+        except Exception as e:
+            logging.warning(f"GARCH fit for {key[0]} failed, using its sample variance: {e}")
+            fit = _sample_fit(series[key])
+        if not all(math.isfinite(value) for value in fit.values()) or fit['next_variance'] <= 0:
+            logging.warning(f"GARCH fit for {key[0]} is degenerate, using its sample variance: {fit}")
+            fit = _sample_fit(series[key])
+        fits[key] = fit
+    return fits
+
+
+def garch_fits(returns):
+    """GARCH(1,1) fits for each column of the daily ``returns`` DataFrame, in column order.
+
+    Missing days are skipped, so each ticker is fitted on its own trading days.
+    """
+    series = {}
+    for ticker in returns.columns:
+        column = returns[ticker].dropna()
+        series[(ticker, column.index[0].strftime('%Y-%m-%d'), column.index[-1].strftime('%Y-%m-%d'))] = column.to_numpy()
+    keys = list(series)
+
+    with _lock:
+        fits = {key: _fits[key] for key in keys if key in _fits}
+    missing = [key for key in keys if key not in fits]
+    if missing:
+        fits.update(_load(missing))
+        missing = [key for key in keys if key not in fits]
+
+    if missing:
+        logging.debug(f"Fitting GARCH(1,1) for {len(missing)} of {len(keys)} tickers")
+        fitted = _fit_all({key: series[key] for key in missing})
+        _save(fitted)
+        fits.update(fitted)
+
+    with _lock:
+        _fits.update(fits)
+    return [fits[key] for key in keys]
+
+
+def forecast_covariance(returns, horizon=1, correlation=None):
+    """GARCH volatility forecasts over ``horizon`` days combined with ``correlation``.
+
+    ``correlation`` defaults to the sample correlation of ``returns``.
+    """
+    from analytics.garch import garch_covariance
+
+    if correlation is None:
+        import numpy as np
+        # A constant return series has no correlation with anything
+        correlation = returns.corr().fillna(0).to_numpy(copy=True)
+        np.fill_diagonal(correlation, 1)
+    return garch_covariance(correlation, garch_fits(returns), horizon)
@@ -0,0 +1,55 @@
+# tests/test_covariance.py
+import numpy as np
+
+from analytics.covariance import cross_statistics, estimate_moments
+from analytics.optimizer import portfolio_volatility
+
+
+def _returns_with_short_history():
+    # Two long histories and one that starts after a change of regime
+    rng = np.random.default_rng(0)
+    returns = np.full((2000, 3), np.nan)
+    factor = rng.normal(0, 0.01, 2000)
+    returns[:, 0] = factor + rng.normal(0, 0.002, 2000)
+    returns[:1750, 1] = -factor[:1750] + rng.normal(0, 0.002, 1750)
+    returns[1750:, 1] = factor[1750:] + rng.normal(0, 0.002, 250)
+    returns[1750:, 2] = -factor[1750:] + rng.normal(0, 0.002, 250)
+    return returns
+
+
+def test_pairwise_covariance_is_positive_semi_definite():
+    returns = _returns_with_short_history()
+    stats = cross_statistics(returns, returns)
+    for estimator in ('sample', 'ledoit-wolf'):
+        _, covariance = estimate_moments(stats, estimator)
+        assert np.linalg.eigvalsh(covariance)[0] > -1e-12
+        assert not np.isnan(portfolio_volatility(np.array([0, 0.5, 0.5]), covariance))
+
+
+def test_full_window_estimates_new_tickers_directly(monkeypatch):
+    import datetime as dt
+    import pandas as pd
+    from services import covariance
+
+    index = pd.bdate_range(end=pd.Timestamp(dt.date.today()), periods=400)
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.01, (400, 4)), axis=0)),
+                          index=index, columns=['AAA', 'BBB', 'CCC', 'DDD'])
+
+    def get_close_history(tickers, start_date, end_date=None):
+        return closes[[ticker for ticker in tickers if ticker in closes.columns]]
+
+    monkeypatch.setattr(covariance, 'get_close_history', get_close_history)
+    monkeypatch.setattr(covariance.return_matrix, 'get_matrix', lambda: None)
+    monkeypatch.setattr(covariance, 'COVARIANCE_MAX_TICKERS', 2)
+    covariance.clear()
+
+    covariance.get_moments(['AAA', 'BBB'], years=1)
+    tickers, _, cov_matrix = covariance.get_moments(['AAA', 'CCC', 'DDD'], years=1)
+    assert tickers == ['AAA', 'CCC', 'DDD']
+    assert [window.tickers for window in covariance._windows.values()] == [['AAA', 'BBB']]
+
+    monkeypatch.setattr(covariance, 'COVARIANCE_MAX_TICKERS', 10)
+    covariance.clear()
+    _, _, expected = covariance.get_moments(['AAA', 'CCC', 'DDD'], years=1)
+    np.testing.assert_allclose(cov_matrix, expected)
+    covariance.clear()
@@ -0,0 +1,47 @@
+# tests/test_instrumentation.py
+import os
+import json
+import threading
+
+from services import instrumentation
+from services.instrumentation import process_exists
+
+
+def _dead_pid():
+    pid = 2 ** 22 - 1
+    while process_exists(pid):
+        pid -= 1
+    return pid
+
+
+def _write_snapshot(directory, name, value):
+    snapshot = {'counters': [['single_flight_tickers_total', {'result': 'run'}, value]], 'histograms': []}
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump(snapshot, f)
+
+
+def test_snapshots_of_exited_processes_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(instrumentation, '_counters', {})
+    monkeypatch.setattr(instrumentation, '_histograms', {})
+    _write_snapshot(tmp_path, f'{os.getppid()}-live.json', 3)
+    _write_snapshot(tmp_path, f'{_dead_pid()}-gone.json', 5)
+    # An earlier process with this process's pid
+    _write_snapshot(tmp_path, f'{os.getpid()}-reused.json', 7)
+
+    assert 'single_flight_tickers_total{result="run"} 3\n' in instrumentation.render()
+    assert os.listdir(tmp_path) == [f'{os.getppid()}-live.json']
+
+
+def test_concurrent_flushes_leave_one_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(instrumentation, 'METRICS_FLUSH_SECONDS', 0)
+    monkeypatch.setattr(instrumentation, '_counters', {})
+    threads = [threading.Thread(target=lambda: [instrumentation.increment('single_flight_tickers_total', result='run')
+                                                for _ in range(200)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    instrumentation.flush()
+    assert os.listdir(tmp_path) == [f'{os.getpid()}-{instrumentation._process_token}.json']
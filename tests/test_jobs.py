@@ -0,0 +1,59 @@
+# tests/test_jobs.py
+import time
+
+import pytest
+
+from services import jobs
+from services.instrumentation import process_exists
+
+
+@pytest.fixture
+def job_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_STORE_PATH', str(tmp_path / 'jobs.sqlite'))
+
+
+def _insert(job_id, status, updated_at, pid):
+    conn = jobs._connect()
+    conn.execute(
+        'INSERT INTO jobs (id, kind, status, progress, created_at, updated_at, pid) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (job_id, 'monte-carlo-var', status, 0.0, updated_at, updated_at, pid)
+    )
+    conn.commit()
+    conn.close()
+
+
+def _dead_pid():
+    pid = 2 ** 22 - 1
+    while process_exists(pid):
+        pid -= 1
+    return pid
+
+
+def test_job_of_a_stopped_process_fails(job_store):
+    _insert('lost', 'running', time.time(), _dead_pid())
+    job = jobs.get_job('lost')
+    assert job['status'] == 'failed'
+    assert 'worker process stopped' in job['error']
+
+
+def test_job_without_progress_times_out(job_store, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_TIMEOUT_SECONDS', 60)
+    _insert('stuck', 'queued', time.time() - 120, None)
+    _insert('fresh', 'running', time.time(), None)
+    assert jobs.get_job('stuck')['status'] == 'failed'
+    assert jobs.get_job('fresh')['status'] == 'running'
+
+
+def test_abandoned_job_stays_failed_when_its_task_finishes(job_store, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_TIMEOUT_SECONDS', 60)
+    _insert('late', 'running', time.time() - 120, None)
+    assert jobs.get_job('late')['status'] == 'failed'
+    assert not jobs._update('late', 'running', status='succeeded', progress=1.0, result='{}')
+    job = jobs.get_job('late')
+    assert job['status'] == 'failed' and 'result' not in job
+
+
+def test_failed_queued_job_is_not_started(job_store):
+    _insert('lost', 'failed', time.time(), None)
+    jobs._run_job('lost', 'monte-carlo-var', {})
+    assert jobs.get_job('lost')['status'] == 'failed'
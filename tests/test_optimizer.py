@@ -0,0 +1,21 @@
+# tests/test_optimizer.py
+import numpy as np
+
+from analytics.optimizer import efficient_frontier, expand_bounds, optimize_weights
+
+MEAN_RETURNS = np.array([0.08, 0.12])
+COV_MATRIX = np.array([[0.04, 0.01], [0.01, 0.09]])
+
+
+def test_expand_bounds_tells_one_pair_from_per_asset_pairs():
+    assert expand_bounds((0, 1), 3) == [(0, 1)] * 3
+    assert expand_bounds([0, 0.5], 2) == [(0, 0.5)] * 2
+    assert expand_bounds(((0, 1), (0, 0.3)), 2) == [(0, 1), (0, 0.3)]
+
+
+def test_per_asset_bounds_given_as_a_tuple_are_respected():
+    bounds = ((0, 1), (0, 0.3))
+    weights = optimize_weights(MEAN_RETURNS, COV_MATRIX, 'sharpe', 0.02, bounds=bounds).x
+    assert weights[1] <= 0.3 + 1e-9
+    for weights in efficient_frontier(MEAN_RETURNS, COV_MATRIX, 4, bounds):
+        assert weights[1] <= 0.3 + 1e-6
@@ -0,0 +1,54 @@
+# tests/test_return_matrix.py
+import os
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import return_matrix
+
+
+@pytest.fixture
+def matrix_dir(tmp_path, monkeypatch):
+    end = pd.Timestamp(dt.date.today())
+    index = pd.bdate_range(end=end, periods=300)
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, (300, 3)), axis=0)),
+                          index=index, columns=['AAA', 'BBB', 'CCC'])
+
+    def get_close_history(tickers, start_date, end_date=None):
+        return closes[[ticker for ticker in tickers if ticker in closes.columns]]
+
+    monkeypatch.setattr(return_matrix, 'RETURN_MATRIX_DIR', str(tmp_path))
+    monkeypatch.setattr(return_matrix, 'get_close_history', get_close_history)
+    monkeypatch.setattr(return_matrix, 'stored_tickers', lambda: ['AAA'])
+    monkeypatch.setattr(return_matrix, '_current', None)
+    monkeypatch.setattr(return_matrix, '_checked_at', 0.0)
+    return tmp_path
+
+
+def test_rebuild_keeps_the_previous_file(matrix_dir):
+    for _ in range(3):
+        return_matrix.build()
+    assert sorted(name for name in os.listdir(matrix_dir) if name.endswith('.bin')) == ['returns-2.bin', 'returns-3.bin']
+
+
+def test_new_tickers_fall_back_while_the_matrix_is_locked(matrix_dir, monkeypatch):
+    return_matrix.build()
+    monkeypatch.setattr(return_matrix, '_rebuild_in_background', lambda: None)
+    with return_matrix._exclusive():
+        if return_matrix.fcntl is None:
+            pytest.skip('no cross-process lock on this platform')
+        assert return_matrix.ensure_tickers(['AAA', 'BBB']) is None
+    assert 'BBB' in return_matrix.ensure_tickers(['AAA', 'BBB']).columns
+
+
+def test_index_read_before_a_rebuild_is_mapped_again(matrix_dir, monkeypatch):
+    return_matrix.build()
+    stale = return_matrix._read_index()
+    return_matrix.build()
+    return_matrix.build()
+    indexes = iter([stale, return_matrix._read_index()])
+    monkeypatch.setattr(return_matrix, '_read_index', lambda: next(indexes))
+    monkeypatch.setattr(return_matrix, '_rebuild_in_background', lambda: None)
+    assert return_matrix.get_matrix().version == 3
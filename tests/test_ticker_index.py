@@ -0,0 +1,21 @@
+# tests/test_ticker_index.py
+from services import price_store, ticker_index
+
+
+def test_store_index_picks_up_new_tickers(tmp_path, monkeypatch):
+    monkeypatch.setattr(ticker_index, 'TICKER_LIST_PATH', str(tmp_path / 'tickers.csv'))
+    monkeypatch.setattr(ticker_index, 'TICKER_LIST_CHECK_SECONDS', 0)
+    monkeypatch.setattr(ticker_index, '_index', None)
+    monkeypatch.setattr(price_store, 'PRICE_STORE_PATH', str(tmp_path / 'prices.sqlite'))
+    monkeypatch.setattr(price_store, '_schema_ready', False)
+
+    def store(ticker):
+        conn = price_store._connect()
+        conn.execute('INSERT INTO series (ticker) VALUES (?)', (ticker,))
+        conn.commit()
+        conn.close()
+
+    store('AAPL')
+    assert [row['symbol'] for row in ticker_index.suggest('A')] == ['AAPL']
+    store('AMZN')
+    assert [row['symbol'] for row in ticker_index.suggest('A')] == ['AAPL', 'AMZN']
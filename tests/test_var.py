@@ -0,0 +1,47 @@
+# tests/test_var.py
+import numpy as np
+import pytest
+
+from analytics.var import SAMPLING_METHODS, historical_var_grid, simulate_var_grid
+
+MEAN_RETURNS = np.array([0.0004, 0.0002, 0.0003])
+COV_MATRIX = np.array([
+    [0.00020, 0.00006, 0.00004],
+    [0.00006, 0.00010, 0.00002],
+    [0.00004, 0.00002, 0.00015],
+])
+WEIGHTS = np.array([0.5, 0.3, 0.2])
+
+
+def _grid(sampling):
+    result = simulate_var_grid(MEAN_RETURNS, [COV_MATRIX] * 2, WEIGHTS, 1_000_000, [1, 10], [0.95, 0.99],
+                               100_000, seed=1, sampling=sampling)
+    return result['grid']
+
+
+def test_sampling_methods_agree_on_expected_shortfall_and_contributions():
+    reference = _grid('pseudo')
+    for sampling in SAMPLING_METHODS:
+        for entry, expected in zip(_grid(sampling), reference):
+            assert entry['var'] == pytest.approx(expected['var'], rel=0.05)
+            assert entry['expected_shortfall'] == pytest.approx(expected['expected_shortfall'], rel=0.05)
+            # Expected Shortfall sits beyond the VaR and is the sum of the contributions
+            assert entry['expected_shortfall'] > entry['var']
+            np.testing.assert_allclose(entry['contributions'], expected['contributions'], rtol=0.1)
+
+
+def test_single_batch_has_no_standard_error():
+    result = simulate_var_grid(MEAN_RETURNS, [COV_MATRIX], WEIGHTS, 1_000_000, [1], [0.95], 1000, seed=1)
+    assert result['simulations'] == 1000
+    assert result['grid'][0]['standard_error'] is None
+
+
+def test_historical_var_replays_only_the_common_history():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0, 0.01, (1000, 2))
+    young = returns.copy()
+    young[:900, 1] = np.nan
+    result = historical_var_grid(young, [0.5, 0.5], 1_000_000, [1], [0.95])
+    expected = historical_var_grid(returns[900:], [0.5, 0.5], 1_000_000, [1], [0.95])
+    assert result['grid'][0]['var'] == pytest.approx(expected['grid'][0]['var'])
+    assert len(result['scenario_pnl'][0]) == 100